@@ -0,0 +1,209 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from modules.catalog import frame_key, get_compiled, load_config
+
+
+class BrakeSource:
+    """One controller output that demands braking, normalized to 0-1.
+
+    The demand is the output above ``deadband`` as a fraction of the way
+    from ``deadband`` to ``full``, clipped to [0, 1]; 1 is full braking.
+    ``full`` defaults to the output's ceiling, the largest value the
+    controller produces anywhere on its input universes, which a centroid
+    only reaches when its strongest rule fires completely.
+    """
+
+    def __init__(self, name, output, priority, deadband=0.0, full=None):
+        self.name = name
+        self.output = output
+        self.priority = priority
+        self.deadband = float(deadband)
+        self.compiled = compiled = get_compiled(name)
+        self.inputs = [(label, frame_key(name, label)) for label in compiled.input_labels]
+        self.c = compiled.output_labels.index(output)
+        _, universe, _, mfs = compiled.consequents[self.c]
+        # Where each consequent term's sampled mf returns to zero: no centroid
+        # of sets drawn from a group of terms lies beyond the largest of these
+        self.term_ends = np.array([_term_end(universe, mf) for mf in mfs])
+        axes = [universe for _, universe, _, _ in compiled.antecedents]
+        grid = np.meshgrid(*axes, indexing='ij')
+        surface = compiled.evaluate({label: axis.ravel() for label, axis in zip(compiled.input_labels, grid)})
+        self.ceiling = float(np.nanmax(surface[output]))
+        self.full = self.ceiling if full is None else float(full)
+
+    @property
+    def key(self):
+        return '{}.{}'.format(self.name, self.output)
+
+    def demand(self, value):
+        if value != value:
+            return 0.0
+        return float(np.clip((value - self.deadband) / (self.full - self.deadband), 0.0, 1.0))
+
+    def bound(self, values):
+        # Upper bound on the demand for these input values, from the consequent
+        # terms of the rules the rule index leaves as candidates; no evaluation
+        rules = self.compiled._rule_index.candidates(values)
+        terms = self.compiled.rule_outputs[rules, self.c]
+        terms = terms[terms >= 0]
+        if not len(terms):
+            return 0.0
+        return self.demand(self.term_ends[terms].max())
+
+
+def _term_end(universe, mf):
+    # First universe point after the last nonzero sample, where the polyline
+    # through the sampled mf reaches zero (the universe end if it never does)
+    last = np.flatnonzero(mf)[-1] if mf.any() else 0
+    return universe[min(last + 1, len(universe) - 1)]
+
+
+def load_sources(config=None):
+    """BrakeSource per entry of the config's 'arbitration' section, highest priority first."""
+    config = config or load_config()
+    sources = []
+    for key, entry in config['arbitration'].items():
+        name, output = key.split('.', 1)
+        sources.append(BrakeSource(name, output, entry['priority'], entry.get('deadband', 0.0), entry.get('full')))
+    return sorted(sources, key=lambda source: source.priority)
+
+
+class BrakeArbiter:
+    """Merges the brake and deceleration demands of several controllers into
+    one brake command, evaluating as few controllers as possible per tick.
+
+    The command is the largest normalized demand of any source, the source
+    with the higher priority (lower number) winning ties. Sources are
+    visited in priority order and a source is skipped without evaluating
+    its controller when it cannot raise the command:
+
+    - once the command reaches 1 (a source demands full braking), all
+      lower priority sources are skipped;
+    - otherwise a source whose rule index bound, computed from which rules
+      can fire at all for the current inputs, is no higher than the command
+      so far is skipped. In the idle case only rules implying the lowest
+      terms can fire, whose sets end within the deadband, so the bound is 0.
+
+    Skipping never changes the command, only which source is reported for
+    it when a skipped source would have tied. arbitrate() takes a sensor
+    frame keyed by frame key (see catalog.FRAME_KEYS).
+    """
+
+    def __init__(self, sources=None):
+        self.sources = sorted(sources or load_sources(), key=lambda source: source.priority)
+        self.ticks = 0
+        self.evaluated = 0
+        self.skipped_saturated = 0
+        self.skipped_bound = 0
+
+    def arbitrate(self, frame):
+        """Returns {'command': 0-1, 'source': key of the deciding source or
+        None, 'demands': {source key: demand, or None if skipped}}."""
+        self.ticks += 1
+        command, winner = 0.0, None
+        demands = {}
+        crisp = {}
+        for s, source in enumerate(self.sources):
+            if command >= 1.0:
+                self.skipped_saturated += len(self.sources) - s
+                demands.update((rest.key, None) for rest in self.sources[s:])
+                break
+            values = [float(frame[key]) for _, key in source.inputs]
+            if source.bound(values) <= command:
+                self.skipped_bound += 1
+                demands[source.key] = None
+                continue
+            if source.name not in crisp:
+                crisp[source.name] = source.compiled.evaluate_one(
+                    {label: value for (label, _), value in zip(source.inputs, values)})
+                self.evaluated += 1
+            demand = source.demand(crisp[source.name][source.output])
+            demands[source.key] = demand
+            if demand > command:
+                command, winner = demand, source.key
+        return {'command': command, 'source': winner, 'demands': demands}
+
+    def arbitrate_all(self, frame):
+        # Reference: every source evaluated, merged the same way
+        command, winner = 0.0, None
+        demands = {}
+        for source in self.sources:
+            inputs = {label: float(frame[key]) for label, key in source.inputs}
+            demand = source.demand(source.compiled.evaluate_one(inputs)[source.output])
+            demands[source.key] = demand
+            if demand > command:
+                command, winner = demand, source.key
+        return {'command': command, 'source': winner, 'demands': demands}
+
+    def stats(self):
+        visits = self.ticks * len(self.sources)
+        return {
+            'ticks': self.ticks,
+            'evaluated': self.evaluated,
+            'skipped_saturated': self.skipped_saturated,
+            'skipped_bound': self.skipped_bound,
+            'skipped_fraction': (self.skipped_saturated + self.skipped_bound) / visits if visits else 0.0,
+        }
+
+
+def scenario_frames(kind, count, seed=0):
+    """Sensor frames for the sources' inputs: 'idle' (clear road, green signal,
+    no pedestrian or obstacle nearby), 'emergency' (pedestrian running in
+    close ahead at speed) or 'random' (uniform over every universe)."""
+    rng = np.random.default_rng(seed)
+    frames = {
+        'speed': rng.uniform(0, 120, count),
+        'road': rng.integers(0, 3, count).astype(np.float64),
+        'distance': rng.uniform(0, 100, count),
+        'relative_speed': rng.uniform(-50, 50, count),
+        'ped_distance': rng.uniform(0, 100, count),
+        'ped_movement': rng.integers(0, 3, count).astype(np.float64),
+        'obstacle_distance': rng.uniform(0, 100, count),
+        'obstacle_position': rng.uniform(0, 2, count),
+        'signal': rng.integers(0, 3, count).astype(np.float64),
+    }
+    if kind == 'idle':
+        frames.update(distance=rng.uniform(85, 100, count), relative_speed=rng.uniform(5, 50, count),
+                      ped_distance=rng.uniform(95, 100, count), obstacle_distance=rng.uniform(95, 100, count),
+                      signal=np.full(count, 2.0))
+    elif kind == 'emergency':
+        frames.update(ped_distance=rng.uniform(0, 5, count), ped_movement=np.full(count, 2.0),
+                      speed=rng.uniform(95, 120, count))
+    elif kind != 'random':
+        raise ValueError("Unknown scenario '{}'".format(kind))
+    return [{key: values[i] for key, values in frames.items()} for i in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arbitrate brake demands with short-circuit scheduling")
+    parser.add_argument('--ticks', type=int, default=2000, help="frames per scenario")
+    parser.add_argument('--scenarios', default='idle,emergency,random')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sources = load_sources()
+    print("priority order: " + ", ".join("{} (full at {:g})".format(source.key, source.full)
+                                         for source in sources))
+    report = {}
+    for kind in args.scenarios.split(','):
+        frames = scenario_frames(kind, args.ticks, args.seed)
+        arbiter = BrakeArbiter(sources)
+        start = time.perf_counter()
+        results = [arbiter.arbitrate(frame) for frame in frames]
+        arbitrated = time.perf_counter() - start
+        start = time.perf_counter()
+        references = [arbiter.arbitrate_all(frame) for frame in frames]
+        full = time.perf_counter() - start
+        mismatches = sum(result['command'] != reference['command']
+                         for result, reference in zip(results, references))
+        report[kind] = dict(arbiter.stats(), us_per_tick=arbitrated / len(frames) * 1e6,
+                            full_us_per_tick=full / len(frames) * 1e6, mismatches=mismatches)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, DATA_DIR, get_compiled, get_factory
+
+BASELINE_PATH = os.path.join(DATA_DIR, 'benchmark_baseline.json')
+REPO_DIR = os.path.dirname(DATA_DIR)
+
+# Metric name -> True if larger is better
+METRICS = {
+    'construction_ms': False,
+    'compute_ms.p50': False,
+    'compute_ms.p95': False,
+    'compute_ms.p99': False,
+    'edge_compute_ms.p99': False,
+    'batch_rows_per_s': True,
+    'peak_kib': False,
+    'batch_peak_kib': False,
+    'startup_ms.import': False,
+    'startup_ms.compiled': False,
+    'startup_ms.skfuzzy': False,
+}
+
+# Cold-start cases, each timed in a fresh interpreter as (FUZZY_ENGINE, script):
+# importing main.py, and importing it then computing once with each engine
+_FIRST_COMPUTE = "import main; main.controllers.compute('module1', {'distance': 30, 'speed': 60, 'road': 1})"
+STARTUP_CASES = {
+    'import': ('compiled', "import main"),
+    'compiled': ('compiled', _FIRST_COMPUTE),
+    'skfuzzy': ('skfuzzy', _FIRST_COMPUTE),
+}
+
+
+def representative_inputs(name, count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{label: float(rng.uniform(universe[0], universe[-1]))
+             for label, universe, _, _ in get_compiled(name).antecedents}
+            for _ in range(count)]
+
+
+def edge_inputs(name):
+    # Universe ends, the points just outside them (clipped by skfuzzy), the
+    # middle, and each term's peak with every other input at its middle
+    antecedents = get_compiled(name).antecedents
+    middle = {label: float(universe[len(universe) // 2]) for label, universe, _, _ in antecedents}
+    cases = [
+        {label: float(universe[0]) for label, universe, _, _ in antecedents},
+        {label: float(universe[-1]) for label, universe, _, _ in antecedents},
+        {label: float(universe[0]) - 10 for label, universe, _, _ in antecedents},
+        {label: float(universe[-1]) + 10 for label, universe, _, _ in antecedents},
+        middle,
+    ]
+    for label, universe, _, mfs in antecedents:
+        for mf in mfs:
+            cases.append(dict(middle, **{label: float(universe[int(np.argmax(mf))])}))
+    return cases
+
+
+def _percentiles(samples):
+    ms = np.array(samples) * 1e3
+    return {'p50': float(np.percentile(ms, 50)), 'p95': float(np.percentile(ms, 95)),
+            'p99': float(np.percentile(ms, 99)), 'max': float(ms.max())}
+
+
+def _compute_times(sim, cases, repeat=1):
+    times = []
+    for _ in range(repeat):
+        for inputs in cases:
+            sim.reset()
+            start = time.perf_counter()
+            sim.inputs(inputs)
+            sim.compute()
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_controller(name, samples=200, batch_size=100000, construction_runs=20):
+    factory = get_factory(name)
+    factory()  # import and warm up
+
+    construction = []
+    for _ in range(construction_runs):
+        start = time.perf_counter()
+        factory()
+        construction.append(time.perf_counter() - start)
+
+    sim = factory()
+    compute = _compute_times(sim, representative_inputs(name, samples))
+    edge = _compute_times(sim, edge_inputs(name), repeat=3)
+
+    # Collect first so garbage from earlier work neither counts nor gets freed mid-measurement
+    gc.collect()
+    tracemalloc.start()
+    sim = factory()
+    _compute_times(sim, representative_inputs(name, 20))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    compiled = get_compiled(name)
+    rng = np.random.default_rng(1)
+    batch = {label: rng.uniform(universe[0], universe[-1], batch_size)
+             for label, universe, _, _ in compiled.antecedents}
+    compiled.evaluate({label: values[:10] for label, values in batch.items()})
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    compiled.evaluate(batch)
+    batch_seconds = time.perf_counter() - start
+    batch_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'construction_ms': float(np.median(construction) * 1e3),
+        'compute_ms': _percentiles(compute),
+        'edge_compute_ms': _percentiles(edge),
+        'batch_rows_per_s': batch_size / batch_seconds,
+        'peak_kib': peak / 1024,
+        'batch_peak_kib': batch_peak / 1024,
+    }
+
+
+def bench_startup(runs=5):
+    # Median wall time of a fresh interpreter running each startup script
+    env = dict(os.environ)
+    result = {}
+    for case, (engine, script) in STARTUP_CASES.items():
+        env['FUZZY_ENGINE'] = engine
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, env=env, check=True)
+            times.append(time.perf_counter() - start)
+        result[case] = float(np.median(times) * 1e3)
+    return result
+
+
+def machine_info():
+    # Where a set of results was recorded; timings only compare on the same setup
+    import skfuzzy
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'skfuzzy': skfuzzy.__version__,
+    }
+
+
+def run_benchmarks(names=None, samples=200, batch_size=100000, startup=True):
+    results = {name: bench_controller(name, samples, batch_size) for name in names or CONTROLLERS}
+    if startup:
+        results['startup'] = {'startup_ms': bench_startup()}
+    results['machine'] = machine_info()
+    return results
+
+
+def _metric(result, metric):
+    value = result
+    for part in metric.split('.'):
+        value = value[part]
+    return value
+
+
+def compare(results, baseline, tolerance=0.25):
+    """List (controller, metric, baseline, current) where current is worse than
+    the baseline by more than ``tolerance`` (a fraction)."""
+    regressions = []
+    for name, result in results.items():
+        if name == 'machine' or name not in baseline:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            try:
+                old, new = _metric(baseline[name], metric), _metric(result, metric)
+            except KeyError:
+                continue
+            if higher_is_better:
+                worse = new < old * (1 - tolerance)
+            else:
+                worse = new > old * (1 + tolerance)
+            if worse:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark construction, compute latency, batch throughput and memory")
+    parser.add_argument('names', nargs='*', default=list(CONTROLLERS), help="controllers (default: all)")
+    parser.add_argument('--samples', type=int, default=200, help="compute() calls per controller")
+    parser.add_argument('--batch-size', type=int, default=100000)
+    parser.add_argument('--no-startup', action='store_true', help="skip the cold-start timings")
+    parser.add_argument('--output', help="write the JSON results here (default: stdout)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed fractional slowdown")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names, args.samples, args.batch_size, not args.no_startup)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(text + '\n')
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as handle:
+            handle.write(text + '\n')
+        return 0
+    if not os.path.exists(args.baseline):
+        print("ERROR: no baseline at {}; run with --save-baseline to create one".format(args.baseline),
+              file=sys.stderr)
+        return 2
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    recorded = baseline.get('machine')
+    if recorded != results['machine']:
+        print("WARNING: baseline was recorded on {}, this run is on {}; timings may not be comparable".format(
+            json.dumps(recorded), json.dumps(results['machine'])), file=sys.stderr)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, metric, old, new in regressions:
+        print("REGRESSION {} {}: {:.4g} -> {:.4g}".format(name, metric, old, new), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import importlib
+import json
+import os
+
+from modules.rulebase import DATA_DIR, compile_rulebase
+
+# Vehicle-level settings shared by the simulator and the arbitration layer
+CONFIG_PATH = os.path.join(DATA_DIR, 'config.json')
+
+# Controller name -> (module path, factory name). Modules are imported on first use.
+CONTROLLERS = {
+    'module1': ('modules.module1', 'create_speed_control_system'),
+    'module2': ('modules.module2', 'create_steering_control_system'),
+    'module3': ('modules.module3', 'create_pedestrian_response_system'),
+    'module4': ('modules.module4', 'create_adaptive_cruise_control_system'),
+    'module5': ('modules.module5', 'create_parking_assistance_system'),
+    'module6': ('modules.module6', 'create_obstacle_avoidance_system'),
+    'module7': ('modules.module7', 'create_traffic_signal_response_system'),
+    'module8': ('modules.module8', 'create_road_condition_adaptation_system'),
+}
+
+
+def get_factory(name):
+    if name not in CONTROLLERS:
+        raise KeyError("Unknown controller '{}', expected one of: {}".format(name, ", ".join(CONTROLLERS)))
+    path, factory = CONTROLLERS[name]
+    return getattr(importlib.import_module(path), factory)
+
+
+def get_compiled(name, defuzzify='sampled'):
+    # Loaded from the compiled rule base artifact; no skfuzzy objects are built
+    if name not in CONTROLLERS:
+        raise KeyError("Unknown controller '{}', expected one of: {}".format(name, ", ".join(CONTROLLERS)))
+    return compile_rulebase(name, defuzzify)
+
+# Sensor frame key for controller inputs whose label alone would be ambiguous
+# across modules; every other input is read from the frame under its own label.
+FRAME_KEYS = {
+    ('module3', 'vehicle_speed'): 'speed',
+    ('module5', 'distance'): 'parking_distance',
+    ('module5', 'angle'): 'parking_angle',
+    ('module8', 'road'): 'road_surface',
+}
+
+
+def frame_key(name, label):
+    return FRAME_KEYS.get((name, label), label)
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path) as handle:
+        return json.load(handle)
@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, get_compiled, get_factory
+from modules.engine import _monotone_runs, compile_system
+from modules.rulebase import DATA_DIR
+
+GENERATED_DIR = os.path.join(DATA_DIR, 'generated')
+
+# Bump when the generated code changes so stale files are not loaded
+CODEGEN_VERSION = 3
+
+# Emitted into every generated module: the centroid skfuzzy computes for one
+# sample, over the universe points plus where each term crosses its cut level
+_CENTROID = '''
+def _centroid(universe, mfs, runs, levels):
+    level = np.array(levels)
+    y = np.fmin(level[:, None], mfs).max(axis=0)
+    x = universe
+    if runs:
+        x_cross = np.array([np.interp(level[t], ys, xs) for t, ys, xs in runs])
+        y_cross = np.fmin(level[:, None], np.array([np.interp(x_cross, universe, mf) for mf in mfs])).max(axis=0)
+        x = np.concatenate([universe, x_cross])
+        y = np.concatenate([y, y_cross])
+        order = np.argsort(x, kind='stable')
+        x, y = x[order], y[order]
+    x0, x1, y0, y1 = x[:-1], x[1:], y[:-1], y[1:]
+    dx = x1 - x0
+    area = (0.5 * dx * (y0 + y1)).sum()
+    if area <= 0:
+        return None
+    return float((dx * (y0 * (2 * x0 + x1) + y1 * (x0 + 2 * x1)) / 6).sum() / area)
+'''
+
+
+def _identifier(label):
+    return ''.join(ch if ch.isalnum() else '_' for ch in label)
+
+
+def _knots(universe, mf):
+    # The sampled mf as the fewest (x, y) knots np.interp gives the same result
+    # on, up to rounding: collinear samples and flat ends are dropped
+    keep = [0]
+    for i in range(1, len(universe) - 1):
+        x0, y0 = universe[keep[-1]], mf[keep[-1]]
+        x1, y1, x2, y2 = universe[i], mf[i], universe[i + 1], mf[i + 1]
+        if not np.isclose((y1 - y0) * (x2 - x0), (y2 - y0) * (x1 - x0), rtol=1e-12, atol=1e-12):
+            keep.append(i)
+    if len(universe) > 1:
+        keep.append(len(universe) - 1)
+    knots = [(float(universe[i]), float(mf[i])) for i in keep]
+    while len(knots) > 1 and knots[-1][1] == knots[-2][1]:
+        knots.pop()
+    while len(knots) > 1 and knots[0][1] == knots[1][1]:
+        knots.pop(0)
+    return knots
+
+
+def _membership(target, knots):
+    # Straight-line piecewise linear evaluation of one term on ``v``, clamped
+    # at the ends like np.interp
+    lines = []
+    if len(knots) == 1 or all(y == knots[0][1] for _, y in knots):
+        return ['    {} = {!r}'.format(target, knots[0][1])]
+    lines.append('    if v <= {!r}:'.format(knots[0][0]))
+    lines.append('        {} = {!r}'.format(target, knots[0][1]))
+    for (x0, y0), (x1, y1) in zip(knots, knots[1:]):
+        lines.append('    elif v < {!r}:'.format(x1))
+        if y0 == y1:
+            lines.append('        {} = {!r}'.format(target, y0))
+        else:
+            lines.append('        {} = {!r} + (v - {!r}) * {!r}'.format(target, y0, x0, (y1 - y0) / (x1 - x0)))
+    lines.append('    else:')
+    lines.append('        {} = {!r}'.format(target, knots[-1][1]))
+    return lines
+
+
+def _array(values):
+    return 'np.array({!r})'.format(np.asarray(values, dtype=np.float64).tolist())
+
+
+def structure_hash(compiled):
+    """Hash of everything the generated code depends on."""
+    digest = hashlib.sha256(str(CODEGEN_VERSION).encode())
+    for label, universe, terms, mfs in compiled.antecedents + compiled.consequents:
+        digest.update(label.encode())
+        digest.update(','.join(terms).encode())
+        digest.update(np.ascontiguousarray(universe, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(mfs, dtype=np.float64).tobytes())
+    for table in (compiled.rule_terms, compiled.rule_outputs, compiled.rule_weights):
+        digest.update(np.ascontiguousarray(table).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def generate_source(compiled, name='controller'):
+    """Python source of a module whose evaluate(**inputs) computes the controller.
+
+    Membership functions become if/elif chains over their breakpoints, rules
+    are unrolled into min() expressions and aggregation into max() per
+    consequent term; only the centroid uses NumPy, on constant tables.
+    evaluate() returns the outputs as a dict, leaving out any output no rule
+    fired, as ControlSystemSimulation does. A NaN input is evaluated as in
+    CompiledSystem, where its memberships are NaN and fmin passes over them:
+    all its terms get degree 1, so each rule fires at the strength of its
+    other terms.
+    """
+    inputs = [_identifier(label) for label in compiled.input_labels]
+    lines = [
+        '# Generated by modules.codegen for {} ({}); do not edit.'.format(name, structure_hash(compiled)),
+        'import numpy as np',
+        '',
+        'INPUTS = {!r}'.format(compiled.input_labels),
+        'OUTPUTS = {!r}'.format(compiled.output_labels),
+    ]
+    for c, (_, universe, _, mfs) in enumerate(compiled.consequents):
+        runs = ', '.join('({}, {}, {})'.format(t, _array(ys), _array(xs))
+                         for t, ys, xs in _monotone_runs(universe, mfs))
+        lines.append('_U{} = {}'.format(c, _array(universe)))
+        lines.append('_MF{} = {}'.format(c, _array(mfs)))
+        lines.append('_RUNS{} = [{}]'.format(c, runs))
+    lines.append(_CENTROID)
+
+    lines.append('')
+    lines.append('def evaluate({}):'.format(', '.join(inputs)))
+    for a, (label, universe, terms, mfs) in enumerate(compiled.antecedents):
+        lines.append('    # {}'.format(label))
+        lines.append('    v = float({})'.format(inputs[a]))
+        lines.append('    if v != v:')
+        lines.append('        {} = 1.0'.format(' = '.join('m{}_{}'.format(a, t) for t in range(len(mfs)))))
+        lines.append('    else:')
+        for t, mf in enumerate(mfs):
+            lines.extend('    ' + line for line in _membership('m{}_{}'.format(a, t), _knots(universe, mf)))
+
+    lines.append('    # Rules')
+    for r, terms in enumerate(compiled.rule_terms):
+        used = ['m{}_{}'.format(a, t) for a, t in enumerate(terms) if t >= 0]
+        lines.append('    r{} = {}'.format(r, used[0] if len(used) == 1 else 'min({})'.format(', '.join(used))))
+
+    lines.append('    outputs = {}')
+    for c, (label, _, terms, _) in enumerate(compiled.consequents):
+        lines.append('    # {}'.format(label))
+        levels = []
+        for t in range(len(terms)):
+            rules = np.flatnonzero(compiled.rule_outputs[:, c] == t)
+            fired = ['r{}'.format(r) if compiled.rule_weights[r, c] == 1
+                     else 'r{} * {!r}'.format(r, float(compiled.rule_weights[r, c])) for r in rules]
+            if not fired:
+                levels.append('0.0')
+                continue
+            lines.append('    l{}_{} = {}'.format(c, t, fired[0] if len(fired) == 1
+                                                     else 'max({})'.format(', '.join(fired))))
+            levels.append('l{}_{}'.format(c, t))
+        lines.append('    if {}:'.format(' or '.join(level for level in levels if level != '0.0') or 'False'))
+        lines.append('        value = _centroid(_U{0}, _MF{0}, _RUNS{0}, ({1},))'.format(c, ', '.join(levels)))
+        lines.append('        if value is not None:')
+        lines.append('            outputs[{!r}] = value'.format(label))
+    lines.append('    return outputs')
+    return '\n'.join(lines) + '\n'
+
+
+def _load(path, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def compile_control_system(system, name='controller', directory=GENERATED_DIR):
+    """Generated evaluator module for a skfuzzy ControlSystem (or a CompiledSystem).
+
+    The source is cached in ``directory`` under the controller name and a
+    hash of its structure, so it is generated once and later calls, in this
+    or any other process, import the cached file. Returns the loaded module;
+    call its evaluate() with the inputs as keyword arguments.
+    """
+    compiled = system if hasattr(system, 'rule_terms') else compile_system(system)
+    path = os.path.join(directory, '{}-{}.py'.format(name, structure_hash(compiled)))
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        # Write under a temporary name so concurrent processes never load a partial file
+        partial = '{}.{}.tmp'.format(path, os.getpid())
+        with open(partial, 'w') as handle:
+            handle.write(generate_source(compiled, name))
+        os.replace(partial, path)
+    module = _load(path, 'generated_{}'.format(_identifier(name)))
+    module.path = path
+    return module
+
+
+def load_generated(name, directory=GENERATED_DIR):
+    # From the compiled rule base, without building the skfuzzy objects
+    return compile_control_system(get_compiled(name), name, directory)
+
+
+def validate(name, module, samples=2000, seed=0):
+    """Compare a generated evaluator with the module's ControlSystemSimulation.
+
+    Uses the grid of universe endpoints and midpoints plus ``samples``
+    random inputs. Returns (max abs difference, samples where the two
+    disagree on which outputs are present).
+    """
+    from skfuzzy import control as ctrl
+
+    sim = ctrl.ControlSystemSimulation(get_factory(name)().ctrl)
+    compiled = compile_system(sim.ctrl)
+    rng = np.random.default_rng(seed)
+    axes = [np.linspace(universe[0], universe[-1], 3) for _, universe, _, _ in compiled.antecedents]
+    grid = np.stack([axis.ravel() for axis in np.meshgrid(*axes, indexing='ij')], axis=1)
+    random = np.stack([rng.uniform(universe[0], universe[-1], samples)
+                       for _, universe, _, _ in compiled.antecedents], axis=1)
+    error, mismatches = 0.0, 0
+    for values in np.concatenate([grid, random]):
+        inputs = dict(zip(compiled.input_labels, values))
+        sim.inputs(inputs)
+        sim.compute()
+        expected = dict(sim.output)
+        sim.reset()
+        actual = module.evaluate(**{_identifier(label): value for label, value in inputs.items()})
+        if set(actual) != set(expected):
+            mismatches += 1
+            continue
+        for label, value in expected.items():
+            error = max(error, abs(actual[label] - value))
+    return error, mismatches
+
+
+def _per_call(function, calls):
+    start = time.perf_counter()
+    for inputs in calls:
+        function(inputs)
+    return (time.perf_counter() - start) / len(calls) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate specialized straight-line evaluators for the controllers")
+    parser.add_argument('names', nargs='*', default=list(CONTROLLERS), help="controllers (default: all)")
+    parser.add_argument('--samples', type=int, default=2000, help="random inputs for validation")
+    parser.add_argument('--no-validate', action='store_true', help="skip the comparison with skfuzzy")
+    parser.add_argument('--bench', type=int, default=0, metavar='N',
+                        help="time N calls against evaluate_one() and ControlSystemSimulation")
+    parser.add_argument('--directory', default=GENERATED_DIR)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name in args.names:
+        module = compile_control_system(get_factory(name)().ctrl, name, args.directory)
+        print("{}: {}".format(name, module.path))
+        if not args.no_validate:
+            error, mismatches = validate(name, module, args.samples)
+            ok = error <= 1e-9 and not mismatches
+            failed = failed or not ok
+            print("  validation: max abs difference {:.3g}, {} output set mismatches{}".format(
+                error, mismatches, '' if ok else '  FAILED'))
+        if args.bench:
+            from modules.registry import registry
+            compiled = get_compiled(name)
+            rng = np.random.default_rng(1)
+            calls = [{label: float(rng.uniform(universe[0], universe[-1]))
+                      for label, universe, _, _ in compiled.antecedents} for _ in range(args.bench)]
+            keywords = [{_identifier(label): value for label, value in inputs.items()} for inputs in calls]
+            generated = _per_call(lambda kwargs: module.evaluate(**kwargs), keywords)
+            one = _per_call(compiled.evaluate_one, calls)
+            skfuzzy = _per_call(lambda inputs: registry.compute(name, inputs), calls)
+            print("  per call: generated {:.1f} us, evaluate_one {:.1f} us, skfuzzy {:.1f} us ({:.0f}x)".format(
+                generated, one, skfuzzy, skfuzzy / generated))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import argparse
+import gc
+import tracemalloc
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, get_compiled, get_factory
+from modules.rulebase import compile_rulebase
+
+
+class _Inputs:
+    # Write-only view of a controller's inputs, made on access so instances
+    # need not carry one; supports ``controller.input['distance'] = 20``.
+    # Clears the input's bit in ``owner.unset`` if an owner is given
+    __slots__ = ('_values', '_labels', '_owner')
+
+    def __init__(self, values, labels, owner=None):
+        self._values = values
+        self._labels = labels
+        self._owner = owner
+
+    def __setitem__(self, label, value):
+        try:
+            index = self._labels.index(label)
+        except ValueError:
+            raise KeyError("Unknown input '{}', expected one of: {}".format(label, ", ".join(self._labels)))
+        self._values[index] = value
+        if self._owner is not None:
+            self._owner.unset &= ~(1 << index)
+
+
+class CompactController:
+    """A controller instance holding nothing but its inputs and last outputs.
+
+    Universes, membership functions and rule tables live in the module's
+    CompiledSystem, which get_compiled() builds once per process and every
+    instance shares. Each instance keeps two small float64 arrays, the
+    current inputs and the crisp outputs of the last compute() (NaN where no
+    rule fired), and a bitmask of the inputs not set yet, in ``__slots__``.
+    Mirrors the ControlSystemSimulation interface: ``input[label] = value``,
+    ``inputs(dict)``, ``compute()``, ``output`` and ``reset()``. compute()
+    raises while an input is unset; an input set to NaN is evaluated as the
+    engine evaluates it.
+    """
+
+    __slots__ = ('system', 'values', 'crisp', 'unset')
+
+    def __init__(self, name, defuzzify='sampled'):
+        self.system = get_compiled(name, defuzzify)
+        self.values = np.full(len(self.system.input_labels), np.nan)
+        self.crisp = np.full(len(self.system.output_labels), np.nan)
+        self.unset = (1 << len(self.values)) - 1
+
+    @property
+    def input(self):
+        return _Inputs(self.values, self.system.input_labels, self)
+
+    def inputs(self, mapping):
+        for label, value in mapping.items():
+            self.input[label] = value
+
+    def compute(self):
+        missing = [label for i, label in enumerate(self.system.input_labels) if self.unset >> i & 1]
+        if missing:
+            raise ValueError("All antecedents must have input values! Missing: " + ", ".join(missing))
+        crisp = self.system.evaluate_one(dict(zip(self.system.input_labels, self.values)))
+        self.crisp[:] = [crisp[label] for label in self.system.output_labels]
+
+    @property
+    def output(self):
+        # Like ControlSystemSimulation.output, leaves out outputs no rule fired
+        return {label: float(value) for label, value in zip(self.system.output_labels, self.crisp)
+                if value == value}
+
+    def reset(self):
+        self.values[:] = np.nan
+        self.crisp[:] = np.nan
+        self.unset = (1 << len(self.values)) - 1
+
+
+class ControllerBank:
+    """Many instances of one controller as rows of two arrays.
+
+    ``values`` is (count, inputs) and ``crisp`` (count, outputs); compute()
+    evaluates every row (or the given rows) in one batch. bank[i] is a
+    handle with the CompactController interface for a single row.
+    """
+
+    def __init__(self, name, count, defuzzify='sampled'):
+        self.system = get_compiled(name, defuzzify)
+        self.values = np.full((count, len(self.system.input_labels)), np.nan)
+        self.crisp = np.full((count, len(self.system.output_labels)), np.nan)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, row):
+        return _BankRow(self, row)
+
+    def compute(self, rows=None):
+        rows = slice(None) if rows is None else rows
+        values = self.values[rows]
+        crisp = self.system.evaluate(dict(zip(self.system.input_labels, values.T)))
+        self.crisp[rows] = np.stack([crisp[label] for label in self.system.output_labels], axis=-1)
+
+
+class _BankRow:
+    __slots__ = ('bank', 'row')
+
+    def __init__(self, bank, row):
+        self.bank = bank
+        self.row = row
+
+    @property
+    def input(self):
+        return _Inputs(self.bank.values[self.row], self.bank.system.input_labels)
+
+    def inputs(self, mapping):
+        for label, value in mapping.items():
+            self.input[label] = value
+
+    def compute(self):
+        self.bank.compute([self.row])
+
+    @property
+    def output(self):
+        return {label: float(value) for label, value in zip(self.bank.system.output_labels, self.bank.crisp[self.row])
+                if value == value}
+
+
+def _sample_inputs(name):
+    # Universe midpoints, to run one computation per instance
+    return {label: float(universe[len(universe) // 2]) for label, universe, _, _ in get_compiled(name).antecedents}
+
+
+def _allocated(build, count):
+    # Bytes still allocated per instance after building ``count`` of them
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = build(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del instances
+    return (after - before) / count
+
+
+def instance_bytes(name, count=20, compact_count=2000):
+    """Bytes per instance of a controller, each instance having computed once.
+
+    'factory': a ControlSystemSimulation from the module's create_* factory,
+    which builds its own ControlSystem; 'simulation': a
+    ControlSystemSimulation over one ControlSystem shared by all (as the
+    registry pools them); 'compact': a CompactController; 'bank': one row of
+    a ControllerBank. 'shared' is the one-off size of the CompiledSystem the
+    compact forms share.
+    """
+    factory = get_factory(name)
+    inputs = _sample_inputs(name)
+    factory()  # import skfuzzy and the module before measuring
+
+    def factories(n):
+        sims = [factory() for _ in range(n)]
+        for sim in sims:
+            sim.inputs(inputs)
+            sim.compute()
+        return sims
+
+    def simulations(n):
+        from skfuzzy import control as ctrl
+        system = shared_system
+        sims = [ctrl.ControlSystemSimulation(system) for _ in range(n)]
+        for sim in sims:
+            sim.inputs(inputs)
+            sim.compute()
+        return sims
+
+    def compacts(n):
+        controllers = [CompactController(name) for _ in range(n)]
+        for controller in controllers:
+            controller.inputs(inputs)
+            controller.compute()
+        return controllers
+
+    def bank(n):
+        bank = ControllerBank(name, n)
+        bank.values[:] = [inputs[label] for label in bank.system.input_labels]
+        bank.compute()
+        return bank
+
+    shared_system = factory().ctrl
+    get_compiled(name)
+    return {
+        'factory': _allocated(factories, count),
+        'simulation': _allocated(simulations, count),
+        'compact': _allocated(compacts, compact_count),
+        'bank': _allocated(bank, compact_count),
+        'shared': _allocated(lambda n: [compile_rulebase.__wrapped__(name) for _ in range(n)], 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report memory per controller instance, skfuzzy and compact")
+    parser.add_argument('names', nargs='*', default=list(CONTROLLERS), help="controllers (default: all)")
+    parser.add_argument('--count', type=int, default=20, help="skfuzzy instances to measure")
+    parser.add_argument('--compact-count', type=int, default=2000, help="compact instances to measure")
+    args = parser.parse_args(argv)
+
+    print("{:<8} {:>10} {:>11} {:>9} {:>7} {:>9}".format(
+        'bytes', 'factory', 'simulation', 'compact', 'bank', 'shared'))
+    for name in args.names:
+        sizes = instance_bytes(name, args.count, args.compact_count)
+        print("{:<8} {:>10.0f} {:>11.0f} {:>9.0f} {:>7.0f} {:>9.0f}".format(
+            name, sizes['factory'], sizes['simulation'], sizes['compact'], sizes['bank'], sizes['shared']))
+
+
+if __name__ == "__main__":
+    main()
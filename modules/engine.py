@@ -0,0 +1,477 @@
+import functools
+import time
+
+import numpy as np
+
+# Active instrumentation (see modules.instrument), None when disabled
+_instrumentation = None
+
+
+def set_instrumentation(instrumentation):
+    global _instrumentation
+    _instrumentation = instrumentation
+
+
+def active_instrumentation():
+    return _instrumentation
+
+
+class CompiledSystem:
+    """Array-backed copy of a skfuzzy ControlSystem for vectorized inference.
+
+    Reproduces ControlSystemSimulation (min/max Mamdani inference with
+    centroid defuzzification) on whole arrays of inputs at once. Rules must
+    be conjunctions with at most one term per antecedent, which covers every
+    controller in this project.
+
+    With ``defuzzify='analytic'`` the centroid of each consequent whose terms
+    are all triangles is integrated exactly from the breakpoints, independent
+    of the universe step. Singleton terms (such as trimf [1, 1, 1]) have no
+    area; a consequent made only of singletons defuzzifies to their
+    cut-weighted mean, otherwise they are ignored.
+
+    ``defuzzify='sugeno'`` turns the Mamdani rule base into a zero-order
+    Sugeno (TSK) one: every consequent term becomes a singleton at the
+    centroid of its own sampled set, and the crisp output is the weighted
+    average of those positions. A term cut at level h is weighted by
+    A * h * (2 - h), the area of its set cut at h were it a triangle of
+    area A, which tracks the Mamdani result far better than weighting by
+    h alone. No universe is swept, so it is much cheaper, at the cost of
+    deviating from the Mamdani centroid wherever terms overlap.
+    """
+
+    def __init__(self, antecedents, consequents, rule_terms, rule_outputs, rule_weights,
+                 defuzzify='sampled'):
+        # antecedents / consequents: lists of (label, universe, term labels, mf matrix)
+        self.antecedents = antecedents
+        self.consequents = consequents
+        # rule_terms[r, a]: term index of antecedent a in rule r, -1 if unused
+        self.rule_terms = np.asarray(rule_terms, dtype=np.intp)
+        # rule_outputs[r, c]: term index of consequent c set by rule r, -1 if unused
+        self.rule_outputs = np.asarray(rule_outputs, dtype=np.intp)
+        self.rule_weights = np.asarray(rule_weights, dtype=np.float64)
+
+        # Controller name used in instrumentation, set by compile_factory
+        self.name = None
+        self.input_labels = [label for label, _, _, _ in antecedents]
+        self.output_labels = [label for label, _, _, _ in consequents]
+        self._runs = [_monotone_runs(universe, mfs) for _, universe, _, mfs in consequents]
+        # 'sampled' matches skfuzzy on the discrete universe; 'analytic' integrates
+        # the triangles exactly from their breakpoints where every term is one;
+        # 'sugeno' replaces each term by a singleton at its centroid
+        if defuzzify not in ('sampled', 'analytic', 'sugeno'):
+            raise ValueError("Unknown defuzzification '{}'".format(defuzzify))
+        self.defuzzify_method = defuzzify
+        self._triangles = [_triangles(universe, mfs) if defuzzify == 'analytic' else None
+                           for _, universe, _, mfs in consequents]
+        self._singletons = [_term_centroids(universe, mfs) if defuzzify == 'sugeno' else None
+                            for _, universe, _, mfs in consequents]
+        # Per consequent: (term, rules implying it, their weights)
+        self._implied = []
+        for c, (_, _, term_labels, _) in enumerate(consequents):
+            implied = []
+            for t in range(len(term_labels)):
+                rules = np.flatnonzero(self.rule_outputs[:, c] == t)
+                if len(rules):
+                    implied.append((t, rules, self.rule_weights[rules, c]))
+            self._implied.append(implied)
+        # Memberships of one sample laid out as a single vector, antecedent after
+        # antecedent, with a trailing 1 standing in for antecedents a rule skips;
+        # _rule_slots[r] holds the positions of rule r's terms in that vector
+        sizes = [len(term_labels) for _, _, term_labels, _ in antecedents]
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+        self._n_terms = sum(sizes)
+        used = self.rule_terms >= 0
+        self._rule_slots = np.where(used, self._offsets + self.rule_terms, self._n_terms)
+        self._rule_index = RuleIndex(antecedents, self.rule_terms)
+
+    # Rows defuzzified per block
+    block = 4096
+
+    @property
+    def n_rules(self):
+        return len(self.rule_terms)
+
+    def fuzzify(self, inputs):
+        # Returns the flattened input shape and one (N, terms) membership matrix per antecedent
+        missing = [label for label in self.input_labels if label not in inputs]
+        if missing:
+            raise ValueError("All antecedents must have input values! Missing: " + ", ".join(missing))
+        values = np.broadcast_arrays(*[np.asarray(inputs[label], dtype=np.float64)
+                                       for label in self.input_labels])
+        shape = values[0].shape
+        return shape, [self.fuzzify_input(a, value.reshape(-1)) for a, value in enumerate(values)]
+
+    def fuzzify_input(self, a, values):
+        # (N, terms) memberships of antecedent a for a flat array of values
+        _, universe, _, mfs = self.antecedents[a]
+        return np.stack([np.interp(values, universe, mf) for mf in mfs], axis=1)
+
+    def fire(self, memberships):
+        # Rule firing strength, (N, rules): fmin over each rule's antecedent terms
+        n = memberships[0].shape[0]
+        strength = np.ones((n, self.n_rules))
+        for a, mu in enumerate(memberships):
+            terms = self.rule_terms[:, a]
+            used = terms >= 0
+            strength[:, used] = np.fmin(strength[:, used], mu[:, terms[used]])
+        return strength
+
+    def accumulate(self, strength):
+        # Cut level per consequent term, (N, terms): fmax over the rules implying it
+        n = strength.shape[0]
+        cuts = []
+        for (_, _, term_labels, _), implied in zip(self.consequents, self._implied):
+            level = np.zeros((n, len(term_labels)))
+            for t, rules, weights in implied:
+                level[:, t] = np.fmax.reduce(strength[:, rules] * weights, axis=1)
+            cuts.append(level)
+        return cuts
+
+    def defuzzify(self, cuts):
+        return [self.defuzzify_output(c, level) for c, level in enumerate(cuts)]
+
+    def defuzzify_output(self, c, level):
+        # Crisp value of consequent c for an (N, terms) matrix of cut levels,
+        # in blocks so the (rows, points, terms) temporaries stay small
+        if len(level) > self.block:
+            return np.concatenate([self.defuzzify_output(c, level[i:i + self.block])
+                                   for i in range(0, len(level), self.block)])
+        if self._singletons[c] is not None:
+            positions, areas = self._singletons[c]
+            weights = level * (2 - level) * areas
+            total = weights.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(total > 0, weights @ positions / total, np.nan)
+        if self._triangles[c] is not None:
+            return self._triangles[c].centroid(level)
+        _, universe, _, mfs = self.consequents[c]
+        return _centroid(universe, mfs, self._runs[c], level)
+
+    def evaluate(self, inputs):
+        """Evaluate arrays of inputs, keyed by antecedent label.
+
+        Inputs are broadcast against each other and outputs take the broadcast
+        shape. Where no rule fires an output is NaN (skfuzzy omits it instead).
+        Extra keys are ignored.
+        """
+        if _instrumentation is not None:
+            return self._evaluate_instrumented(inputs, _instrumentation)
+        shape, memberships = self.fuzzify(inputs)
+        crisp = self.defuzzify(self.accumulate(self.fire(memberships)))
+        return {label: value.reshape(shape) for label, value in zip(self.output_labels, crisp)}
+
+    def evaluate_one(self, inputs):
+        """Evaluate a single sample, firing only the rules the rule index
+        leaves as candidates. Returns floats, NaN where no rule fires."""
+        if _instrumentation is not None:
+            return {label: float(value) for label, value in self.evaluate(inputs).items()}
+        missing = [label for label in self.input_labels if label not in inputs]
+        if missing:
+            raise ValueError("All antecedents must have input values! Missing: " + ", ".join(missing))
+        values = [float(inputs[label]) for label in self.input_labels]
+        rules = self._rule_index.candidates(values)
+        memberships = np.ones(self._n_terms + 1)
+        for a, value in enumerate(values):
+            mu = self.fuzzify_input(a, np.array([value]))[0]
+            memberships[self._offsets[a]:self._offsets[a] + len(mu)] = mu
+        # Starting from 1 like fire(), so a rule whose terms are all NaN fires fully
+        strength = np.fmin.reduce(memberships[self._rule_slots[rules]], axis=1, initial=1.0)
+
+        outputs = {}
+        for c, (label, _, term_labels, _) in enumerate(self.consequents):
+            # Aggregate over the candidate rules only; the others have zero strength
+            terms = self.rule_outputs[rules, c]
+            implies = terms >= 0
+            level = np.zeros(len(term_labels))
+            np.fmax.at(level, terms[implies], strength[implies] * self.rule_weights[rules[implies], c])
+            outputs[label] = float(self.defuzzify_output(c, level[None])[0]) if level.any() else np.nan
+        return outputs
+
+    def _evaluate_instrumented(self, inputs, instrumentation):
+        start = time.perf_counter()
+        shape, memberships = self.fuzzify(inputs)
+        fuzzified = time.perf_counter()
+        strength = self.fire(memberships)
+        fired = time.perf_counter()
+        cuts = self.accumulate(strength)
+        accumulated = time.perf_counter()
+        crisp = self.defuzzify(cuts)
+        done = time.perf_counter()
+
+        n = len(strength)
+        instrumentation.record_stage(self.name, 'fuzzification', fuzzified - start, n)
+        instrumentation.record_stage(self.name, 'activation', fired - fuzzified, n)
+        instrumentation.record_stage(self.name, 'aggregation', accumulated - fired, n)
+        instrumentation.record_stage(self.name, 'defuzzification', done - accumulated, n)
+        instrumentation.record_rules(self.name, strength)
+        return {label: value.reshape(shape) for label, value in zip(self.output_labels, crisp)}
+
+
+class RuleIndex:
+    """Interval index over the supports of the antecedent terms.
+
+    Each antecedent's axis is cut at the ends of its terms' supports (where
+    the sampled mf becomes nonzero). Every segment stores which rules can
+    fire for a value inside it, i.e. which rules either do not use the
+    antecedent or use one of its terms whose support overlaps the segment.
+    A sample's candidate rules are the intersection over its inputs; all
+    other rules have zero strength.
+    """
+
+    def __init__(self, antecedents, rule_terms):
+        self.breakpoints = []
+        self.masks = []
+        for a, (_, universe, _, mfs) in enumerate(antecedents):
+            supports = [_support(universe, mf) for mf in mfs]
+            breakpoints = np.unique([bound for support in supports for bound in support
+                                     if np.isfinite(bound)])
+            # Segment s spans [breakpoints[s - 1], breakpoints[s]) with infinite ends
+            edges = np.concatenate([[-np.inf], breakpoints, [np.inf]])
+            active = np.array([[lo < edges[s + 1] and hi > edges[s] for lo, hi in supports]
+                               for s in range(len(edges) - 1)], dtype=bool).reshape(-1, len(mfs))
+            terms = rule_terms[:, a]
+            masks = np.ones((len(active), len(terms)), dtype=bool)
+            masks[:, terms >= 0] = active[:, terms[terms >= 0]]
+            self.breakpoints.append(breakpoints)
+            self.masks.append(masks)
+
+    def candidates(self, values):
+        # Indices of the rules that may fire for one sample; NaN inputs exclude none
+        mask = None
+        for breakpoints, masks, value in zip(self.breakpoints, self.masks, values):
+            if value != value:
+                continue
+            segment = masks[np.searchsorted(breakpoints, value, side='right')]
+            mask = segment if mask is None else mask & segment
+        if mask is None:
+            return np.arange(self.masks[0].shape[1]) if self.masks else np.arange(0)
+        return np.flatnonzero(mask)
+
+
+def compile_system(system, defuzzify='sampled'):
+    """Build a CompiledSystem from a skfuzzy ControlSystem.
+
+    ``defuzzify='analytic'`` computes centroids in closed form from the
+    triangle breakpoints instead of over the sampled universe (see
+    CompiledSystem).
+    """
+    antecedents = list(system.antecedents)
+    consequents = list(system.consequents)
+    rules = list(system.rules)
+
+    a_index = {var.label: i for i, var in enumerate(antecedents)}
+    c_index = {var.label: i for i, var in enumerate(consequents)}
+    rule_terms = np.full((len(rules), len(antecedents)), -1)
+    rule_outputs = np.full((len(rules), len(consequents)), -1)
+    rule_weights = np.zeros((len(rules), len(consequents)))
+
+    for r, rule in enumerate(rules):
+        for term in _conjunction_terms(rule.antecedent):
+            a = a_index[term.parent.label]
+            if rule_terms[r, a] != -1:
+                raise ValueError("Rule uses antecedent '{}' twice: {}".format(term.parent.label, rule))
+            rule_terms[r, a] = list(term.parent.terms).index(term.label)
+        for weighted in rule.consequent:
+            c = c_index[weighted.term.parent.label]
+            rule_outputs[r, c] = list(weighted.term.parent.terms).index(weighted.term.label)
+            rule_weights[r, c] = weighted.weight
+
+    for var in consequents:
+        if var.defuzzify_method != 'centroid':
+            raise ValueError("Only centroid defuzzification is supported, '{}' uses '{}'"
+                             .format(var.label, var.defuzzify_method))
+
+    return CompiledSystem([_variable(var) for var in antecedents],
+                          [_variable(var) for var in consequents],
+                          rule_terms, rule_outputs, rule_weights, defuzzify)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_factory(factory, defuzzify='sampled'):
+    """Compile the system built by a module's create_* factory, once per process."""
+    compiled = compile_system(factory().ctrl, defuzzify)
+    compiled.name = factory.__module__.rsplit('.', 1)[-1]
+    return compiled
+
+
+def _variable(var):
+    universe = np.asarray(var.universe, dtype=np.float64)
+    labels = list(var.terms)
+    mfs = np.array([var.terms[label].mf for label in labels], dtype=np.float64)
+    return var.label, universe, labels, mfs
+
+
+def _conjunction_terms(antecedent):
+    # Flatten an AND-only antecedent into its terms
+    if hasattr(antecedent, 'kind'):
+        if antecedent.kind != 'and':
+            raise ValueError("Only AND rules are supported, found " + antecedent.kind.upper())
+        return _conjunction_terms(antecedent.term1) + _conjunction_terms(antecedent.term2)
+    return [antecedent]
+
+
+def _support(universe, mf):
+    # Open interval where np.interp of the sampled mf is nonzero; infinite on a
+    # side where the mf is nonzero at the universe end, since inputs are clipped
+    nonzero = np.flatnonzero(mf)
+    if not len(nonzero):
+        return np.inf, -np.inf
+    first, last = nonzero[0], nonzero[-1]
+    lo = universe[first - 1] if first > 0 else -np.inf
+    hi = universe[last + 1] if last < len(universe) - 1 else np.inf
+    return lo, hi
+
+
+def _monotone_runs(universe, mfs):
+    # Strictly monotone stretches of each term's mf, as (term, mf ascending, x) for
+    # inverting the mf with np.interp. A cut level crosses each run at most once.
+    runs = []
+    for t, mf in enumerate(mfs):
+        step = np.sign(np.diff(mf))
+        start = 0
+        for i in range(1, len(step) + 1):
+            if i == len(step) or step[i] != step[start]:
+                if step[start] != 0:
+                    xs, ys = universe[start:i + 1], mf[start:i + 1]
+                    if step[start] < 0:
+                        xs, ys = xs[::-1], ys[::-1]
+                    runs.append((t, ys, xs))
+                start = i
+    return runs
+
+
+def _centroid(universe, mfs, runs, cuts):
+    # Centroid of max_t min(cut_t, mf_t), piecewise linear through the universe
+    # points plus the points where each term crosses its cut, as skfuzzy does.
+    n = cuts.shape[0]
+    y_grid = np.fmin(cuts[:, :, None], mfs[None]).max(axis=1)
+    if runs:
+        # Levels outside a run clamp to its ends, which are universe points already
+        x_cross = np.stack([np.interp(cuts[:, t], ys, xs) for t, ys, xs in runs], axis=1)
+        y_cross = np.max([np.fmin(cuts[:, [t]], np.interp(x_cross, universe, mf))
+                          for t, mf in enumerate(mfs)], axis=0)
+        x = np.concatenate([np.broadcast_to(universe, (n, len(universe))), x_cross], axis=1)
+        y = np.concatenate([y_grid, y_cross], axis=1)
+        order = np.argsort(x, axis=1, kind='stable')
+        x = np.take_along_axis(x, order, axis=1)
+        y = np.take_along_axis(y, order, axis=1)
+    else:
+        x = np.broadcast_to(universe, (n, len(universe)))
+        y = y_grid
+    return _polyline_centroid(x, y)
+
+
+def _polyline_centroid(x, y):
+    # Exact centroid of the piecewise linear function through (x, y), per row;
+    # x must be sorted along each row
+    x0, x1, y0, y1 = x[:, :-1], x[:, 1:], y[:, :-1], y[:, 1:]
+    dx = x1 - x0
+    area = (0.5 * dx * (y0 + y1)).sum(axis=1)
+    moment = (dx * (y0 * (2 * x0 + x1) + y1 * (x0 + 2 * x1)) / 6).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(area > 0, moment / area, np.nan)
+
+
+def _term_centroids(universe, mfs):
+    # Centroid and area of each term's sampled set on its own; the centroid is
+    # where the Mamdani output lands when that term alone fires at full strength.
+    # A term with no area (e.g. a degenerate trimf) gets zero weight, and its
+    # peak as position so the weighted sum never meets a NaN
+    x = np.broadcast_to(universe, mfs.shape)
+    areas = (0.5 * np.diff(universe) * (mfs[:, 1:] + mfs[:, :-1])).sum(axis=1)
+    peaks = universe[np.argmax(mfs, axis=1)]
+    return np.where(areas > 0, _polyline_centroid(x, mfs), peaks), areas
+
+
+class _Triangles:
+    # Breakpoints of a consequent's triangular terms, for closed-form centroids
+
+    def __init__(self, lo, hi, params):
+        self.lo, self.hi = lo, hi
+        params = np.asarray(params, dtype=np.float64)
+        self.singleton = (params[:, 0] == params[:, 1]) & (params[:, 1] == params[:, 2])
+        self.params = params[~self.singleton]
+        self.positions = params[self.singleton, 1]
+        self.terms = np.flatnonzero(~self.singleton)
+        self.singleton_terms = np.flatnonzero(self.singleton)
+
+        # Each triangle is min(rising, falling) clipped to [0, 1], with both edges
+        # as lines y = k * x + d. A vertical edge at the end of the universe (a
+        # shoulder) is the constant line y = 1; inside it gets a negligible width.
+        a, b, c = self.params.T
+        k_rise = np.where(a < b, 1 / np.maximum(b - a, 1e-12), np.where(a <= lo, 0.0, 1e12))
+        k_fall = np.where(b < c, -1 / np.maximum(c - b, 1e-12), np.where(c >= hi, 0.0, -1e12))
+        self._k = np.stack([k_rise, k_fall])
+        self._d = np.stack([np.where(k_rise == 0, 1.0, -a * k_rise),
+                            np.where(k_fall == 0, 1.0, -c * k_fall)])
+
+        # x span of every edge, rising edges first
+        span = np.concatenate([self.params[:, [0, 1]], self.params[:, [1, 2]]])
+        k, d = self._k.ravel(), self._d.ravel()
+
+        # Kinks that do not depend on the cut levels: feet, peaks and the
+        # crossings of edges whose spans overlap
+        with np.errstate(invalid='ignore', divide='ignore'):
+            crossing = (d[None] - d[:, None]) / (k[:, None] - k[None])
+        inside = ((crossing >= span[:, None, 0]) & (crossing <= span[:, None, 1])
+                  & (crossing >= span[None, :, 0]) & (crossing <= span[None, :, 1]))
+        fixed = np.concatenate([[lo, hi], self.params.ravel(), crossing[inside]])
+        self.fixed = np.unique(np.clip(fixed, lo, hi))
+
+        # Edges that can meet another term's cut level: those overlapping its support
+        overlap = (span[:, None, 0] <= self.params[None, :, 2]) & (span[:, None, 1] >= self.params[None, :, 0])
+        self._meet_edge, self._meet_term = np.nonzero(overlap)
+
+    def centroid(self, cuts):
+        if not len(self.params):
+            # Only singletons: the centroid is their cut-weighted mean position
+            weights = cuts[:, self.singleton_terms]
+            total = weights.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(total > 0, weights @ self.positions / total, np.nan)
+
+        # Singletons have no area and drop out next to proper triangles
+        level = cuts[:, self.terms]
+        n = len(level)
+        # Where edges meet cut levels, the remaining kinks of the envelope
+        edge = self._meet_edge
+        with np.errstate(invalid='ignore', divide='ignore'):
+            meet = (level[:, self._meet_term] - self._d.ravel()[edge]) / self._k.ravel()[edge]
+        points = np.concatenate([np.broadcast_to(self.fixed, (n, len(self.fixed))),
+                                 np.clip(np.nan_to_num(meet, nan=self.lo), self.lo, self.hi)], axis=1)
+        points.sort(axis=1)
+        x = points[:, :, None]
+        mf = np.clip(np.minimum(self._k[0] * x + self._d[0], self._k[1] * x + self._d[1]), 0, 1)
+        y = np.fmin(level[:, None, :], mf).max(axis=2)
+        return _polyline_centroid(points, y)
+
+
+def _triangles(universe, mfs):
+    # Recover [a, b, c] for each term from its sampled mf, or None if any term
+    # is not a triangle. A term with a single nonzero sample is a singleton.
+    params = []
+    for mf in mfs:
+        peak = int(np.argmax(mf))
+        if mf[peak] != 1:
+            return None
+        b = universe[peak]
+        if np.count_nonzero(mf) == 1:
+            params.append((b, b, b))
+            continue
+        if peak == 0 or mf[peak - 1] == 1:
+            a = b
+        else:
+            a = b - (b - universe[peak - 1]) / (1 - mf[peak - 1])
+        if peak == len(mf) - 1 or mf[peak + 1] == 1:
+            c = b
+        else:
+            c = b + (universe[peak + 1] - b) / (1 - mf[peak + 1])
+        a, c = round(a, 9), round(c, 9)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            left = np.where(b > a, (universe - a) / (b - a), (universe >= a).astype(float))
+            right = np.where(c > b, (c - universe) / (c - b), (universe <= c).astype(float))
+        if not np.allclose(np.clip(np.minimum(left, right), 0, 1), mf):
+            return None
+        params.append((a, b, c))
+    return _Triangles(universe[0], universe[-1], params)
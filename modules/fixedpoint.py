@@ -0,0 +1,280 @@
+import argparse
+import sys
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, get_compiled
+
+# Membership degrees are uint8 (255 = 1.0) or int16 (32767 = 1.0); input
+# positions and weights are Q12 fixed point (4096 = one table step, or a
+# weight of 1.0)
+PRECISIONS = {'uint8': (np.uint8, 255), 'int16': (np.int16, 32767)}
+FRAC_BITS = 12
+SCALE = 1 << FRAC_BITS
+# Consequent tables are resampled to at least this many points: the discrete
+# centroid on a coarse universe such as module8's 3 points is far from the
+# polyline centroid skfuzzy computes
+MIN_OUTPUT_POINTS = 65
+
+# Documented bound on the absolute error per output against the float
+# reference (skfuzzy, or the batch engine which matches it), as a fraction of
+# the output's universe span, with the default output_points: the largest
+# error measured over five seeds of 100k random samples plus the grid of
+# measure_error(), with 20% headroom. module7's decision and module8 have 2
+# and 3 point output universes, on which skfuzzy's centroid interpolates
+# across term crossings rather than tracing the clipped sets, so neither
+# precision gets closer than 2-3% of span there. A sample that only one
+# side leaves empty (NaN) is always a failure.
+# python -m modules.fixedpoint --check and tests/test_fixedpoint.py enforce both.
+ERROR_BOUNDS = {
+    'uint8': {
+        ('module1', 'acceleration'): 0.0048, ('module1', 'brake'): 0.0023,
+        ('module2', 'steering'): 0.0016,
+        ('module3', 'deceleration'): 0.016, ('module3', 'warning_signal'): 0.018,
+        ('module4', 'throttle'): 0.0070, ('module4', 'brake'): 0.018,
+        ('module5', 'steering'): 0.0015, ('module5', 'speed'): 0.014,
+        ('module6', 'steering'): 0.0021, ('module6', 'deceleration'): 0.0057,
+        ('module7', 'deceleration'): 0.0047, ('module7', 'decision'): 0.039,
+        ('module8', 'speed'): 0.024, ('module8', 'brake'): 0.024,
+    },
+    'int16': {
+        ('module1', 'acceleration'): 0.0043, ('module1', 'brake'): 0.00029,
+        ('module2', 'steering'): 0.00063,
+        ('module3', 'deceleration'): 0.0095, ('module3', 'warning_signal'): 0.0095,
+        ('module4', 'throttle'): 0.0038, ('module4', 'brake'): 0.0030,
+        ('module5', 'steering'): 0.0015, ('module5', 'speed'): 0.0075,
+        ('module6', 'steering'): 0.00096, ('module6', 'deceleration'): 0.0054,
+        ('module7', 'deceleration'): 0.0044, ('module7', 'decision'): 0.039,
+        ('module8', 'speed'): 0.024, ('module8', 'brake'): 0.024,
+    },
+}
+
+
+def _resample(universe, mfs, points):
+    if points == len(universe):
+        return universe, mfs
+    grid = np.linspace(universe[0], universe[-1], points)
+    return grid, np.array([np.interp(grid, universe, mf) for mf in mfs])
+
+
+class FixedPointSystem:
+    """Integer-only inference for one compiled controller.
+
+    Membership functions and consequent sets are integer tables (uint8 or
+    int16 degrees, see PRECISIONS) over evenly spaced universes. An input
+    becomes a Q12 position on its antecedent's table and is fuzzified by
+    integer linear interpolation between the two neighbouring entries,
+    keeping the interpolated degree at FRAC_BITS more fraction bits than the
+    tables so rules that fire weaker than one table step still count. Rule
+    strengths are the minimum over the rule's terms scaled by a Q12 weight,
+    and cut levels the maximum over the rules implying a term. The crisp
+    output is the exact centroid of the polyline through the clipped sets on
+    the table points, from integer area and moment sums, returned as a Q12
+    table position. Only evaluate(), which converts inputs and outputs at
+    the boundary, uses floats.
+
+    Consequent tables are resampled to ``output_points`` (default: the
+    native universe, or MIN_OUTPUT_POINTS if that is coarser), trading
+    accuracy for memory.
+    """
+
+    def __init__(self, compiled, precision='uint8', output_points=None):
+        if precision not in PRECISIONS:
+            raise ValueError("Unknown precision '{}', expected one of: {}".format(precision, ", ".join(PRECISIONS)))
+        self.name = compiled.name
+        self.precision = precision
+        self.dtype, self.one = PRECISIONS[precision]
+        self.input_labels = compiled.input_labels
+        self.output_labels = compiled.output_labels
+        # Per antecedent: (first value, step, table of shape (points, terms))
+        self.inputs = []
+        for _, universe, _, mfs in compiled.antecedents:
+            step = np.diff(universe)
+            if not np.allclose(step, step[0]):
+                raise ValueError("Fixed-point tables need evenly spaced universes")
+            self.inputs.append((float(universe[0]), float(step[0]), self._quantize(mfs).T.copy()))
+        # Per consequent: (first value, step, table of shape (terms, points))
+        self.outputs = []
+        for _, universe, _, mfs in compiled.consequents:
+            universe, mfs = _resample(universe, mfs, output_points or max(len(universe), MIN_OUTPUT_POINTS))
+            step = (universe[-1] - universe[0]) / (len(universe) - 1)
+            self.outputs.append((float(universe[0]), float(step), self._quantize(mfs)))
+
+        n_terms = [table.shape[1] for _, _, table in self.inputs]
+        offsets = np.concatenate([[0], np.cumsum(n_terms)[:-1]]).astype(np.int16)
+        used = compiled.rule_terms >= 0
+        # Slot sum(n_terms) holds a constant one for antecedents a rule skips
+        self.rule_slots = np.where(used, offsets + compiled.rule_terms, sum(n_terms)).astype(np.int16)
+        self.rule_outputs = compiled.rule_outputs.astype(np.int8)
+        self.rule_weights = np.round(compiled.rule_weights * SCALE).astype(np.uint16)
+
+    def _quantize(self, mfs):
+        # Nonzero degrees stay at least one step, so a term that holds at all still fires
+        mfs = np.asarray(mfs)
+        return np.where(mfs > 0, np.maximum(np.round(mfs * self.one), 1), 0).astype(self.dtype)
+
+    def positions(self, inputs):
+        # Float inputs to Q12 table positions, clipped to the tables like skfuzzy clips
+        positions = []
+        for label, (start, step, table) in zip(self.input_labels, self.inputs):
+            value = np.asarray(inputs[label], dtype=np.float64).reshape(-1)
+            exact = (value - start) / step * SCALE
+            q = np.round(exact)
+            # A value inside a table cell must not round onto the cell's end:
+            # degrees are linear within a cell, so off its ends a term holds
+            # (nonzero) exactly where it does in the float engine
+            q += np.where((q % SCALE == 0) & (q != exact), np.sign(exact - q), 0)
+            positions.append(np.clip(q, 0, (len(table) - 1) * SCALE).astype(np.int32))
+        return positions
+
+    def evaluate_fixed(self, positions):
+        """Integer inference on Q12 input positions, one (N,) int32 array per input.
+
+        Returns one (N,) int32 array of Q12 output table positions per output,
+        -1 where no rule fires.
+        """
+        n = len(positions[0])
+        # Degrees are interpolated without rounding back to the table
+        # resolution: int32 with FRAC_BITS more fraction bits than the tables
+        memberships = []
+        for q, (_, _, table) in zip(positions, self.inputs):
+            i = np.minimum(q >> FRAC_BITS, len(table) - 2)
+            frac = (q - (i << FRAC_BITS))[:, None]
+            lo, hi = table[i].astype(np.int32), table[i + 1].astype(np.int32)
+            memberships.append(lo * (SCALE - frac) + hi * frac)
+        memberships.append(np.full((n, 1), self.one * SCALE, dtype=np.int32))
+        flat = np.concatenate(memberships, axis=1)
+        strength = flat[:, self.rule_slots].min(axis=2).astype(np.int64)
+
+        results = []
+        for c, (_, _, table) in enumerate(self.outputs):
+            cut = np.zeros((n, len(table)), dtype=np.int64)
+            for r in np.flatnonzero(self.rule_outputs[:, c] >= 0):
+                t = self.rule_outputs[r, c]
+                weighted = strength[:, r] * int(self.rule_weights[r, c])
+                # Rounded down, but never to zero from a firing rule
+                weighted = np.where(weighted > 0, np.clip(weighted >> FRAC_BITS, 1, self.one * SCALE), 0)
+                np.maximum(cut[:, t], weighted, out=cut[:, t])
+            y = np.minimum(cut[:, :, None], table[None].astype(np.int64) << FRAC_BITS).max(axis=1)
+            last = y.shape[1] - 1
+            index = np.arange(last + 1, dtype=np.int64)
+            # Polyline through (i, y_i): twice the area and six times the moment
+            area2 = 2 * y.sum(axis=1) - y[:, 0] - y[:, last]
+            moment6 = 6 * (y[:, 1:last] * index[1:last]).sum(axis=1) + y[:, 0] + (3 * last - 1) * y[:, last]
+            # Centroid = moment6 / (3 * area2), as a rounded Q12 position; -1 marks an empty output
+            den = 3 * area2
+            position = np.where(den > 0, ((moment6 << FRAC_BITS) + den // 2) // np.maximum(den, 1), -1)
+            results.append(position.astype(np.int32))
+        return results
+
+    def evaluate(self, inputs):
+        """Float in, float out wrapper around evaluate_fixed(); NaN where no rule fires."""
+        shape = np.broadcast(*[np.asarray(inputs[label]) for label in self.input_labels]).shape
+        values = {label: np.broadcast_to(np.asarray(inputs[label], dtype=np.float64), shape)
+                  for label in self.input_labels}
+        outputs = {}
+        for label, q, (start, step, _) in zip(self.output_labels, self.evaluate_fixed(self.positions(values)),
+                                              self.outputs):
+            outputs[label] = np.where(q >= 0, start + step * q / SCALE, np.nan).reshape(shape)
+        return outputs
+
+    def footprint(self):
+        """Bytes of every table, by kind."""
+        return {
+            'input_tables': sum(table.nbytes for _, _, table in self.inputs),
+            'output_tables': sum(table.nbytes for _, _, table in self.outputs),
+            'rules': self.rule_slots.nbytes + self.rule_outputs.nbytes + self.rule_weights.nbytes,
+            'scalars': 2 * 4 * (len(self.inputs) + len(self.outputs)),  # start and step as float32
+        }
+
+    @property
+    def nbytes(self):
+        return sum(self.footprint().values())
+
+
+def float_nbytes(compiled):
+    # Footprint of the float64 CompiledSystem tables, for comparison
+    variables = compiled.antecedents + compiled.consequents
+    return (sum(universe.nbytes + mfs.nbytes for _, universe, _, mfs in variables)
+            + compiled.rule_terms.nbytes + compiled.rule_outputs.nbytes + compiled.rule_weights.nbytes)
+
+
+def compile_fixed(name, precision='uint8', output_points=None):
+    return FixedPointSystem(get_compiled(name), precision, output_points)
+
+
+def measure_error(system, samples=20000, seed=0, reference_samples=200):
+    """Worst absolute error per output against the float reference.
+
+    Compares with the batch engine on a grid over the universes plus random
+    points, and with skfuzzy ControlSystemSimulation itself on
+    ``reference_samples`` of the random points. Returns {output: (max abs
+    error, error as a fraction of the universe span, NaN mismatches,
+    strongest rule of any mismatch)}. A NaN mismatch is a sample only one
+    side leaves empty, which the tables and positions are built to prevent.
+    """
+    compiled = get_compiled(system.name)
+    rng = np.random.default_rng(seed)
+    axes = [np.linspace(universe[0], universe[-1], min(4 * len(universe) + 1, 81))
+            for _, universe, _, _ in compiled.antecedents]
+    grid = np.meshgrid(*axes, indexing='ij')
+    points = {label: np.concatenate([axis.ravel(), rng.uniform(universe[0], universe[-1], samples)])
+              for label, axis, (_, universe, _, _) in zip(compiled.input_labels, grid, compiled.antecedents)}
+    expected = compiled.evaluate(points)
+    actual = system.evaluate(points)
+    strongest = compiled.fire(compiled.fuzzify(points)[1]).max(axis=1)
+
+    if reference_samples:
+        from modules.registry import registry
+        picks = rng.choice(samples, min(samples, reference_samples), replace=False) + grid[0].size
+        for row in picks:
+            reference = registry.compute(system.name, {label: points[label][row] for label in compiled.input_labels})
+            for label in compiled.output_labels:
+                expected[label][row] = reference.get(label, np.nan)
+
+    report = {}
+    for label, (_, universe, _, _) in zip(compiled.output_labels, compiled.consequents):
+        a, b = actual[label], expected[label]
+        mismatch = np.isnan(a) != np.isnan(b)
+        both = ~(np.isnan(a) | np.isnan(b))
+        error = float(np.abs(a[both] - b[both]).max()) if both.any() else 0.0
+        report[label] = (error, error / (universe[-1] - universe[0]), int(mismatch.sum()),
+                         float(strongest[mismatch].max()) if mismatch.any() else 0.0)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile controllers to fixed-point tables and report error and memory")
+    parser.add_argument('names', nargs='*', default=list(CONTROLLERS), help="controllers (default: all)")
+    parser.add_argument('--precision', choices=list(PRECISIONS), default='uint8', help="membership degree type")
+    parser.add_argument('--output-points', type=int, help="resample consequent tables to this many points")
+    parser.add_argument('--samples', type=int, default=20000, help="random samples for the error measurement")
+    parser.add_argument('--reference-samples', type=int, default=200, help="of which checked against skfuzzy")
+    parser.add_argument('--check', action='store_true',
+                        help="exit 1 if any output exceeds its ERROR_BOUNDS entry or has NaN mismatches")
+    args = parser.parse_args(argv)
+
+    bounds = ERROR_BOUNDS[args.precision] if args.output_points is None else {}
+    failed = False
+    for name in args.names:
+        system = compile_fixed(name, args.precision, args.output_points)
+        footprint = system.footprint()
+        print("{}: {} bytes fixed-point vs {} bytes float64 ({})".format(
+            name, system.nbytes, float_nbytes(get_compiled(name)),
+            ", ".join("{} {}".format(kind, size) for kind, size in footprint.items())))
+        for label, (error, relative, mismatches, _) in measure_error(system, args.samples,
+                                                                     reference_samples=args.reference_samples).items():
+            flag = ''
+            if relative > bounds.get((name, label), np.inf):
+                flag = '  EXCEEDS BOUND'
+                failed = True
+            if mismatches:
+                flag += '  NaN MISMATCH'
+                failed = True
+            print("  {}: max error {:.4f} ({:.2%} of span), {} NaN mismatches{}".format(
+                label, error, relative, mismatches, flag))
+    return 1 if args.check and failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import time
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, frame_key, get_compiled
+from modules.engine import active_instrumentation
+
+
+class FusedEvaluator:
+    """Evaluates several controllers on one sensor frame in a single pass.
+
+    Inputs are read from the frame by their frame key (see catalog.FRAME_KEYS).
+    A membership function that appears in more than one controller on the
+    same frame key and universe is computed once, and consequents that share
+    a term set (e.g. the steering outputs of modules 5 and 6) are defuzzified
+    together.
+
+    ``defuzzify`` is one method for every controller, or a dict of methods
+    by controller name (others use 'sampled'), e.g. {'module6': 'sugeno'}.
+    ``frame_keys`` maps (controller, input label) to a frame key for this
+    evaluator only, ahead of catalog.FRAME_KEYS.
+    """
+
+    def __init__(self, names=None, defuzzify='sampled', frame_keys=None):
+        self.names = list(names or CONTROLLERS)
+        methods = defuzzify if isinstance(defuzzify, dict) else dict.fromkeys(self.names, defuzzify)
+        self.systems = [get_compiled(name, methods.get(name, 'sampled')) for name in self.names]
+
+        # Distinct (frame key, universe, mf) triples, in first-seen order
+        slots = {}
+        self._slots = []
+        # Per controller, per antecedent: indices into the slot list
+        self._slot_index = []
+        overrides = frame_keys or {}
+        for name, compiled in zip(self.names, self.systems):
+            per_input = []
+            for label, universe, _, mfs in compiled.antecedents:
+                key = overrides.get((name, label)) or frame_key(name, label)
+                indices = []
+                for mf in mfs:
+                    slot = (key, universe.tobytes(), mf.tobytes())
+                    if slot not in slots:
+                        slots[slot] = len(self._slots)
+                        self._slots.append((key, universe, mf))
+                    indices.append(slots[slot])
+                per_input.append(np.array(indices))
+            self._slot_index.append(per_input)
+        self.frame_keys = sorted({key for key, _, _ in self._slots})
+
+        # Consequents grouped by identical universe, term set and defuzzification
+        groups = {}
+        for s, compiled in enumerate(self.systems):
+            for c, (_, universe, _, mfs) in enumerate(compiled.consequents):
+                groups.setdefault((universe.tobytes(), mfs.tobytes(), compiled.defuzzify_method), []).append((s, c))
+        self._groups = list(groups.values())
+
+    @property
+    def n_memberships(self):
+        # Membership functions evaluated per frame, against the unfused total
+        total = sum(len(mfs) for compiled in self.systems for _, _, _, mfs in compiled.antecedents)
+        return len(self._slots), total
+
+    def evaluate(self, frame):
+        """Return {controller: {output: value}} for one frame or a batch of frames.
+
+        Frame values may be scalars or equal-shaped arrays; outputs follow the
+        frame shape.
+        """
+        missing = [key for key in self.frame_keys if key not in frame]
+        if missing:
+            raise ValueError("Frame is missing inputs: " + ", ".join(missing))
+        values = dict(zip(self.frame_keys, np.broadcast_arrays(
+            *[np.asarray(frame[key], dtype=np.float64) for key in self.frame_keys])))
+        shape = values[self.frame_keys[0]].shape
+        flat = {key: value.reshape(-1) for key, value in values.items()}
+
+        probe = active_instrumentation()
+        start = time.perf_counter()
+        mu = np.stack([np.interp(flat[key], universe, mf) for key, universe, mf in self._slots], axis=1)
+        n = mu.shape[0]
+        if probe is not None:
+            # Shared memberships are computed once, so like a shared
+            # defuzzification the time is split evenly between the controllers
+            seconds = (time.perf_counter() - start) / len(self.names)
+            for name in self.names:
+                probe.record_stage(name, 'fuzzification', seconds, n)
+
+        cuts = []
+        for name, compiled, per_input in zip(self.names, self.systems, self._slot_index):
+            memberships = [mu[:, index] for index in per_input]
+            if probe is None:
+                cuts.append(compiled.accumulate(compiled.fire(memberships)))
+                continue
+            start = time.perf_counter()
+            strength = compiled.fire(memberships)
+            fired = time.perf_counter()
+            cuts.append(compiled.accumulate(strength))
+            probe.record_stage(name, 'activation', fired - start, n)
+            probe.record_stage(name, 'aggregation', time.perf_counter() - fired, n)
+            probe.record_rules(name, strength)
+
+        outputs = {name: {} for name in self.names}
+        for group in self._groups:
+            start = time.perf_counter()
+            s, c = group[0]
+            crisp = self.systems[s].defuzzify_output(c, np.concatenate([cuts[s][c] for s, c in group]))
+            for k, (s, c) in enumerate(group):
+                label = self.systems[s].output_labels[c]
+                outputs[self.names[s]][label] = crisp[k * n:(k + 1) * n].reshape(shape)
+            if probe is not None:
+                # A shared defuzzification is split evenly between its controllers
+                seconds = (time.perf_counter() - start) / len(group)
+                for s, _ in group:
+                    probe.record_stage(self.names[s], 'defuzzification', seconds, n)
+        return outputs
@@ -0,0 +1,87 @@
+import numpy as np
+
+from modules.catalog import get_compiled
+
+
+class IncrementalController:
+    """Stateful single-sample evaluation that only redoes work for changed inputs.
+
+    Remembers the last value and memberships of every antecedent, the rule
+    strengths, the cut levels and the crisp outputs. On each compute() only
+    antecedents whose value changed are fuzzified again, only the rules using
+    them are fired again, only the consequent terms those rules imply are
+    re-aggregated, and only outputs whose cut levels moved are defuzzified.
+    Results equal a full evaluation; outputs no rule fires are left out, as
+    ControlSystemSimulation does.
+    """
+
+    def __init__(self, name, defuzzify='sampled'):
+        self.compiled = compiled = get_compiled(name, defuzzify)
+        self.name = name
+        # Same single-sample membership layout as CompiledSystem.evaluate_one
+        self._memberships = np.ones(compiled._n_terms + 1)
+        self._rules_of = [np.flatnonzero(compiled.rule_terms[:, a] >= 0)
+                          for a in range(len(compiled.antecedents))]
+        self._strength = np.zeros(compiled.n_rules)
+        self._levels = [np.zeros(len(term_labels)) for _, _, term_labels, _ in compiled.consequents]
+        # Per consequent: (term, rules, weights, mask of those rules) for every implied term
+        self._implied = []
+        for implied in compiled._implied:
+            entries = []
+            for t, rules, weights in implied:
+                mask = np.zeros(compiled.n_rules, dtype=bool)
+                mask[rules] = True
+                entries.append((t, rules, weights, mask))
+            self._implied.append(entries)
+        self._crisp = [np.nan] * len(self._levels)
+        self.reset()
+
+    def reset(self):
+        """Forget the previous inputs so the next call evaluates everything."""
+        self._values = [None] * len(self.compiled.antecedents)
+        self.calls = 0
+        self.fuzzified = 0
+        self.fired = 0
+        self.defuzzified = 0
+
+    def compute(self, inputs):
+        compiled = self.compiled
+        missing = [label for label in compiled.input_labels if label not in inputs]
+        if missing:
+            raise ValueError("All antecedents must have input values! Missing: " + ", ".join(missing))
+        self.calls += 1
+        changed = []
+        for a, label in enumerate(compiled.input_labels):
+            value = float(inputs[label])
+            if value != self._values[a]:
+                self._values[a] = value
+                start = compiled._offsets[a]
+                mu = compiled.fuzzify_input(a, np.array([value]))[0]
+                self._memberships[start:start + len(mu)] = mu
+                changed.append(a)
+        if changed:
+            self._refire(np.unique(np.concatenate([self._rules_of[a] for a in changed])))
+            self.fuzzified += len(changed)
+        return {label: value for label, value in zip(compiled.output_labels, self._crisp)
+                if not np.isnan(value)}
+
+    def _refire(self, rules):
+        self._strength[rules] = np.fmin.reduce(self._memberships[self.compiled._rule_slots[rules]], axis=1,
+                                               initial=1.0)
+        self.fired += len(rules)
+        for c, implied in enumerate(self._implied):
+            level = self._levels[c]
+            moved = False
+            for t, term_rules, weights, mask in implied:
+                if mask[rules].any():
+                    cut = np.fmax.reduce(self._strength[term_rules] * weights)
+                    if cut != level[t]:
+                        level[t] = cut
+                        moved = True
+            if moved:
+                self._crisp[c] = float(self.compiled.defuzzify_output(c, level[None])[0])
+                self.defuzzified += 1
+
+    def stats(self):
+        return {'calls': self.calls, 'fuzzified': self.fuzzified,
+                'fired': self.fired, 'defuzzified': self.defuzzified}
@@ -0,0 +1,149 @@
+import json
+import threading
+
+import numpy as np
+
+from modules import engine
+
+# Stage-time histogram buckets: upper bounds in seconds, 1 us doubling to ~8 s
+TIME_BUCKETS = 1e-6 * 2.0 ** np.arange(24)
+# Rule-strength histogram buckets: upper bounds of (0, 0.1], ..., (0.9, 1]
+STRENGTH_BUCKETS = np.linspace(0.1, 1.0, 10)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One extra bucket for values above the last bound
+        self.counts = np.zeros(len(bounds) + 1, dtype=np.int64)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[np.searchsorted(self.bounds, value)] += 1
+        self.total += value
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+
+class Instrumentation:
+    """Stage timings and rule-firing counters collected from the batch engine.
+
+    Per controller it keeps a histogram of the time spent in each stage
+    (fuzzification, activation, aggregation, defuzzification) per evaluate
+    call, the number of samples evaluated, and for each rule in the module's
+    ``rules`` list how many samples fired it (strength > 0) with a histogram
+    and the sum of those strengths.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.samples = {}
+        self.rule_fired = {}
+        self.rule_strength = {}
+        self.rule_strength_sum = {}
+
+    def record_stage(self, name, stage, seconds, samples):
+        with self._lock:
+            key = (name, stage)
+            if key not in self.stages:
+                self.stages[key] = Histogram(TIME_BUCKETS)
+            self.stages[key].observe(seconds)
+            # Activation is recorded once per controller on every path, fused or not
+            if stage == 'activation':
+                self.samples[name] = self.samples.get(name, 0) + samples
+
+    def record_rules(self, name, strength):
+        n_rules = strength.shape[1]
+        fired = strength > 0
+        rule = np.broadcast_to(np.arange(n_rules), strength.shape)[fired]
+        bucket = np.searchsorted(STRENGTH_BUCKETS, strength[fired])
+        counts = np.bincount(rule * len(STRENGTH_BUCKETS) + bucket,
+                             minlength=n_rules * len(STRENGTH_BUCKETS)).reshape(n_rules, -1)
+        total = np.bincount(rule, weights=strength[fired], minlength=n_rules)
+        with self._lock:
+            if name not in self.rule_fired:
+                self.rule_fired[name] = np.zeros(n_rules, dtype=np.int64)
+                self.rule_strength[name] = np.zeros((n_rules, len(STRENGTH_BUCKETS)), dtype=np.int64)
+                self.rule_strength_sum[name] = np.zeros(n_rules)
+            self.rule_fired[name] += fired.sum(axis=0)
+            self.rule_strength[name] += counts
+            self.rule_strength_sum[name] += total
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.samples.clear()
+            self.rule_fired.clear()
+            self.rule_strength.clear()
+            self.rule_strength_sum.clear()
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+            for (name, stage), histogram in self.stages.items():
+                stages.setdefault(name, {})[stage] = {
+                    'calls': histogram.count,
+                    'seconds': histogram.total,
+                    'buckets': histogram.counts.tolist(),
+                }
+            return {
+                'time_buckets': TIME_BUCKETS.tolist(),
+                'strength_buckets': STRENGTH_BUCKETS.tolist(),
+                'stages': stages,
+                'samples': dict(self.samples),
+                'rules': {name: {'fired': self.rule_fired[name].tolist(),
+                                 'strength': self.rule_strength[name].tolist(),
+                                 'strength_sum': self.rule_strength_sum[name].tolist()}
+                          for name in self.rule_fired},
+            }
+
+    def dump(self, path):
+        with open(path, 'w') as handle:
+            json.dump(self.snapshot(), handle, indent=2)
+
+    def prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = ['# TYPE fuzzy_stage_seconds histogram']
+        for name, stages in snapshot['stages'].items():
+            for stage, data in stages.items():
+                labels = 'controller="{}",stage="{}"'.format(name, stage)
+                cumulative = np.cumsum(data['buckets'])
+                for bound, count in zip(snapshot['time_buckets'], cumulative):
+                    lines.append('fuzzy_stage_seconds_bucket{{{},le="{:g}"}} {}'.format(labels, bound, count))
+                lines.append('fuzzy_stage_seconds_bucket{{{},le="+Inf"}} {}'.format(labels, cumulative[-1]))
+                lines.append('fuzzy_stage_seconds_sum{{{}}} {}'.format(labels, data['seconds']))
+                lines.append('fuzzy_stage_seconds_count{{{}}} {}'.format(labels, data['calls']))
+        lines.append('# TYPE fuzzy_samples_total counter')
+        for name, count in snapshot['samples'].items():
+            lines.append('fuzzy_samples_total{{controller="{}"}} {}'.format(name, count))
+        lines.append('# TYPE fuzzy_rule_fired_total counter')
+        for name, rules in snapshot['rules'].items():
+            for rule, count in enumerate(rules['fired']):
+                lines.append('fuzzy_rule_fired_total{{controller="{}",rule="{}"}} {}'.format(name, rule, count))
+        # Strengths of the samples that fired each rule; unfired samples are not observed
+        lines.append('# TYPE fuzzy_rule_strength histogram')
+        for name, rules in snapshot['rules'].items():
+            for rule, (buckets, total) in enumerate(zip(rules['strength'], rules['strength_sum'])):
+                labels = 'controller="{}",rule="{}"'.format(name, rule)
+                cumulative = np.cumsum(buckets)
+                for bound, count in zip(snapshot['strength_buckets'], cumulative):
+                    lines.append('fuzzy_rule_strength_bucket{{{},le="{:g}"}} {}'.format(labels, bound, count))
+                lines.append('fuzzy_rule_strength_bucket{{{},le="+Inf"}} {}'.format(labels, cumulative[-1]))
+                lines.append('fuzzy_rule_strength_sum{{{}}} {}'.format(labels, total))
+                lines.append('fuzzy_rule_strength_count{{{}}} {}'.format(labels, rules['fired'][rule]))
+        return '\n'.join(lines) + '\n'
+
+
+def enable(instrumentation=None):
+    """Start collecting from every batch evaluation in this process."""
+    instrumentation = instrumentation or Instrumentation()
+    engine.set_instrumentation(instrumentation)
+    return instrumentation
+
+
+def disable():
+    engine.set_instrumentation(None)
@@ -0,0 +1,224 @@
+import argparse
+import os
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, DATA_DIR, get_compiled, get_factory
+
+LUT_DIR = os.path.join(DATA_DIR, 'lut')
+
+
+class SurfaceTable:
+    """Control surface sampled on a regular grid, queried by multilinear interpolation.
+
+    Inputs outside the grid are clipped to it, as ControlSystemSimulation does.
+    Cells where no rule fires hold NaN and interpolate to NaN. A NaN input has
+    no place on the grid, so every output of that sample is NaN.
+    """
+
+    def __init__(self, name, input_labels, axes, output_labels, values, sampled_error=None):
+        self.name = name
+        self.input_labels = list(input_labels)
+        self.axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        self.output_labels = list(output_labels)
+        # values: (outputs, *grid shape)
+        self.values = np.asarray(values)
+        # Output label -> largest abs error found by measure_error(), if measured;
+        # an estimate from probe points, not a guaranteed bound
+        self.sampled_error = sampled_error
+
+        shape = self.values.shape[1:]
+        for axis, n in zip(self.axes, shape):
+            if len(axis) < 2 or not np.allclose(np.diff(axis), axis[1] - axis[0]):
+                raise ValueError("Table axes must be regular grids of at least two points")
+            if len(axis) != n:
+                raise ValueError("Axis length does not match table shape")
+        # Per-axis (start, step, last cell) and flat strides for the scalar path
+        self._grid = [(float(axis[0]), float(axis[1] - axis[0]), len(axis) - 2) for axis in self.axes]
+        self._strides = [int(np.prod(shape[d + 1:])) for d in range(len(shape))]
+        self._flat = [self.values[k].astype(np.float64).ravel() for k in range(len(self.output_labels))]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + sum(axis.nbytes for axis in self.axes)
+
+    def lookup(self, inputs):
+        # Single sample: plain Python arithmetic over the 2**d surrounding grid points
+        base = 0
+        corners = [(0, 1.0)]
+        for label, (start, step, last), stride in zip(self.input_labels, self._grid, self._strides):
+            pos = (float(inputs[label]) - start) / step
+            if pos != pos:
+                return {label: np.nan for label in self.output_labels}
+            if pos <= 0:
+                i, frac = 0, 0.0
+            elif pos >= last + 1:
+                i, frac = last, 1.0
+            else:
+                i = int(pos)
+                frac = pos - i
+            base += i * stride
+            corners = [(offset + bit * stride, weight * (frac if bit else 1.0 - frac))
+                       for offset, weight in corners for bit in (0, 1)]
+        return {label: sum(flat.item(base + offset) * weight for offset, weight in corners)
+                for label, flat in zip(self.output_labels, self._flat)}
+
+    def lookup_batch(self, inputs):
+        values = np.broadcast_arrays(*[np.asarray(inputs[label], dtype=np.float64)
+                                       for label in self.input_labels])
+        shape = values[0].shape
+        index = []
+        frac = []
+        missing = np.zeros(values[0].size if values else 1, dtype=bool)
+        for value, (start, step, last) in zip(values, self._grid):
+            value = value.ravel()
+            missing |= np.isnan(value)
+            # NaN positions go to cell 0 for the arithmetic and are masked afterwards
+            pos = np.clip(np.nan_to_num((value - start) / step, nan=0.0), 0, last + 1)
+            i = np.minimum(pos.astype(np.intp), last)
+            index.append(i)
+            frac.append(pos - i)
+        out = {label: np.zeros(len(index[0]) if index else 1) for label in self.output_labels}
+        for corner in range(2 ** len(index)):
+            weight = 1.0
+            at = []
+            for d, (i, f) in enumerate(zip(index, frac)):
+                bit = (corner >> (len(index) - 1 - d)) & 1
+                weight = weight * (f if bit else 1.0 - f)
+                at.append(i + bit)
+            for k, label in enumerate(self.output_labels):
+                out[label] += weight * self.values[k][tuple(at)]
+        for value in out.values():
+            value[missing] = np.nan
+        return {label: value.reshape(shape) for label, value in out.items()}
+
+    def save(self, path):
+        np.savez_compressed(path, name=self.name, input_labels=self.input_labels,
+                            output_labels=self.output_labels, values=self.values,
+                            sampled_error=[np.nan if self.sampled_error is None else self.sampled_error[label]
+                                           for label in self.output_labels],
+                            **{'axis_{}'.format(d): axis for d, axis in enumerate(self.axes)})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            axes = [data['axis_{}'.format(d)] for d in range(data['values'].ndim - 1)]
+            output_labels = data['output_labels'].tolist()
+            sampled_error = data['sampled_error'] if 'sampled_error' in data else np.array([np.nan])
+            if np.isnan(sampled_error).any():
+                sampled_error = None
+            else:
+                sampled_error = dict(zip(output_labels, sampled_error.tolist()))
+            return cls(str(data['name']), data['input_labels'].tolist(), axes,
+                       output_labels, data['values'], sampled_error)
+
+
+def table_path(name):
+    return os.path.join(LUT_DIR, name + '.npz')
+
+
+def load_table(name):
+    path = table_path(name)
+    if not os.path.exists(path):
+        raise FileNotFoundError("No compiled table for {}, run: python -m modules.lut {}".format(name, name))
+    return SurfaceTable.load(path)
+
+
+def compile_table(name, points=None, min_points=11, dtype=np.float32):
+    """Sample a controller's outputs on a grid.
+
+    The default grid is each antecedent's universe, refined to ``min_points``
+    for coarse universes such as the 3-point discrete inputs; ``points`` maps
+    an input label to a number of evenly spaced points to use instead.
+    """
+    compiled = get_compiled(name)
+    points = points or {}
+    axes = []
+    for label, universe, _, _ in compiled.antecedents:
+        n = points.get(label, max(len(universe), min_points))
+        if n == len(universe):
+            axes.append(universe)
+        else:
+            axes.append(np.linspace(universe[0], universe[-1], n))
+    mesh = np.meshgrid(*axes, indexing='ij')
+    outputs = compiled.evaluate(dict(zip(compiled.input_labels, mesh)))
+    values = np.stack([outputs[label] for label in compiled.output_labels]).astype(dtype)
+    return SurfaceTable(name, compiled.input_labels, axes, compiled.output_labels, values)
+
+
+def probe_points(table, compiled):
+    """Per-axis coordinates where interpolation error peaks.
+
+    The midpoint of every grid cell, where the table is furthest from its
+    samples, and points a quarter cell either side of every membership
+    breakpoint, where the surface bends inside a cell.
+    """
+    probes = []
+    for axis, (_, universe, _, mfs) in zip(table.axes, compiled.antecedents):
+        step = axis[1] - axis[0]
+        points = [0.5 * (axis[:-1] + axis[1:])]
+        for mf in mfs:
+            # Breakpoints: samples where the slope of the sampled mf changes
+            bends = np.flatnonzero(np.abs(np.diff(mf, 2)) > 1e-12) + 1
+            knots = np.concatenate([universe[bends], universe[[0, -1]]])
+            points.append(knots - 0.25 * step)
+            points.append(knots + 0.25 * step)
+        probes.append(np.unique(np.clip(np.concatenate(points), axis[0], axis[-1])))
+    return probes
+
+
+def measure_error(table, samples=1000, seed=0):
+    """Largest absolute difference per output between the table and the controller.
+
+    Checked on the grid of probe_points(), against the compiled engine
+    (which matches ControlSystemSimulation to rounding), and at ``samples``
+    random points against a live ControlSystemSimulation. Points where either
+    side has no output are skipped. This is the largest error found, not a
+    proven bound: the surface is not linear inside a cell.
+    """
+    compiled = get_compiled(table.name)
+    mesh = np.meshgrid(*probe_points(table, compiled), indexing='ij')
+    inputs = dict(zip(table.input_labels, mesh))
+    exact = compiled.evaluate(inputs)
+    approx = table.lookup_batch(inputs)
+    errors = {}
+    for label in table.output_labels:
+        error = np.abs(exact[label] - approx[label])
+        errors[label] = float(np.nanmax(error)) if not np.isnan(error).all() else 0.0
+
+    rng = np.random.default_rng(seed)
+    sim = get_factory(table.name)()
+    for _ in range(samples):
+        inputs = {label: rng.uniform(axis[0], axis[-1]) for label, axis in zip(table.input_labels, table.axes)}
+        sim.inputs(inputs)
+        sim.compute()
+        approx = table.lookup(inputs)
+        for label in table.output_labels:
+            if label in sim.output and not np.isnan(approx[label]):
+                errors[label] = max(errors[label], abs(float(sim.output[label]) - approx[label]))
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile controller output surfaces into lookup tables")
+    parser.add_argument('names', nargs='*', default=list(CONTROLLERS), help="controllers to compile (default: all)")
+    parser.add_argument('--samples', type=int, default=1000, help="random live simulation samples added to the probe points")
+    parser.add_argument('--min-points', type=int, default=11, help="minimum grid points per input")
+    parser.add_argument('--points', action='append', default=[], metavar='LABEL=N',
+                        help="grid points for one input, may be repeated")
+    args = parser.parse_args(argv)
+    points = {label: int(n) for label, n in (item.split('=') for item in args.points)}
+
+    os.makedirs(LUT_DIR, exist_ok=True)
+    for name in args.names:
+        table = compile_table(name, points, args.min_points)
+        errors = measure_error(table, args.samples)
+        table.sampled_error = errors
+        table.save(table_path(name))
+        report = ", ".join("{}={:.4f}".format(label, error) for label, error in errors.items())
+        print("{}: grid {} ({} KiB), sampled max error {}".format(
+            name, "x".join(str(len(axis)) for axis in table.axes), table.nbytes // 1024, report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+
+from modules import rulebase
+from modules.catalog import CONTROLLERS
+
+
+class ControllerCache:
+    """Bounded LRU cache of one controller's outputs, keyed on quantized inputs.
+
+    ``resolution`` is the quantization step, either one number for every
+    input or a dict by input label; inputs without a step are keyed on their
+    exact value. Quantized inputs are evaluated at the step point itself, so
+    a cached result does not depend on which reading filled it.
+    """
+
+    def __init__(self, name, compute, resolution=None, maxsize=4096):
+        self.name = name
+        self._compute = compute
+        self._resolution = resolution
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = rulebase.generation()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _step(self, label):
+        if isinstance(self._resolution, dict):
+            return self._resolution.get(label)
+        return self._resolution
+
+    def _quantize(self, inputs):
+        quantized = {}
+        for label, value in inputs.items():
+            step = self._step(label)
+            value = float(value)
+            quantized[label] = round(value / step) * step if step else value
+        return quantized
+
+    def compute(self, inputs):
+        quantized = self._quantize(inputs)
+        key = tuple(sorted(quantized.items()))
+        with self._lock:
+            if self._generation != rulebase.generation():
+                self._invalidate()
+            outputs = self._entries.get(key)
+            if outputs is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(outputs)
+            self.misses += 1
+        outputs = self._compute(self.name, quantized)
+        with self._lock:
+            self._entries[key] = outputs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return dict(outputs)
+
+    def _invalidate(self):
+        self._entries.clear()
+        self._generation = rulebase.generation()
+        self.invalidations += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._invalidate()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
+class MemoizedControllers:
+    """Memoization in front of the registry or the compiled runtime.
+
+    Has the same compute(name, inputs) interface as the object it wraps and
+    keeps one ControllerCache per controller. ``resolution`` applies to every
+    controller (a step, or steps by input label); ``resolutions`` overrides
+    it per controller. Caches are cleared when the rule base is reloaded
+    (rulebase.reload()) or by invalidate().
+    """
+
+    def __init__(self, backend=None, resolution=None, maxsize=4096, resolutions=None):
+        if backend is None:
+            from modules.runtime import runtime as backend
+        self.backend = backend
+        self._resolution = resolution
+        self._resolutions = resolutions or {}
+        self.maxsize = maxsize
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def cache(self, name):
+        cache = self._caches.get(name)
+        if cache is None:
+            if name not in CONTROLLERS:
+                raise KeyError("Unknown controller '{}', expected one of: {}".format(name, ", ".join(CONTROLLERS)))
+            with self._lock:
+                cache = self._caches.setdefault(name, ControllerCache(
+                    name, self.backend.compute, self._resolutions.get(name, self._resolution), self.maxsize))
+        return cache
+
+    def compute(self, name, inputs):
+        return self.cache(name).compute(inputs)
+
+    def invalidate(self, name=None):
+        for cache in ([self.cache(name)] if name else list(self._caches.values())):
+            cache.invalidate()
+
+    def stats(self):
+        return {name: cache.stats() for name, cache in list(self._caches.items())}
@@ -1,110 +1,15 @@
-import numpy as np
-import skfuzzy as fuzz
 from skfuzzy import control as ctrl
 
-def create_steering_control_system():
-    # Define variables
-    lane_dev = ctrl.Antecedent(np.arange(-1, 2, 1), 'lane_dev')      # -1: Left, 0: Center, 1: Right
-    curvature = ctrl.Antecedent(np.arange(0, 101, 1), 'curvature')   # 0: Straight, 100: Sharp Curve
-    obstacle = ctrl.Antecedent(np.arange(-1, 2, 1), 'obstacle')      # -1: Left, 0: Center, 1: Right
-    steering = ctrl.Consequent(np.arange(-100, 101, 1), 'steering')  # -100: Sharp Left, 100: Sharp Right
-
-    # Membership functions
-    lane_dev['left'] = fuzz.trimf(lane_dev.universe, [-1, -1, 0])
-    lane_dev['center'] = fuzz.trimf(lane_dev.universe, [-1, 0, 1])
-    lane_dev['right'] = fuzz.trimf(lane_dev.universe, [0, 1, 1])
-
-    curvature['straight'] = fuzz.trimf(curvature.universe, [0, 0, 30])
-    curvature['mild'] = fuzz.trimf(curvature.universe, [20, 50, 80])
-    curvature['sharp'] = fuzz.trimf(curvature.universe, [60, 100, 100])
-
-    obstacle['left'] = fuzz.trimf(obstacle.universe, [-1, -1, 0])
-    obstacle['center'] = fuzz.trimf(obstacle.universe, [-1, 0, 1])
-    obstacle['right'] = fuzz.trimf(obstacle.universe, [0, 1, 1])
-
-    steering['sharp_left'] = fuzz.trimf(steering.universe, [-100, -100, -50])
-    steering['slight_left'] = fuzz.trimf(steering.universe, [-80, -40, 0])
-    steering['straight'] = fuzz.trimf(steering.universe, [-10, 0, 10])
-    steering['slight_right'] = fuzz.trimf(steering.universe, [0, 40, 80])
-    steering['sharp_right'] = fuzz.trimf(steering.universe, [50, 100, 100])
-
-    # Rules
-    rules = [
-        ctrl.Rule(lane_dev['left'] & curvature['straight'], steering['slight_right']),
-        ctrl.Rule(lane_dev['right'] & curvature['straight'], steering['slight_left']),
-        ctrl.Rule(lane_dev['left'] & curvature['mild'], steering['slight_right']),
-        ctrl.Rule(lane_dev['right'] & curvature['mild'], steering['slight_left']),
-        ctrl.Rule(lane_dev['left'] & curvature['sharp'], steering['sharp_right']),
-        ctrl.Rule(lane_dev['right'] & curvature['sharp'], steering['sharp_left']),
-        ctrl.Rule(lane_dev['center'], steering['straight']),
-
-        ctrl.Rule(obstacle['left'], steering['sharp_right']),
-        ctrl.Rule(obstacle['right'], steering['sharp_left']),
-        ctrl.Rule(obstacle['center'], steering['slight_right']),
-
-        ctrl.Rule(curvature['sharp'] & obstacle['right'], steering['sharp_left']),
-        ctrl.Rule(curvature['sharp'] & obstacle['left'], steering['sharp_right']),
-        ctrl.Rule(curvature['mild'] & obstacle['right'], steering['slight_left']),
-        ctrl.Rule(curvature['mild'] & obstacle['left'], steering['slight_right']),
-        ctrl.Rule(curvature['straight'] & obstacle['center'], steering['slight_right']),
-    ]
-
-    # Create control system
-    system = ctrl.ControlSystem(rules)
-    simulation = ctrl.ControlSystemSimulation(system)
-
-    return simulation
-import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
+from modules.engine import compile_factory
+from modules.rulebase import build_control_system
 
 def create_steering_control_system():
-    # Define fuzzy variables
-    lane_dev = ctrl.Antecedent(np.arange(-1, 2, 1), 'lane_dev')      # -1: Left, 0: Center, 1: Right
-    curvature = ctrl.Antecedent(np.arange(0, 101, 1), 'curvature')   # 0: Straight, 100: Sharp Curve
-    obstacle = ctrl.Antecedent(np.arange(-1, 2, 1), 'obstacle')      # -1: Left, 0: Center, 1: Right
-    steering = ctrl.Consequent(np.arange(-100, 101, 1), 'steering')  # -100: Sharp Left, 100: Sharp Right
-
-    # Membership functions
-    lane_dev['left'] = fuzz.trimf(lane_dev.universe, [-1, -1, 0])
-    lane_dev['center'] = fuzz.trimf(lane_dev.universe, [-1, 0, 1])
-    lane_dev['right'] = fuzz.trimf(lane_dev.universe, [0, 1, 1])
-
-    curvature['straight'] = fuzz.trimf(curvature.universe, [0, 0, 30])
-    curvature['mild'] = fuzz.trimf(curvature.universe, [20, 50, 80])
-    curvature['sharp'] = fuzz.trimf(curvature.universe, [60, 100, 100])
-
-    obstacle['left'] = fuzz.trimf(obstacle.universe, [-1, -1, 0])
-    obstacle['center'] = fuzz.trimf(obstacle.universe, [-1, 0, 1])
-    obstacle['right'] = fuzz.trimf(obstacle.universe, [0, 1, 1])
-
-    steering['sharp_left'] = fuzz.trimf(steering.universe, [-100, -100, -50])
-    steering['slight_left'] = fuzz.trimf(steering.universe, [-80, -40, 0])
-    steering['straight'] = fuzz.trimf(steering.universe, [-10, 0, 10])
-    steering['slight_right'] = fuzz.trimf(steering.universe, [0, 40, 80])
-    steering['sharp_right'] = fuzz.trimf(steering.universe, [50, 100, 100])
-
-    # Rule base
-    rules = [
-        ctrl.Rule(lane_dev['left'] & curvature['straight'], steering['slight_right']),
-        ctrl.Rule(lane_dev['right'] & curvature['straight'], steering['slight_left']),
-        ctrl.Rule(lane_dev['left'] & curvature['mild'], steering['slight_right']),
-        ctrl.Rule(lane_dev['right'] & curvature['mild'], steering['slight_left']),
-        ctrl.Rule(lane_dev['left'] & curvature['sharp'], steering['sharp_right']),
-        ctrl.Rule(lane_dev['right'] & curvature['sharp'], steering['sharp_left']),
-        ctrl.Rule(lane_dev['center'], steering['straight']),
-
-        ctrl.Rule(obstacle['left'], steering['sharp_right']),
-        ctrl.Rule(obstacle['right'], steering['sharp_left']),
-        ctrl.Rule(obstacle['center'], steering['slight_right']),
-
-        ctrl.Rule(curvature['sharp'] & obstacle['right'], steering['sharp_left']),
-        ctrl.Rule(curvature['sharp'] & obstacle['left'], steering['sharp_right']),
-        ctrl.Rule(curvature['mild'] & obstacle['right'], steering['slight_left']),
-        ctrl.Rule(curvature['mild'] & obstacle['left'], steering['slight_right']),
-        ctrl.Rule(curvature['straight'] & obstacle['center'], steering['slight_right']),
-    ]
-
-    # Create and return simulation system
-    system = ctrl.ControlSystem(rules)
+    # lane_dev: -1 left, 0 center, 1 right; curvature: 0 straight .. 100 sharp curve
+    # obstacle: -1 left, 0 center, 1 right; steering: -100 sharp left .. 100 sharp right
+    # Variables, membership functions and rules are defined in data/rulebase.json
+    system = build_control_system('module2')
     return ctrl.ControlSystemSimulation(system)
+
+def evaluate_batch(inputs, defuzzify='sampled'):
+    # Vectorized equivalent of create_steering_control_system() for arrays of inputs
+    return compile_factory(create_steering_control_system, defuzzify).evaluate(inputs)
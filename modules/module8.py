@@ -1,63 +1,15 @@
-import numpy as np
-import skfuzzy as fuzz
 from skfuzzy import control as ctrl
 
-def create_road_condition_adaptation_system():
-    # Define inputs
-    road = ctrl.Antecedent(np.arange(0, 3, 1), 'road')           # 0: Dry, 1: Wet, 2: Icy
-    visibility = ctrl.Antecedent(np.arange(0, 3, 1), 'visibility')  # 0: Clear, 1: Foggy, 2: Poor
-
-    # Define outputs
-    speed = ctrl.Consequent(np.arange(0, 3, 1), 'speed')  # 0: Slow Down, 1: Maintain, 2: Speed Up
-    brake = ctrl.Consequent(np.arange(0, 3, 1), 'brake')  # 0: Low, 1: Medium, 2: High
-
-    # Membership functions - road
-    road['dry'] = fuzz.trimf(road.universe, [0, 0, 0])
-    road['wet'] = fuzz.trimf(road.universe, [1, 1, 1])
-    road['icy'] = fuzz.trimf(road.universe, [2, 2, 2])
-
-    # Membership functions - visibility
-    visibility['clear'] = fuzz.trimf(visibility.universe, [0, 0, 0])
-    visibility['foggy'] = fuzz.trimf(visibility.universe, [1, 1, 1])
-    visibility['poor'] = fuzz.trimf(visibility.universe, [2, 2, 2])
-
-    # Membership functions - speed
-    speed['slow'] = fuzz.trimf(speed.universe, [0, 0, 0])
-    speed['maintain'] = fuzz.trimf(speed.universe, [1, 1, 1])
-    speed['fast'] = fuzz.trimf(speed.universe, [2, 2, 2])
-
-    # Membership functions - brake
-    brake['low'] = fuzz.trimf(brake.universe, [0, 0, 0])
-    brake['medium'] = fuzz.trimf(brake.universe, [1, 1, 1])
-    brake['high'] = fuzz.trimf(brake.universe, [2, 2, 2])
+from modules.engine import compile_factory
+from modules.rulebase import build_control_system
 
-    # Rule base
-    rules = [
-        # DRY road
-        ctrl.Rule(road['dry'] & visibility['clear'],
-                  consequent=[speed['maintain'], brake['low']]),
-        ctrl.Rule(road['dry'] & visibility['foggy'],
-                  consequent=[speed['slow'], brake['medium']]),
-        ctrl.Rule(road['dry'] & visibility['poor'],
-                  consequent=[speed['slow'], brake['high']]),
-
-        # WET road
-        ctrl.Rule(road['wet'] & visibility['clear'],
-                  consequent=[speed['maintain'], brake['medium']]),
-        ctrl.Rule(road['wet'] & visibility['foggy'],
-                  consequent=[speed['slow'], brake['medium']]),
-        ctrl.Rule(road['wet'] & visibility['poor'],
-                  consequent=[speed['slow'], brake['high']]),
-
-        # ICY road
-        ctrl.Rule(road['icy'] & visibility['clear'],
-                  consequent=[speed['slow'], brake['high']]),
-        ctrl.Rule(road['icy'] & visibility['foggy'],
-                  consequent=[speed['slow'], brake['high']]),
-        ctrl.Rule(road['icy'] & visibility['poor'],
-                  consequent=[speed['slow'], brake['high']])
-    ]
-
-    # Create control system and simulation
-    system = ctrl.ControlSystem(rules)
+def create_road_condition_adaptation_system():
+    # road: 0 dry, 1 wet, 2 icy; visibility: 0 clear, 1 foggy, 2 poor
+    # speed: 0 slow down, 1 maintain, 2 speed up; brake: 0 low, 1 medium, 2 high
+    # Variables, membership functions and rules are defined in data/rulebase.json
+    system = build_control_system('module8')
     return ctrl.ControlSystemSimulation(system)
+
+def evaluate_batch(inputs, defuzzify='sampled'):
+    # Vectorized equivalent of create_road_condition_adaptation_system() for arrays of inputs
+    return compile_factory(create_road_condition_adaptation_system, defuzzify).evaluate(inputs)
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import inspect
+import time
+from collections import deque
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, frame_key, get_compiled
+from modules.fused import FusedEvaluator
+
+
+class TickStats:
+    """Per-tick latency, start jitter and deadline accounting for a control loop.
+
+    Keeps the most recent ``window`` ticks for the distributions; counters
+    cover the whole run.
+    """
+
+    def __init__(self, period, window=10000):
+        self.period = period
+        self.latency = deque(maxlen=window)
+        self.lateness = deque(maxlen=window)
+        self.ticks = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def record(self, lateness, latency):
+        self.ticks += 1
+        self.lateness.append(lateness)
+        self.latency.append(latency)
+        if lateness + latency > self.period:
+            self.misses += 1
+
+    def summary(self):
+        latency = np.array(self.latency) * 1e3
+        lateness = np.array(self.lateness) * 1e3
+        if not len(latency):
+            return {'ticks': 0, 'misses': 0, 'skipped': self.skipped}
+        return {
+            'ticks': self.ticks,
+            'misses': self.misses,
+            'skipped': self.skipped,
+            'latency_ms': {'p50': float(np.percentile(latency, 50)),
+                           'p95': float(np.percentile(latency, 95)),
+                           'p99': float(np.percentile(latency, 99)),
+                           'max': float(latency.max())},
+            'jitter_ms': {'mean': float(lateness.mean()),
+                          'std': float(lateness.std()),
+                          'max': float(lateness.max())},
+        }
+
+
+class ControlLoop:
+    """Fixed-rate asyncio control loop.
+
+    Each tick merges the latest frame from every sensor source, runs the
+    selected controllers on it and hands the outputs to every sink. Sources
+    are callables returning a dict of frame values; sinks are called with
+    (tick, outputs). Either may be coroutine functions. A tick misses its
+    deadline when it finishes after the next tick was due; ticks that are
+    already overdue when the loop catches up are skipped, not run late.
+    """
+
+    def __init__(self, names=None, rate=50.0, sources=(), sinks=(), engine='batch'):
+        self.names = list(names or CONTROLLERS)
+        self.period = 1.0 / rate
+        self.sources = list(sources)
+        self.sinks = list(sinks)
+        self.stats = TickStats(self.period)
+        self.frame = {}
+        self._running = False
+        if engine == 'batch':
+            self._evaluator = FusedEvaluator(self.names)
+            self._step = self._step_batch
+        elif engine == 'skfuzzy':
+            from modules.registry import registry
+            registry.warm(self.names)
+            self._registry = registry
+            self._step = self._step_skfuzzy
+        elif engine == 'incremental':
+            from modules.incremental import IncrementalController
+            self._controllers = {name: IncrementalController(name) for name in self.names}
+            self._step = self._step_incremental
+        else:
+            raise ValueError("Unknown engine '{}'".format(engine))
+
+    def _step_batch(self, frame):
+        outputs = self._evaluator.evaluate(frame)
+        return {name: {label: float(value) for label, value in values.items()}
+                for name, values in outputs.items()}
+
+    def _step_skfuzzy(self, frame):
+        outputs = {}
+        for name in self.names:
+            labels = get_compiled(name).input_labels
+            outputs[name] = self._registry.compute(name, {label: frame[frame_key(name, label)]
+                                                          for label in labels})
+        return outputs
+
+    def _step_incremental(self, frame):
+        return {name: controller.compute({label: frame[frame_key(name, label)]
+                                          for label in controller.compiled.input_labels})
+                for name, controller in self._controllers.items()}
+
+    async def _tick(self, tick):
+        for source in self.sources:
+            update = source()
+            if inspect.isawaitable(update):
+                update = await update
+            self.frame.update(update)
+        outputs = self._step(self.frame)
+        for sink in self.sinks:
+            result = sink(tick, outputs)
+            if inspect.isawaitable(result):
+                await result
+        return outputs
+
+    async def run(self, duration=None, ticks=None):
+        """Run until stop(), or for ``duration`` seconds or ``ticks`` ticks."""
+        loop = asyncio.get_running_loop()
+        self._running = True
+        start = loop.time()
+        tick = 0
+        while self._running:
+            if ticks is not None and self.stats.ticks >= ticks:
+                break
+            due = start + tick * self.period
+            if duration is not None and due - start >= duration:
+                break
+            now = loop.time()
+            if now < due:
+                await asyncio.sleep(due - now)
+            elif now - due >= self.period:
+                # Overran past the next slot: drop the ticks we can no longer meet
+                behind = int((now - due) / self.period)
+                self.stats.skipped += behind
+                tick += behind
+                continue
+            begin = time.perf_counter()
+            lateness = loop.time() - due
+            await self._tick(tick)
+            self.stats.record(lateness, time.perf_counter() - begin)
+            tick += 1
+        self._running = False
+        return self.stats.summary()
+
+    def stop(self):
+        self._running = False
+
+
+class RandomWalkSource:
+    """Synthetic sensor source: every frame key of the given controllers drifts
+    randomly within its universe."""
+
+    def __init__(self, names=None, step=0.02, seed=0):
+        self._rng = np.random.default_rng(seed)
+        self._bounds = {}
+        for name in names or CONTROLLERS:
+            for label, universe, _, _ in get_compiled(name).antecedents:
+                self._bounds[frame_key(name, label)] = (universe[0], universe[-1])
+        self._step = step
+        self._frame = {key: float(self._rng.uniform(lo, hi)) for key, (lo, hi) in self._bounds.items()}
+
+    def __call__(self):
+        for key, (lo, hi) in self._bounds.items():
+            value = self._frame[key] + self._rng.normal(0, self._step * (hi - lo))
+            self._frame[key] = float(min(max(value, lo), hi))
+        return self._frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the controllers in a fixed-rate loop on synthetic sensors")
+    parser.add_argument('--modules', default=','.join(CONTROLLERS), help="comma-separated controllers")
+    parser.add_argument('--rate', type=float, default=50.0, help="tick rate in Hz")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds to run")
+    parser.add_argument('--engine', choices=['batch', 'skfuzzy', 'incremental'], default='batch')
+    args = parser.parse_args(argv)
+
+    names = args.modules.split(',')
+    loop = ControlLoop(names, args.rate, [RandomWalkSource(names)], engine=args.engine)
+    summary = asyncio.run(loop.run(duration=args.duration))
+    print("{} ticks at {:g} Hz: {} deadline misses, {} skipped".format(
+        summary['ticks'], args.rate, summary['misses'], summary['skipped']))
+    if summary['ticks']:
+        print("latency ms  p50 {p50:.3f}  p95 {p95:.3f}  p99 {p99:.3f}  max {max:.3f}".format(**summary['latency_ms']))
+        print("jitter ms   mean {mean:.3f}  std {std:.3f}  max {max:.3f}".format(**summary['jitter_ms']))
+
+
+if __name__ == "__main__":
+    main()
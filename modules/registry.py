@@ -0,0 +1,97 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from modules import rulebase
+from modules.catalog import CONTROLLERS, get_factory
+
+
+class _Entry:
+    def __init__(self, system, build_seconds):
+        self.system = system
+        self.build_seconds = build_seconds
+        # Rule base generation the system was built from
+        self.generation = rulebase.generation()
+        # skfuzzy keeps the current inputs on the shared Antecedent objects, so
+        # simulations of one ControlSystem must not run concurrently.
+        self.lock = threading.Lock()
+        self.simulations = 0
+        self.acquisitions = 0
+
+
+class ControllerRegistry:
+    """Builds each ControlSystem once and hands out reusable simulations.
+
+    Every thread keeps its own pool of ControlSystemSimulation objects per
+    controller; a simulation is reset before it goes back to the pool.
+    Systems are rebuilt after rulebase.reload(), since the factories build
+    them from the rule base.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._local = threading.local()
+
+    def _entry(self, name):
+        entry = self._entries.get(name)
+        if entry is None or entry.generation != rulebase.generation():
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is None or entry.generation != rulebase.generation():
+                    factory = get_factory(name)
+                    start = time.perf_counter()
+                    system = factory().ctrl
+                    entry = _Entry(system, time.perf_counter() - start)
+                    self._entries[name] = entry
+        return entry
+
+    def _pool(self, name):
+        pools = getattr(self._local, 'pools', None)
+        if pools is None:
+            pools = self._local.pools = {}
+        return pools.setdefault(name, [])
+
+    def system(self, name):
+        return self._entry(name).system
+
+    def warm(self, names=None):
+        for name in names or CONTROLLERS:
+            self._entry(name)
+
+    @contextmanager
+    def simulation(self, name):
+        entry = self._entry(name)
+        pool = self._pool(name)
+        with entry.lock:
+            if pool and pool[-1].ctrl is not entry.system:
+                # Built from a rule base that has since been reloaded
+                pool.clear()
+            if pool:
+                sim = pool.pop()
+            else:
+                # Imported here so that loading the registry stays cheap
+                from skfuzzy import control as ctrl
+                sim = ctrl.ControlSystemSimulation(entry.system)
+                entry.simulations += 1
+            entry.acquisitions += 1
+            try:
+                yield sim
+            finally:
+                sim.reset()
+                pool.append(sim)
+
+    def compute(self, name, inputs):
+        with self.simulation(name) as sim:
+            sim.inputs(inputs)
+            sim.compute()
+            return dict(sim.output)
+
+    def metrics(self):
+        return {name: {'build_seconds': entry.build_seconds,
+                       'simulations': entry.simulations,
+                       'acquisitions': entry.acquisitions}
+                for name, entry in list(self._entries.items())}
+
+
+registry = ControllerRegistry()
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import time
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS
+from modules.fused import FusedEvaluator
+
+
+class ArraySource:
+    """Sensor log held in a memory-mapped array: .npy files or raw binary records.
+
+    Structured arrays provide their own column names; plain 2-D arrays and
+    raw files need ``fields``.
+    """
+
+    def __init__(self, data, fields=None):
+        if data.dtype.names is None:
+            if fields is None or data.ndim != 2 or data.shape[1] != len(fields):
+                raise ValueError("Unstructured logs need one field name per column")
+            self.columns = list(fields)
+        else:
+            self.columns = list(data.dtype.names)
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def chunks(self, size, columns=None):
+        columns = self.columns if columns is None else columns
+        for start in range(0, len(self.data), size):
+            block = self.data[start:start + size]
+            if self.data.dtype.names is None:
+                yield {name: block[:, self.columns.index(name)] for name in columns}
+            else:
+                yield {name: block[name] for name in columns}
+
+
+class CsvSource:
+    """CSV sensor log with a header row, parsed a chunk at a time.
+
+    Only the requested columns are converted to floats, so a log may carry
+    text columns such as timestamps or labels alongside the sensor values.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, newline='') as handle:
+            self.columns = next(csv.reader(handle))
+        # Counted with the reader chunks() uses, so quoted fields spanning
+        # lines and blank lines agree with the records it yields
+        self._rows = sum(1 for _ in self._records())
+
+    def __len__(self):
+        return self._rows
+
+    def _records(self):
+        with open(self.path, newline='') as handle:
+            reader = csv.reader(handle)
+            next(reader)
+            for row in reader:
+                if row:
+                    yield row
+
+    def chunks(self, size, columns=None):
+        columns = self.columns if columns is None else columns
+        rows = []
+        for row in self._records():
+            rows.append(row)
+            if len(rows) == size:
+                yield self._block(rows, columns)
+                rows = []
+        if rows:
+            yield self._block(rows, columns)
+
+    def _block(self, rows, columns):
+        block = {}
+        for name in columns:
+            k = self.columns.index(name)
+            try:
+                block[name] = np.array([row[k] for row in rows], dtype=np.float64)
+            except (ValueError, IndexError):
+                raise ValueError("Column '{}' of {} has a missing or non-numeric value".format(name, self.path))
+        return block
+
+
+def open_source(path, fields=None, dtype='float32'):
+    """Open a sensor log by extension: .csv, .npy, or anything else as raw records.
+
+    Raw files are read as back-to-back records of ``fields``, each of ``dtype``.
+    """
+    if path.endswith('.csv'):
+        return CsvSource(path)
+    if path.endswith('.npy'):
+        return ArraySource(np.load(path, mmap_mode='r'), fields)
+    if not fields:
+        raise ValueError("Raw logs need --fields to describe their records")
+    record = np.dtype([(name, dtype) for name in fields])
+    return ArraySource(np.memmap(path, dtype=record, mode='r'))
+
+
+def replay(source, output, names=None, chunk_size=65536, defuzzify='sampled'):
+    """Run a sensor log through the given controllers into a memory-mapped .npy file.
+
+    The result is a structured array with one 'module.output' field per
+    controller output, row-aligned with the log. Returns (rows, seconds).
+    """
+    evaluator = FusedEvaluator(names, defuzzify)
+    missing = [key for key in evaluator.frame_keys if key not in source.columns]
+    if missing:
+        raise ValueError("Log has no column for: " + ", ".join(missing))
+
+    fields = [(name, label) for name, compiled in zip(evaluator.names, evaluator.systems)
+              for label in compiled.output_labels]
+    result = np.lib.format.open_memmap(output, mode='w+', shape=(len(source),),
+                                       dtype=[('{}.{}'.format(name, label), 'f8') for name, label in fields])
+    start = time.perf_counter()
+    row = 0
+    for chunk in source.chunks(chunk_size, evaluator.frame_keys):
+        outputs = evaluator.evaluate(chunk)
+        n = len(chunk[evaluator.frame_keys[0]])
+        for name, label in fields:
+            result['{}.{}'.format(name, label)][row:row + n] = outputs[name][label]
+        row += n
+    result.flush()
+    del result
+    return row, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded sensor log through the controllers")
+    parser.add_argument('log', help="sensor log: .csv, .npy, or raw binary records")
+    parser.add_argument('output', help="result .npy file, written memory-mapped")
+    parser.add_argument('--modules', default=','.join(CONTROLLERS), help="comma-separated controllers")
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    parser.add_argument('--fields', help="comma-separated column names for raw or unstructured logs")
+    parser.add_argument('--dtype', default='float32', help="field type of raw records")
+    parser.add_argument('--defuzzify', choices=['sampled', 'analytic', 'sugeno'], default='sampled')
+    args = parser.parse_args(argv)
+
+    fields = args.fields.split(',') if args.fields else None
+    source = open_source(args.log, fields, args.dtype)
+    rows, seconds = replay(source, args.output, args.modules.split(','), args.chunk_size, args.defuzzify)
+    print("Replayed {} rows in {:.2f} s ({:.0f} rows/s)".format(rows, seconds, rows / max(seconds, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import argparse
+import json
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, frame_key
+from modules.fused import FusedEvaluator
+
+# Header of every ring: int64 slots ahead of the records
+HEADER = 8
+CAPACITY, ITEMSIZE, WRITTEN, READ, DROPPED, MAX_LAG = range(6)
+
+
+def frame_dtype(names=None):
+    """Record of one sensor frame: a float32 field per frame key the
+    controllers read, plus the producer's time.time() stamp."""
+    keys = FusedEvaluator(names).frame_keys
+    return np.dtype([('timestamp', 'f8')] + [(key, 'f4') for key in keys])
+
+
+def output_dtype(names=None):
+    """Record of the outputs for one frame: a 'module.output' float32 field
+    per controller output (NaN where no rule fires), plus the frame's stamp."""
+    evaluator = FusedEvaluator(names)
+    return np.dtype([('timestamp', 'f8')] + [('{}.{}'.format(name, label), 'f4')
+                                              for name, compiled in zip(evaluator.names, evaluator.systems)
+                                              for label in compiled.output_labels])
+
+
+class SharedRing:
+    """Single-producer, single-consumer ring of fixed-layout records in shared memory.
+
+    The producer fills slots in place (reserve() then commit(), or write())
+    and the consumer gets the committed records as NumPy views of the
+    shared block (read() then release()), so no frame is serialized or
+    copied on the way. A full ring never blocks the producer: the new
+    records are dropped and counted, so views the consumer holds stay valid
+    until it releases them. Each counter in the header is only ever written
+    by one side: the write position and the drop count by the producer, the
+    read position and the largest lag seen by the consumer.
+
+    Create the ring in one process with ``create=True`` and attach to it
+    from others by name with the same dtype.
+    """
+
+    def __init__(self, name=None, dtype=None, capacity=4096, create=False):
+        self.dtype = np.dtype(dtype)
+        size = HEADER * 8 + capacity * self.dtype.itemsize
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray((HEADER,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+            self.header[CAPACITY] = capacity
+            self.header[ITEMSIZE] = self.dtype.itemsize
+        elif self.header[ITEMSIZE] != self.dtype.itemsize:
+            raise ValueError("Ring {} holds {}-byte records, not {}".format(
+                self.shm.name, self.header[ITEMSIZE], self.dtype.itemsize))
+        self.capacity = int(self.header[CAPACITY])
+        self.records = np.ndarray((self.capacity,), dtype=self.dtype, buffer=self.shm.buf, offset=HEADER * 8)
+        self._owner = create
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __len__(self):
+        # Records committed but not yet released
+        return int(self.header[WRITTEN] - self.header[READ])
+
+    # Producer side
+
+    def reserve(self, count):
+        """View of up to ``count`` free slots to fill in place, contiguous and
+        possibly fewer than asked (at the ring's end, or when it is nearly
+        full); commit() publishes them."""
+        written = int(self.header[WRITTEN])
+        start = written % self.capacity
+        free = self.capacity - (written - int(self.header[READ]))
+        return self.records[start:start + min(count, free, self.capacity - start)]
+
+    def commit(self, count):
+        self.header[WRITTEN] += count
+
+    def drop(self, count):
+        # Records the producer had no room for
+        self.header[DROPPED] += count
+
+    def write(self, records):
+        """Copy a structured array (or one record) in; returns how many were
+        stored. The rest are dropped and counted as overruns."""
+        records = np.atleast_1d(np.asarray(records, dtype=self.dtype))
+        done = 0
+        while done < len(records):
+            view = self.reserve(len(records) - done)
+            if not len(view):
+                break
+            view[:] = records[done:done + len(view)]
+            self.commit(len(view))
+            done += len(view)
+        self.drop(len(records) - done)
+        return done
+
+    # Consumer side
+
+    def read(self, max_count=None):
+        """(sequence number of the first record, view of up to ``max_count``
+        committed records); contiguous, so a batch that wraps around the ring
+        comes back in two reads. The view stays valid until release()."""
+        read = int(self.header[READ])
+        lag = int(self.header[WRITTEN]) - read
+        if lag > self.header[MAX_LAG]:
+            self.header[MAX_LAG] = lag
+        start = read % self.capacity
+        count = min(lag, self.capacity - start, max_count or lag)
+        return read, self.records[start:start + count]
+
+    def release(self, count):
+        self.header[READ] += count
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'written': int(self.header[WRITTEN]),
+            'read': int(self.header[READ]),
+            'lag': len(self),
+            'max_lag': int(self.header[MAX_LAG]),
+            'overruns': int(self.header[DROPPED]),
+        }
+
+    def close(self):
+        self.records = self.header = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+class RingController:
+    """Runs the controllers on frames from input rings, writing each frame's
+    outputs to the parallel output ring, in the same order.
+
+    For every input ring there is an output ring of output_dtype() records
+    of the same capacity. A batch is as many frames as are waiting (up to
+    ``max_batch``) and as many free output slots; frames whose outputs
+    find no room wait in the input ring.
+    """
+
+    def __init__(self, inputs, outputs, names=None, max_batch=4096, defuzzify='sampled'):
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.evaluator = FusedEvaluator(names, defuzzify)
+        self.max_batch = max_batch
+        self.fields = [(name, label, '{}.{}'.format(name, label))
+                       for name, compiled in zip(self.evaluator.names, self.evaluator.systems)
+                       for label in compiled.output_labels]
+        self.frames = 0
+        self.batches = 0
+
+    def poll(self):
+        """Evaluate one batch from every input ring; returns the frames processed."""
+        total = 0
+        for source, sink in zip(self.inputs, self.outputs):
+            _, frames = source.read(self.max_batch)
+            if not len(frames):
+                continue
+            slots = sink.reserve(len(frames))
+            frames = frames[:len(slots)]
+            if not len(frames):
+                continue
+            outputs = self.evaluator.evaluate({key: frames[key] for key in self.evaluator.frame_keys})
+            slots['timestamp'] = frames['timestamp']
+            for name, label, field in self.fields:
+                slots[field] = outputs[name][label]
+            sink.commit(len(frames))
+            source.release(len(frames))
+            total += len(frames)
+            self.batches += 1
+        self.frames += total
+        return total
+
+    def run(self, duration=None, idle=0.0002, stop=None):
+        """Poll until ``duration`` seconds pass or ``stop`` (an Event) is set."""
+        start = time.perf_counter()
+        while not (stop is not None and stop.is_set()):
+            if duration is not None and time.perf_counter() - start >= duration:
+                break
+            if not self.poll():
+                time.sleep(idle)
+        return self.frames
+
+
+def _produce(ring_name, output_name, names, rate, duration, batch, seed, latencies):
+    # Synthetic sensor producer: writes frames in place at ``rate`` frames/s
+    # and drains its output ring, measuring frame-to-output latency
+    frames = SharedRing(ring_name, frame_dtype(names))
+    outputs = SharedRing(output_name, output_dtype(names))
+    rng = np.random.default_rng(seed)
+    keys = [key for key in frames.dtype.names if key != 'timestamp']
+    evaluator = FusedEvaluator(names)
+    ranges = {}
+    for name, compiled in zip(evaluator.names, evaluator.systems):
+        for label, universe, _, _ in compiled.antecedents:
+            ranges[frame_key(name, label)] = (universe[0], universe[-1])
+    start = time.perf_counter()
+    sent = 0
+    delays = []
+    while time.perf_counter() - start < duration:
+        due = int((time.perf_counter() - start) * rate) - sent
+        if due > 0:
+            count = min(due, batch)
+            placed = 0
+            # Two reservations when the batch wraps around the ring's end
+            while placed < count:
+                view = frames.reserve(count - placed)
+                if not len(view):
+                    break
+                for key in keys:
+                    lo, hi = ranges[key]
+                    view[key] = rng.uniform(lo, hi, len(view))
+                view['timestamp'] = time.time()
+                frames.commit(len(view))
+                placed += len(view)
+            frames.drop(count - placed)
+            sent += count
+        _, done = outputs.read()
+        if len(done):
+            delays.append(time.time() - done['timestamp'])
+            outputs.release(len(done))
+        time.sleep(0.0005)
+    latencies.put(np.concatenate(delays).tolist() if delays else [])
+    frames.close()
+    outputs.close()
+
+
+def demo(producers=2, rate=20000, duration=3.0, capacity=65536, names=None):
+    """Producer processes writing synthetic frames into their own rings, the
+    controllers evaluating them in this process; returns a report."""
+    names = list(names or CONTROLLERS)
+    inputs = [SharedRing(dtype=frame_dtype(names), capacity=capacity, create=True) for _ in range(producers)]
+    outputs = [SharedRing(dtype=output_dtype(names), capacity=capacity, create=True) for _ in range(producers)]
+    controller = RingController(inputs, outputs, names)
+    latencies = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_produce, args=(source.name, sink.name, names, rate, duration, 1024,
+                                                              seed, latencies))
+               for seed, (source, sink) in enumerate(zip(inputs, outputs))]
+    try:
+        for worker in workers:
+            worker.start()
+        start = time.perf_counter()
+        controller.run(duration + 0.5)
+        seconds = time.perf_counter() - start
+        delays = np.array([delay for _ in workers for delay in latencies.get()]) * 1e3
+        for worker in workers:
+            worker.join()
+        return {
+            'frames': controller.frames,
+            'frames_per_s': controller.frames / seconds,
+            'mean_batch': controller.frames / max(controller.batches, 1),
+            'latency_ms': {'p50': float(np.percentile(delays, 50)), 'p99': float(np.percentile(delays, 99)),
+                           'max': float(delays.max())} if len(delays) else {},
+            'rings': [source.stats() for source in inputs],
+            'output_rings': [sink.stats() for sink in outputs],
+        }
+    finally:
+        for ring in inputs + outputs:
+            ring.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Feed the controllers from shared-memory rings written by producer processes")
+    parser.add_argument('--producers', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=20000, help="frames per second per producer")
+    parser.add_argument('--duration', type=float, default=3.0, help="seconds")
+    parser.add_argument('--capacity', type=int, default=65536, help="records per ring")
+    parser.add_argument('--modules', default=','.join(CONTROLLERS), help="comma-separated controllers")
+    args = parser.parse_args(argv)
+    print(json.dumps(demo(args.producers, args.rate, args.duration, args.capacity, args.modules.split(',')),
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from modules.engine import CompiledSystem, compile_factory
+
+# Declarative rule base. Each controller lists its inputs and outputs in
+# ControlSystem order, every variable with its universe as np.arange
+# arguments [start, stop, step] and its terms as trimf breakpoints [a, b, c],
+# followed by its rules:
+#
+#     {"if": {"distance": "close", "speed": "fast"},
+#      "then": {"acceleration": "decrease", "brake": "high"}, "weight": 1.0}
+#
+# "if" terms are ANDed and "weight" is optional. Each controller's entry is
+# compiled into term parameter matrices and rule index tables, stored as an
+# .npz artifact in data/compiled named by a hash of the entry, so later runs
+# load the arrays instead of building and compiling the skfuzzy objects.
+# FUZZY_ARTIFACT_DIR moves the artifacts elsewhere, e.g. when the package is
+# installed read-only; if they cannot be written the arrays are rebuilt per process.
+# The module factories build their skfuzzy objects from the same entries
+# (build_control_system), so this file is the only definition of a controller.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+RULEBASE_PATH = os.path.join(DATA_DIR, 'rulebase.json')
+ARTIFACT_DIR = os.environ.get('FUZZY_ARTIFACT_DIR', os.path.join(DATA_DIR, 'compiled'))
+
+# Bump when the artifact layout changes so stale files are not loaded
+ARTIFACT_VERSION = 1
+
+# Incremented by reload() so caches of controller outputs can tell they are stale
+_generation = 0
+
+
+def trimf(x, abc):
+    # Same sampling as skfuzzy.trimf, so compiled mfs match the modules exactly
+    a, b, c = abc
+    y = np.zeros(len(x))
+    if a != b:
+        rising = (a < x) & (x < b)
+        y[rising] = (x[rising] - a) / float(b - a)
+    if b != c:
+        falling = (b < x) & (x < c)
+        y[falling] = (c - x[falling]) / float(c - b)
+    y[x == b] = 1
+    return y
+
+
+@functools.lru_cache(maxsize=None)
+def load_rulebase(path=RULEBASE_PATH):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def spec_hash(spec):
+    text = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256('{}:{}'.format(ARTIFACT_VERSION, text).encode()).hexdigest()[:16]
+
+
+def artifact_path(name, spec):
+    return os.path.join(ARTIFACT_DIR, '{}-{}.npz'.format(name, spec_hash(spec)))
+
+
+def build_arrays(spec):
+    """Compile one controller's entry into the arrays stored in its artifact."""
+    variables = spec['inputs'] + spec['outputs']
+    arrays = {
+        'n_inputs': np.array(len(spec['inputs'])),
+        'labels': np.array([var['label'] for var in variables]),
+    }
+    for v, var in enumerate(variables):
+        arrays['universe_{}'.format(v)] = np.arange(*var['universe'])
+        arrays['terms_{}'.format(v)] = np.array(list(var['terms']))
+        arrays['params_{}'.format(v)] = np.array(list(var['terms'].values()), dtype=np.float64)
+
+    def index(group):
+        return {var['label']: (i, list(var['terms'])) for i, var in enumerate(spec[group])}
+
+    inputs, outputs = index('inputs'), index('outputs')
+    rules = spec['rules']
+    rule_terms = np.full((len(rules), len(inputs)), -1)
+    rule_outputs = np.full((len(rules), len(outputs)), -1)
+    rule_weights = np.zeros((len(rules), len(outputs)))
+    for r, rule in enumerate(rules):
+        if not rule['if']:
+            raise ValueError("Rule {} has no 'if' terms".format(r))
+        for tables, group, side in ((rule_terms, inputs, 'if'), (rule_outputs, outputs, 'then')):
+            for label, term in rule[side].items():
+                if label not in group or term not in group[label][1]:
+                    raise ValueError("Rule {} refers to unknown term {}['{}']".format(r, label, term))
+                tables[r, group[label][0]] = group[label][1].index(term)
+        rule_weights[r, rule_outputs[r] >= 0] = rule.get('weight', 1.0)
+    arrays.update(rule_terms=rule_terms, rule_outputs=rule_outputs, rule_weights=rule_weights)
+    return arrays
+
+
+def system_from_arrays(arrays, defuzzify='sampled'):
+    variables = []
+    for v, label in enumerate(arrays['labels']):
+        universe = arrays['universe_{}'.format(v)].astype(np.float64)
+        params = arrays['params_{}'.format(v)]
+        mfs = np.array([trimf(universe, abc) for abc in params])
+        variables.append((str(label), universe, [str(t) for t in arrays['terms_{}'.format(v)]], mfs))
+    n_inputs = int(arrays['n_inputs'])
+    return CompiledSystem(variables[:n_inputs], variables[n_inputs:], arrays['rule_terms'],
+                          arrays['rule_outputs'], arrays['rule_weights'], defuzzify)
+
+
+def _entry(name, path):
+    spec = load_rulebase(path).get(name)
+    if spec is None:
+        raise KeyError("No controller '{}' in {}".format(name, path))
+    return spec
+
+
+def load_arrays(name, path=RULEBASE_PATH):
+    # The controller's compiled arrays, built and cached on the first call
+    spec = _entry(name, path)
+    artifact = artifact_path(name, spec)
+    if os.path.exists(artifact):
+        with np.load(artifact) as stored:
+            return dict(stored)
+    arrays = build_arrays(spec)
+    # Write under a temporary name so concurrent processes never load a partial file
+    partial = '{}.{}.tmp.npz'.format(artifact[:-4], os.getpid())
+    try:
+        os.makedirs(os.path.dirname(artifact), exist_ok=True)
+        np.savez(partial, **arrays)
+        os.replace(partial, artifact)
+    except OSError:
+        # Not writable (e.g. a read-only install): keep using the built arrays
+        if os.path.exists(partial):
+            os.remove(partial)
+    return arrays
+
+
+@functools.lru_cache(maxsize=None)
+def compile_rulebase(name, defuzzify='sampled', path=RULEBASE_PATH):
+    """CompiledSystem for a controller of the declarative rule base."""
+    compiled = system_from_arrays(load_arrays(name, path), defuzzify)
+    compiled.name = name
+    return compiled
+
+
+def build_control_system(name, path=RULEBASE_PATH):
+    """skfuzzy ControlSystem for a controller of the declarative rule base.
+
+    Variables, trimf terms and rules are created in the order the entry
+    lists them; rule weights become weighted consequent terms.
+    """
+    import skfuzzy as fuzz
+    from skfuzzy import control as ctrl
+
+    spec = _entry(name, path)
+    groups = {}
+    for group, kind in (('inputs', ctrl.Antecedent), ('outputs', ctrl.Consequent)):
+        groups[group] = {}
+        for var in spec[group]:
+            variable = kind(np.arange(*var['universe']), var['label'])
+            for term, abc in var['terms'].items():
+                variable[term] = fuzz.trimf(variable.universe, abc)
+            groups[group][var['label']] = variable
+
+    def term(r, group, label, name):
+        variable = groups[group].get(label)
+        if variable is None or name not in variable.terms:
+            raise ValueError("Rule {} refers to unknown term {}['{}']".format(r, label, name))
+        return variable[name]
+
+    rules = []
+    for r, rule in enumerate(spec['rules']):
+        if not rule['if']:
+            raise ValueError("Rule {} has no 'if' terms".format(r))
+        antecedent = None
+        for label, name in rule['if'].items():
+            clause = term(r, 'inputs', label, name)
+            antecedent = clause if antecedent is None else antecedent & clause
+        weight = rule.get('weight', 1.0)
+        consequent = [term(r, 'outputs', label, name) for label, name in rule['then'].items()]
+        if weight != 1.0:
+            consequent = [clause % weight for clause in consequent]
+        rules.append(ctrl.Rule(antecedent, consequent))
+    return ctrl.ControlSystem(rules)
+
+
+def reload():
+    """Drop the loaded rule base and compiled systems so the next use rereads the file."""
+    global _generation
+    load_rulebase.cache_clear()
+    compile_rulebase.cache_clear()
+    compile_factory.cache_clear()
+    _generation += 1
+
+
+def generation():
+    return _generation
+
+
+def check(name, path=RULEBASE_PATH):
+    """Differences between the rule base entry compiled directly and the
+    skfuzzy objects the module's factory builds from it, [] if none."""
+    from modules.catalog import get_factory
+    from modules.engine import compile_factory
+
+    ours = compile_rulebase(name, path=path)
+    theirs = compile_factory(get_factory(name))
+    problems = []
+    for group in ('antecedents', 'consequents'):
+        for mine, other in zip(getattr(ours, group), getattr(theirs, group)):
+            if mine[0] != other[0] or mine[2] != other[2]:
+                problems.append("{} {} differs".format(group[:-1], other[0]))
+            elif not (np.array_equal(mine[1], other[1]) and np.array_equal(mine[3], other[3])):
+                problems.append("{} {} has different universe or mfs".format(group[:-1], other[0]))
+        if len(getattr(ours, group)) != len(getattr(theirs, group)):
+            problems.append("different number of {}".format(group))
+    for table in ('rule_terms', 'rule_outputs', 'rule_weights'):
+        if not np.array_equal(getattr(ours, table), getattr(theirs, table)):
+            problems.append("{} differs".format(table))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the declarative rule base into cached artifacts")
+    parser.add_argument('names', nargs='*', help="controllers (default: all in the rule base)")
+    parser.add_argument('--rulebase', default=RULEBASE_PATH)
+    parser.add_argument('--check', action='store_true',
+                        help="compare each compiled entry with the skfuzzy system built from it")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name in args.names or list(load_rulebase(args.rulebase)):
+        compiled = compile_rulebase(name, path=args.rulebase)
+        print("{}: {} rules -> {}".format(name, compiled.n_rules,
+                                         artifact_path(name, load_rulebase(args.rulebase)[name])))
+        if args.check:
+            for problem in check(name, args.rulebase):
+                print("  MISMATCH " + problem)
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import numpy as np
+
+from modules.catalog import CONTROLLERS, get_compiled
+
+
+class CompiledRuntime:
+    """Scalar inference from the compiled rule base, without importing skfuzzy.
+
+    Same interface and outputs as the ControllerRegistry: compute() returns
+    the crisp outputs as a dict, leaving out any output no rule fired, as
+    ControlSystemSimulation does. Controllers load on first use.
+    """
+
+    def system(self, name):
+        return get_compiled(name)
+
+    def warm(self, names=None):
+        for name in names or CONTROLLERS:
+            get_compiled(name)
+
+    def compute(self, name, inputs):
+        crisp = get_compiled(name).evaluate_one(inputs)
+        return {label: value for label, value in crisp.items() if not np.isnan(value)}
+
+
+runtime = CompiledRuntime()
@@ -0,0 +1,140 @@
+import argparse
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, get_compiled
+
+# Per-worker state, set up once by _init_worker
+_worker = {}
+
+
+def scenario_grid(name, points=11):
+    """Dense grid over a controller's input universes, one row per scenario.
+
+    ``points`` is the number of points per input, or a dict of them by label.
+    """
+    axes = []
+    for label, universe, _, _ in get_compiled(name).antecedents:
+        n = points.get(label, 11) if isinstance(points, dict) else points
+        axes.append(np.linspace(universe[0], universe[-1], n))
+    mesh = np.meshgrid(*axes, indexing='ij')
+    return np.stack([axis.ravel() for axis in mesh], axis=1)
+
+
+def scenario_random(name, count, seed=0):
+    """Uniformly random scenarios within a controller's input universes."""
+    rng = np.random.default_rng(seed)
+    return np.stack([rng.uniform(universe[0], universe[-1], count)
+                     for _, universe, _, _ in get_compiled(name).antecedents], axis=1)
+
+
+def _init_worker(name, engine, in_name, out_name, shape, n_outputs):
+    # Build the controller once per process and attach to the shared arrays
+    compiled = get_compiled(name)
+    _worker['labels'] = compiled.input_labels
+    _worker['outputs'] = compiled.output_labels
+    _worker['engine'] = engine
+    if engine == 'batch':
+        _worker['evaluate'] = compiled.evaluate
+    else:
+        from modules.registry import registry
+        registry.warm([name])
+        _worker['name'] = name
+    _worker['in_shm'] = shared_memory.SharedMemory(name=in_name)
+    _worker['out_shm'] = shared_memory.SharedMemory(name=out_name)
+    _worker['inputs'] = np.ndarray(shape, dtype=np.float64, buffer=_worker['in_shm'].buf)
+    _worker['results'] = np.ndarray((shape[0], n_outputs), dtype=np.float64, buffer=_worker['out_shm'].buf)
+
+
+def _run_shard(bounds):
+    start, stop = bounds
+    inputs = _worker['inputs'][start:stop]
+    results = _worker['results']
+    labels, outputs = _worker['labels'], _worker['outputs']
+    if _worker['engine'] == 'batch':
+        crisp = _worker['evaluate'](dict(zip(labels, inputs.T)))
+        for c, label in enumerate(outputs):
+            results[start:stop, c] = crisp[label]
+    else:
+        from modules.registry import registry
+        with registry.simulation(_worker['name']) as sim:
+            for row, values in enumerate(inputs, start):
+                sim.inputs(dict(zip(labels, values)))
+                sim.compute()
+                for c, label in enumerate(outputs):
+                    results[row, c] = sim.output.get(label, np.nan)
+    return stop - start
+
+
+def sweep(name, scenarios, workers=None, engine='skfuzzy', shard_size=None):
+    """Evaluate an (N, inputs) array of scenarios across a process pool.
+
+    ``engine`` is 'skfuzzy' (ControlSystemSimulation, the reference) or
+    'batch' (the vectorized engine). Scenarios and results are exchanged
+    through shared memory; workers only return row counts. Returns the
+    (N, outputs) results, NaN where no rule fires, and the wall-clock seconds.
+    """
+    workers = workers or os.cpu_count()
+    scenarios = np.ascontiguousarray(scenarios, dtype=np.float64)
+    n = len(scenarios)
+    n_outputs = len(get_compiled(name).output_labels)
+    shard_size = shard_size or max(1, min(4096, -(-n // (workers * 4))))
+    shards = [(start, min(start + shard_size, n)) for start in range(0, n, shard_size)]
+
+    in_shm = shared_memory.SharedMemory(create=True, size=max(scenarios.nbytes, 1))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(n * n_outputs * 8, 1))
+    try:
+        np.ndarray(scenarios.shape, dtype=np.float64, buffer=in_shm.buf)[:] = scenarios
+        start = time.perf_counter()
+        with multiprocessing.Pool(workers, _init_worker,
+                                  (name, engine, in_shm.name, out_shm.name, scenarios.shape, n_outputs)) as pool:
+            done = sum(pool.imap_unordered(_run_shard, shards))
+        seconds = time.perf_counter() - start
+        if done != n:
+            raise RuntimeError("Sweep of {} evaluated {} of {} scenarios".format(name, done, n))
+        results = np.ndarray((n, n_outputs), dtype=np.float64, buffer=out_shm.buf).copy()
+    finally:
+        in_shm.close()
+        in_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+    return results, seconds
+
+
+def scaling(name, scenarios, worker_counts, engine='skfuzzy'):
+    # Throughput (scenarios/s) for each pool size, includes pool start-up
+    report = {}
+    for workers in worker_counts:
+        _, seconds = sweep(name, scenarios, workers, engine)
+        report[workers] = len(scenarios) / seconds
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep controllers over scenario grids across processes")
+    parser.add_argument('names', nargs='*', default=list(CONTROLLERS), help="controllers (default: all)")
+    parser.add_argument('--points', type=int, default=11, help="grid points per input")
+    parser.add_argument('--random', type=int, default=0, help="add this many random scenarios")
+    parser.add_argument('--engine', choices=['skfuzzy', 'batch'], default='skfuzzy')
+    parser.add_argument('--workers', default=str(os.cpu_count()),
+                        help="pool size, or a comma-separated list to report scaling")
+    args = parser.parse_args(argv)
+
+    worker_counts = [int(w) for w in args.workers.split(',')]
+    for name in args.names:
+        scenarios = scenario_grid(name, args.points)
+        if args.random:
+            scenarios = np.concatenate([scenarios, scenario_random(name, args.random)])
+        report = scaling(name, scenarios, worker_counts, args.engine)
+        base = report[worker_counts[0]]
+        print("{}: {} scenarios".format(name, len(scenarios)))
+        for workers, rate in report.items():
+            print("  {:>3} workers: {:>10.0f} scenarios/s  ({:.2f}x)".format(workers, rate, rate / base))
+
+
+if __name__ == "__main__":
+    main()
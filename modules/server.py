@@ -0,0 +1,366 @@
+import argparse
+import asyncio
+import errno
+import json
+import os
+import socket
+import stat
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, get_compiled
+from modules.instrument import Histogram
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'fuzzy-controllers.sock')
+# Batch-size histogram buckets: upper bounds 1, 2, 4, ..., 4096
+BATCH_BUCKETS = 2 ** np.arange(13)
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests for one controller into batches.
+
+    A batch starts with the oldest waiting request and takes every request
+    that arrives within ``max_wait`` seconds of the batch being opened, up
+    to ``max_batch``; a full batch goes out immediately. Each batch is one
+    vectorized CompiledSystem.evaluate() call, run on ``executor`` so the
+    event loop keeps accepting requests meanwhile. Batches of one
+    controller are evaluated in order, one at a time.
+    """
+
+    def __init__(self, name, executor, max_wait=0.002, max_batch=1024, defuzzify='sampled', window=10000):
+        self.name = name
+        self.compiled = get_compiled(name, defuzzify)
+        self.executor = executor
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.pending = deque()
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self.requests = 0
+        self.batch_sizes = Histogram(BATCH_BUCKETS)
+        # Queue depth (requests waiting, including the batch) when each batch is taken
+        self.depths = deque(maxlen=window)
+        self.latency = deque(maxlen=window)
+
+    def submit(self, inputs):
+        """Queue one sample; returns a future resolving to its outputs dict."""
+        missing = [label for label in self.compiled.input_labels if label not in inputs]
+        if missing:
+            raise ValueError("All antecedents must have input values! Missing: " + ", ".join(missing))
+        values = [float(inputs[label]) for label in self.compiled.input_labels]
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((values, future, time.perf_counter()))
+        self.requests += 1
+        self._ready.set()
+        if len(self.pending) >= self.max_batch:
+            self._full.set()
+        return future
+
+    def _take(self):
+        self.depths.append(len(self.pending))
+        batch = [self.pending.popleft() for _ in range(min(self.max_batch, len(self.pending)))]
+        if not self.pending:
+            self._ready.clear()
+        if len(self.pending) < self.max_batch:
+            self._full.clear()
+        return batch
+
+    def _evaluate(self, values):
+        crisp = self.compiled.evaluate(dict(zip(self.compiled.input_labels, values.T)))
+        return [{label: float(crisp[label][i]) for label in self.compiled.output_labels
+                 if not np.isnan(crisp[label][i])} for i in range(len(values))]
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            if self.max_wait > 0 and len(self.pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._take()
+            self.batch_sizes.observe(len(batch))
+            values = np.array([values for values, _, _ in batch], dtype=np.float64)
+            try:
+                results = await loop.run_in_executor(self.executor, self._evaluate, values)
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            done = time.perf_counter()
+            for (_, future, queued), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+                self.latency.append(done - queued)
+
+    def stats(self):
+        latency = np.array(self.latency) * 1e3
+        depths = np.array(self.depths)
+        batches = self.batch_sizes.count
+        stats = {
+            'requests': self.requests,
+            'batches': batches,
+            'queue_depth': len(self.pending),
+            'batch_size': {'mean': self.batch_sizes.total / batches if batches else 0.0,
+                           'buckets': self.batch_sizes.counts.tolist()},
+        }
+        if len(latency):
+            stats['queue_depth_at_batch'] = {'mean': float(depths.mean()), 'max': int(depths.max())}
+            stats['latency_ms'] = {'p50': float(np.percentile(latency, 50)),
+                                   'p95': float(np.percentile(latency, 95)),
+                                   'p99': float(np.percentile(latency, 99)),
+                                   'max': float(latency.max())}
+        return stats
+
+
+def _remove_stale_socket(path):
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "Not a socket, refusing to replace it", path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        # Nothing listening: left over from a server that did not clean up
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, "Another server is listening on this socket", path)
+
+
+class InferenceServer:
+    """Local inference server for the controllers over a Unix socket or TCP.
+
+    The protocol is newline-delimited JSON. A request
+
+        {"id": 1, "controller": "module1", "inputs": {"distance": 20, "speed": 80, "road": 1}}
+
+    gets the reply {"id": 1, "outputs": {...}}, leaving out outputs no rule
+    fired like compute(), or {"id": 1, "error": "..."}; {"id": 2, "stats": true}
+    gets {"id": 2, "stats": {...}}. Requests on one connection may be
+    pipelined and are answered as they complete, so replies carry the
+    request's id.
+    """
+
+    def __init__(self, names=None, max_wait=0.002, max_batch=1024, workers=None, defuzzify='sampled'):
+        self.names = list(names or CONTROLLERS)
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.workers = workers or min(len(self.names), os.cpu_count())
+        self.defuzzify = defuzzify
+        self.batchers = {}
+        self._executor = None
+        self._tasks = []
+        self._server = None
+
+    def _start_batchers(self):
+        self._executor = ThreadPoolExecutor(self.workers)
+        self.batchers = {name: MicroBatcher(name, self._executor, self.max_wait, self.max_batch, self.defuzzify)
+                         for name in self.names}
+        self._tasks = [asyncio.create_task(batcher.run()) for batcher in self.batchers.values()]
+
+    async def start(self, path=None, host=None, port=None):
+        """Listen on the Unix socket ``path``, or on ``host``:``port`` if given.
+
+        A socket file left behind by a server that is gone is replaced; a
+        path that is not a socket, or one another server still accepts
+        connections on, raises instead.
+        """
+        if host is None:
+            path = path or DEFAULT_SOCKET
+            _remove_stale_socket(path)
+        self._start_batchers()
+        if host is not None:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        else:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+        return self._server
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    async def _handle(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def _respond(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            if request.get('stats'):
+                reply = {'id': request_id, 'stats': self.stats()}
+            else:
+                name = request.get('controller')
+                if name not in self.batchers:
+                    raise KeyError("Unknown controller '{}', expected one of: {}".format(
+                        name, ", ".join(self.batchers)))
+                outputs = await self.batchers[name].submit(request.get('inputs') or {})
+                reply = {'id': request_id, 'outputs': outputs}
+        except Exception as error:
+            reply = {'id': request_id, 'error': str(error)}
+        writer.write((json.dumps(reply) + '\n').encode())
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def stats(self):
+        return {name: batcher.stats() for name, batcher in self.batchers.items()}
+
+
+class InferenceClient:
+    """Blocking client for InferenceServer; one request in flight per call,
+    or many with compute_many()."""
+
+    def __init__(self, path=None, host=None, port=None, timeout=10.0):
+        if host is not None:
+            self._socket = socket.create_connection((host, port), timeout)
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(path or DEFAULT_SOCKET)
+        self._file = self._socket.makefile('rwb')
+        self._next_id = 0
+
+    def _request(self, requests):
+        ids = []
+        for request in requests:
+            self._next_id += 1
+            ids.append(self._next_id)
+            self._file.write((json.dumps(dict(request, id=self._next_id)) + '\n').encode())
+        self._file.flush()
+        replies = {}
+        while len(replies) < len(ids):
+            reply = json.loads(self._file.readline())
+            replies[reply['id']] = reply
+        return [replies[i] for i in ids]
+
+    @staticmethod
+    def _result(reply):
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+        return reply['outputs'] if 'outputs' in reply else reply['stats']
+
+    def compute(self, name, inputs):
+        return self._result(self._request([{'controller': name, 'inputs': inputs}])[0])
+
+    def compute_many(self, name, samples):
+        """Pipeline one request per sample; returns the outputs in order."""
+        return [self._result(reply) for reply in
+                self._request([{'controller': name, 'inputs': inputs} for inputs in samples])]
+
+    def stats(self):
+        return self._result(self._request([{'stats': True}])[0])
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+async def _client_load(path, names, requests, seed):
+    # One connection issuing requests back to back, each waiting for its reply
+    reader, writer = await asyncio.open_unix_connection(path)
+    rng = np.random.default_rng(seed)
+    systems = [get_compiled(name) for name in names]
+    for i in range(requests):
+        compiled = systems[(i + seed) % len(systems)]
+        inputs = {label: float(rng.uniform(universe[0], universe[-1]))
+                  for label, universe, _, _ in compiled.antecedents}
+        writer.write((json.dumps({'id': i, 'controller': compiled.name, 'inputs': inputs}) + '\n').encode())
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+    writer.close()
+
+
+async def bench(names=None, clients=64, requests=200, max_wait=0.002, max_batch=1024, path=None):
+    """Serve in this process and load it with ``clients`` concurrent connections.
+
+    Returns (requests per second, server stats).
+    """
+    path = path or '{}.bench.{}'.format(DEFAULT_SOCKET, os.getpid())
+    server = InferenceServer(names, max_wait, max_batch)
+    await server.start(path)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*[_client_load(path, server.names, requests, seed) for seed in range(clients)])
+        seconds = time.perf_counter() - start
+        return clients * requests / seconds, server.stats()
+    finally:
+        await server.close()
+        os.unlink(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the controllers with micro-batching over a local socket")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for command in ('serve', 'bench'):
+        sub = commands.add_parser(command)
+        sub.add_argument('--modules', default=','.join(CONTROLLERS), help="comma-separated controllers")
+        sub.add_argument('--max-wait-ms', type=float, default=2.0, help="batching window; 0 takes what is queued")
+        sub.add_argument('--max-batch', type=int, default=1024)
+    serve = commands.choices['serve']
+    serve.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path")
+    serve.add_argument('--host', help="listen on TCP instead, e.g. 127.0.0.1")
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--workers', type=int, help="evaluation threads (default: one per controller, up to the CPUs)")
+    serve.add_argument('--defuzzify', choices=['sampled', 'analytic', 'sugeno'], default='sampled')
+    load = commands.choices['bench']
+    load.add_argument('--clients', type=int, default=64, help="concurrent connections")
+    load.add_argument('--requests', type=int, default=200, help="requests per connection")
+    args = parser.parse_args(argv)
+    names = args.modules.split(',')
+
+    if args.command == 'bench':
+        rate, stats = asyncio.run(bench(names, args.clients, args.requests, args.max_wait_ms / 1e3, args.max_batch))
+        print(json.dumps({'requests_per_s': rate, 'stats': stats}, indent=2))
+        return
+
+    async def serve_forever():
+        server = InferenceServer(names, args.max_wait_ms / 1e3, args.max_batch, args.workers, args.defuzzify)
+        listener = await server.start(args.socket, args.host, args.port if args.host else None)
+        print("Serving {} on {}".format(", ".join(server.names),
+                                        "{}:{}".format(args.host, args.port) if args.host else args.socket))
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import time
+
+import numpy as np
+
+from modules.catalog import CONTROLLERS, get_compiled
+from modules.scenarios import scenario_grid, scenario_random
+
+# Largest deviation from Mamdani, as a fraction of the output span, at which
+# the report marks a controller as fine to run in Sugeno mode
+DEFAULT_TOLERANCE = 0.05
+
+
+def deviation_report(name, points=41, samples=20000, seed=0, reference='sampled'):
+    """Deviation of the Sugeno outputs of a controller from its Mamdani ones.
+
+    Both are evaluated on a grid of ``points`` per input plus ``samples``
+    random points over the input universes, the Mamdani side with the
+    ``reference`` defuzzification. Per output: the max, mean and 99th
+    percentile absolute deviation as fractions of the output's universe
+    span, and the points where only one side is NaN. Also the batch times
+    of both modes.
+    """
+    mamdani = get_compiled(name, reference)
+    sugeno = get_compiled(name, 'sugeno')
+    scenarios = np.concatenate([scenario_grid(name, points), scenario_random(name, samples, seed)])
+    inputs = dict(zip(mamdani.input_labels, scenarios.T))
+
+    start = time.perf_counter()
+    expected = mamdani.evaluate(inputs)
+    mamdani_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = sugeno.evaluate(inputs)
+    sugeno_seconds = time.perf_counter() - start
+
+    outputs = {}
+    for label, (_, universe, _, _) in zip(mamdani.output_labels, mamdani.consequents):
+        a, b = actual[label], expected[label]
+        both = ~(np.isnan(a) | np.isnan(b))
+        deviation = np.abs(a[both] - b[both]) / (universe[-1] - universe[0])
+        outputs[label] = {
+            'max': float(deviation.max()) if len(deviation) else 0.0,
+            'mean': float(deviation.mean()) if len(deviation) else 0.0,
+            'p99': float(np.percentile(deviation, 99)) if len(deviation) else 0.0,
+            'nan_mismatch': int(np.count_nonzero(np.isnan(a) != np.isnan(b))),
+        }
+    return {
+        'points': len(scenarios),
+        'outputs': outputs,
+        'mamdani_seconds': mamdani_seconds,
+        'sugeno_seconds': sugeno_seconds,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report how far Sugeno mode deviates from Mamdani inference")
+    parser.add_argument('names', nargs='*', default=list(CONTROLLERS), help="controllers (default: all)")
+    parser.add_argument('--points', type=int, default=41, help="grid points per input")
+    parser.add_argument('--samples', type=int, default=20000, help="random points added to the grid")
+    parser.add_argument('--reference', choices=['sampled', 'analytic'], default='sampled',
+                        help="Mamdani defuzzification to compare with")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="max deviation (fraction of span) to recommend Sugeno mode")
+    args = parser.parse_args(argv)
+
+    recommended = []
+    for name in args.names:
+        report = deviation_report(name, args.points, args.samples, reference=args.reference)
+        worst = max(output['max'] for output in report['outputs'].values())
+        verdict = 'ok' if worst <= args.tolerance else 'too coarse'
+        if worst <= args.tolerance:
+            recommended.append(name)
+        print("{}: {} points, Mamdani {:.1f} ms, Sugeno {:.1f} ms ({:.1f}x), {}".format(
+            name, report['points'], report['mamdani_seconds'] * 1e3, report['sugeno_seconds'] * 1e3,
+            report['mamdani_seconds'] / report['sugeno_seconds'], verdict))
+        for label, output in report['outputs'].items():
+            print("  {}: deviation max {:.2%}, p99 {:.2%}, mean {:.2%} of span, {} NaN mismatches".format(
+                label, output['max'], output['p99'], output['mean'], output['nan_mismatch']))
+    print("Within {:.1%}: {}".format(args.tolerance, ", ".join(recommended) or "none"))
+
+
+if __name__ == "__main__":
+    main()
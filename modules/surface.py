@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from modules.catalog import get_compiled
+from modules.rulebase import load_rulebase, spec_hash
+
+METADATA = 'surface.json'
+
+
+def grid_axes(name, specs=None):
+    """Axis values per input of a controller, in antecedent order.
+
+    ``specs`` maps input labels to axis specifications: a number of points
+    spread over the universe ('21'), an evenly spaced range ('0:50:11'), or
+    explicit values ('0,1,2'; write a single fixed value as '1.0' or '1,').
+    Inputs without a specification use their universe points.
+    """
+    specs = dict(specs or {})
+    axes = []
+    for label, universe, _, _ in get_compiled(name).antecedents:
+        spec = specs.pop(label, None)
+        if spec is None:
+            axes.append(universe)
+        elif ':' in spec:
+            lo, hi, n = spec.split(':')
+            axes.append(np.linspace(float(lo), float(hi), int(n)))
+        elif ',' in spec or '.' in spec:
+            axes.append(np.array([float(value) for value in spec.split(',') if value]))
+        else:
+            axes.append(np.linspace(universe[0], universe[-1], int(spec)))
+    if specs:
+        raise ValueError("Controller '{}' has no input: {}".format(name, ", ".join(specs)))
+    return axes
+
+
+def _write_metadata(directory, metadata):
+    partial = os.path.join(directory, METADATA + '.tmp')
+    with open(partial, 'w') as handle:
+        json.dump(metadata, handle, indent=2)
+    os.replace(partial, os.path.join(directory, METADATA))
+
+
+def load_surface(directory, mode='r'):
+    """Metadata and memory-mapped outputs (by label) of a surface directory."""
+    with open(os.path.join(directory, METADATA)) as handle:
+        metadata = json.load(handle)
+    outputs = {label: np.load(os.path.join(directory, label + '.npy'), mmap_mode=mode)
+               for label in metadata['outputs']}
+    return metadata, outputs
+
+
+def sweep_grid(name, axes, directory, chunk_size=65536, defuzzify='sampled', progress=None):
+    """Evaluate a controller over the grid spanned by ``axes`` into ``directory``.
+
+    Writes one memory-mapped .npy per output, shaped like the grid (NaN where
+    no rule fires), and surface.json with the controller, rule base hash,
+    axes and the number of grid points completed, in C order. A directory
+    holding an unfinished sweep of the same grid is resumed from there; one
+    holding a different sweep is an error. Returns (points evaluated now, seconds).
+    """
+    compiled = get_compiled(name, defuzzify)
+    shape = tuple(len(axis) for axis in axes)
+    metadata = {
+        'controller': name,
+        'rulebase': spec_hash(load_rulebase()[name]),
+        'defuzzify': defuzzify,
+        'inputs': compiled.input_labels,
+        'axes': [np.asarray(axis, dtype=np.float64).tolist() for axis in axes],
+        'outputs': compiled.output_labels,
+        'shape': list(shape),
+        'done': 0,
+    }
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, METADATA)):
+        existing, outputs = load_surface(directory, 'r+')
+        if {key: value for key, value in existing.items() if key != 'done'} != \
+                {key: value for key, value in metadata.items() if key != 'done'}:
+            raise ValueError("{} holds a different sweep; use another directory".format(directory))
+        metadata['done'] = existing['done']
+    else:
+        outputs = {label: np.lib.format.open_memmap(os.path.join(directory, label + '.npy'), mode='w+',
+                                                    dtype=np.float64, shape=shape)
+                   for label in compiled.output_labels}
+        _write_metadata(directory, metadata)
+
+    total = int(np.prod(shape))
+    axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+    flat = {label: values.reshape(-1) for label, values in outputs.items()}
+    start_done = metadata['done']
+    start = time.perf_counter()
+    for begin in range(start_done, total, chunk_size):
+        end = min(begin + chunk_size, total)
+        index = np.unravel_index(np.arange(begin, end), shape)
+        crisp = compiled.evaluate({label: axis[i] for label, axis, i in zip(compiled.input_labels, axes, index)})
+        for label, values in crisp.items():
+            flat[label][begin:end] = values
+        # Record progress only once the chunk is on disk
+        for values in outputs.values():
+            values.flush()
+        metadata['done'] = end
+        _write_metadata(directory, metadata)
+        if progress:
+            progress(end, total)
+    return total - start_done, time.perf_counter() - start
+
+
+def diff_surfaces(a, b, chunk_size=1 << 20):
+    """Per output: max absolute difference between two finished surfaces of the
+    same grid, and the number of points where exactly one of them is NaN."""
+    meta_a, outputs_a = load_surface(a)
+    meta_b, outputs_b = load_surface(b)
+    if meta_a['inputs'] != meta_b['inputs'] or meta_a['axes'] != meta_b['axes']:
+        raise ValueError("Surfaces are not sampled on the same grid")
+    for meta, directory in ((meta_a, a), (meta_b, b)):
+        if meta['done'] < np.prod(meta['shape']):
+            raise ValueError("{} is not finished".format(directory))
+    report = {}
+    for label in meta_a['outputs']:
+        if label not in outputs_b:
+            continue
+        x, y = outputs_a[label].reshape(-1), outputs_b[label].reshape(-1)
+        max_abs, nan_mismatch = 0.0, 0
+        for begin in range(0, len(x), chunk_size):
+            u, v = x[begin:begin + chunk_size], y[begin:begin + chunk_size]
+            nan_mismatch += int(np.count_nonzero(np.isnan(u) != np.isnan(v)))
+            both = ~(np.isnan(u) | np.isnan(v))
+            if both.any():
+                max_abs = max(max_abs, float(np.abs(u[both] - v[both]).max()))
+        report[label] = {'max_abs': max_abs, 'nan_mismatch': nan_mismatch}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep a controller over an input grid, or diff two sweeps")
+    commands = parser.add_subparsers(dest='command', required=True)
+    sweep = commands.add_parser('sweep', help="evaluate a grid into memory-mapped .npy files (resumable)")
+    sweep.add_argument('name', help="controller, e.g. module1")
+    sweep.add_argument('directory', help="output directory")
+    sweep.add_argument('--axis', action='append', default=[], metavar='LABEL=SPEC',
+                       help="N points, LO:HI:N, or comma-separated values; may be repeated")
+    sweep.add_argument('--chunk-size', type=int, default=65536, help="grid points per chunk")
+    sweep.add_argument('--defuzzify', choices=['sampled', 'analytic', 'sugeno'], default='sampled')
+    diff = commands.add_parser('diff', help="compare two finished sweeps of the same grid")
+    diff.add_argument('a')
+    diff.add_argument('b')
+    args = parser.parse_args(argv)
+
+    if args.command == 'diff':
+        for label, result in diff_surfaces(args.a, args.b).items():
+            print("{}: max abs diff {:.6g}, NaN mismatches {}".format(label, result['max_abs'], result['nan_mismatch']))
+        return
+
+    axes = grid_axes(args.name, dict(item.split('=', 1) for item in args.axis))
+    points, seconds = sweep_grid(args.name, axes, args.directory, args.chunk_size, args.defuzzify)
+    print("{}: grid {}, evaluated {} points in {:.2f} s".format(
+        args.name, "x".join(str(len(axis)) for axis in axes), points, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from modules.catalog import get_compiled, load_config
+from modules.engine import CompiledSystem
+from modules.fused import FusedEvaluator
+
+# Speed, steering, ACC, obstacle avoidance and traffic signal controllers
+TRAFFIC_CONTROLLERS = ['module1', 'module2', 'module4', 'module6', 'module7']
+# The simulator's 'distance' is the leader gap; module7 needs the distance to the signal
+TRAFFIC_FRAME_KEYS = {('module7', 'distance'): 'signal_distance'}
+
+KMH = 1 / 3.6  # m/s per km/h
+ACCEL = 3.0  # m/s^2, most a vehicle speeds up or slows down to track its target speed
+SPEED_GAIN = 0.5  # 1/s, speed tracking gain
+BRAKE_DECEL = 8.0  # m/s^2 at full brake
+LATERAL_RATE = 1.5  # m/s of lateral motion at full steering
+LANE_HALF_WIDTH = 1.75  # m, lane deviation of +-1
+VEHICLE_LENGTH = 4.5  # m
+# Output levels at or below these count as no braking: the centroids of the
+# 'low' brake and 'none' deceleration terms never reach zero
+BRAKE_DEADBAND = 30.0  # brake, percent of max_brake
+DECEL_DEADBAND = 3.0  # deceleration, 0-10 scale
+CRAWL_SPEED = 10.0  # km/h, obstacle braking stops here so vehicles pass the obstacle
+ROAD_EDGE = 2.0  # lane deviations from the lane center to the road edge
+SIGNAL_CYCLE = ((2, 30.0), (1, 4.0), (0, 20.0))  # (signal state, seconds): green, yellow, red
+
+
+def lane_keeping_system(defuzzify='sampled'):
+    """Module 2 with only its lane keeping rules, those not on 'obstacle'.
+
+    The obstacle input has no term for "no obstacle", so on a frame without
+    one in sensor range the obstacle rules would steer around a phantom.
+    """
+    compiled = get_compiled('module2', defuzzify)
+    keep = compiled.rule_terms[:, compiled.input_labels.index('obstacle')] < 0
+    system = CompiledSystem(compiled.antecedents, compiled.consequents, compiled.rule_terms[keep],
+                            compiled.rule_outputs[keep], compiled.rule_weights[keep], defuzzify)
+    system.name = 'module2'
+    return system
+
+
+def _deceleration(level):
+    # 0-10 deceleration output to a fraction of full braking
+    return np.clip((np.nan_to_num(level) - DECEL_DEADBAND) / (10 - DECEL_DEADBAND), 0, 1)
+
+
+class TrafficSimulation:
+    """Closed-loop simulation of many vehicles on independent ring roads.
+
+    Vehicles are held in (lanes, vehicles per lane) arrays. Every step each
+    vehicle senses the gap and relative speed to its leader, its own speed
+    and lateral lane deviation, the road curvature and surface, the next
+    static obstacle (reported only within the configured sensor range) and
+    the state of and distance to the next traffic signal. Modules 1, 2, 4, 6
+    and 7 are evaluated on all vehicles at once and their outputs drive a
+    point-mass longitudinal model and a first-order lateral model:
+
+    - the lower of the speed controller's acceleration and the ACC throttle
+      (0-10) sets a target speed as a fraction of max_speed, which the
+      vehicle tracks;
+    - braking is the strongest of the two brake outputs (scaled by
+      max_brake), obstacle deceleration when an obstacle is in range, and
+      signal deceleration when the signal controller decides to stop;
+    - steering is module 2's output while an obstacle is in range, where
+      its obstacle rules see the obstacle's lateral slot, blended towards
+      the avoidance output as the obstacle closes in; out of range it is
+      module 2 with only its lane keeping rules (lane_keeping_system()),
+      since the obstacle input has no 'none' term.
+
+    Speeds are capped at max_speed from data/config.json.
+    """
+
+    def __init__(self, vehicles=1000, spacing=120.0, length=2000.0, obstacles=4, signal_spacing=500.0,
+                 seed=0, config=None, defuzzify='sampled'):
+        config = config or load_config()
+        self.max_speed = float(config['max_speed'])
+        self.max_brake = float(config['max_brake'])
+        self.sensor_range = float(config['sensor_range'])
+        self.rng = np.random.default_rng(seed)
+        # As many ring roads as it takes to start the vehicles ``spacing`` m apart
+        self.per_lane = max(1, int(length // spacing))
+        self.lanes = lanes = -(-vehicles // self.per_lane)
+        self.length = length
+        shape = (lanes, self.per_lane)
+
+        # Evenly spaced with jitter, so each lane starts in order
+        spacing = length / self.per_lane
+        self.position = (np.arange(self.per_lane) * spacing
+                         + self.rng.uniform(0, 0.5 * spacing, shape)) % length
+        self.speed = self.rng.uniform(0.3, 0.9, shape) * self.max_speed
+        self.lateral = self.rng.uniform(-0.5, 0.5, shape)
+        self.road = self.rng.integers(0, 3, (lanes, 1)).astype(np.float64)
+        # Curvature varies along the ring: a few bends of random sharpness per lane
+        self._bend_phase = self.rng.uniform(0, 2 * np.pi, (lanes, 1))
+        self._bend_sharpness = self.rng.uniform(20, 100, (lanes, 1))
+        # Static obstacles, sorted along each lane, with a lateral slot (0 left, 1 center, 2 right)
+        self.obstacle_position = np.sort(self.rng.uniform(0, length, (lanes, obstacles)), axis=1)
+        self.obstacle_slot = self.rng.integers(0, 3, (lanes, obstacles)).astype(np.float64)
+        self.signal_spacing = signal_spacing
+        self._signal_offset = self.rng.uniform(0, sum(seconds for _, seconds in SIGNAL_CYCLE), (lanes, 1))
+
+        self.evaluator = FusedEvaluator(TRAFFIC_CONTROLLERS, defuzzify, TRAFFIC_FRAME_KEYS)
+        self.lane_keeping = lane_keeping_system(defuzzify.get('module2', 'sampled')
+                                                if isinstance(defuzzify, dict) else defuzzify)
+        self.time = 0.0
+        self.steps = 0
+        self.conflicts = 0
+        self.step_seconds = []
+
+    @property
+    def vehicles(self):
+        return self.lanes * self.per_lane
+
+    def curvature(self, position):
+        return self._bend_sharpness * np.abs(np.sin(4 * np.pi * position / self.length + self._bend_phase))
+
+    def signal_state(self):
+        # Per lane: 0 red, 1 yellow, 2 green; all signals of a lane share one phase
+        cycle = sum(seconds for _, seconds in SIGNAL_CYCLE)
+        t = (self.time + self._signal_offset) % cycle
+        state = np.zeros_like(t)
+        start = 0.0
+        for value, seconds in SIGNAL_CYCLE:
+            state[(t >= start) & (t < start + seconds)] = value
+            start += seconds
+        return state
+
+    def sense(self):
+        """Sensor frame for every vehicle, keyed by frame key, each (lanes, per lane)."""
+        order = np.argsort(self.position, axis=1)
+        position = np.take_along_axis(self.position, order, axis=1)
+        speed = np.take_along_axis(self.speed, order, axis=1)
+        # Leader is the next vehicle along the ring in the same lane
+        gap = (np.roll(position, -1, axis=1) - position) % self.length - VEHICLE_LENGTH
+        if self.per_lane == 1:
+            gap = np.full_like(position, self.length)
+        relative = (np.roll(speed, -1, axis=1) - speed)
+        unsort = np.argsort(order, axis=1)
+        gap = np.take_along_axis(gap, unsort, axis=1)
+        relative = np.take_along_axis(relative, unsort, axis=1)
+
+        # Next obstacle ahead in the lane, wrapping around the ring
+        lanes = np.arange(self.lanes)[:, None]
+        n_obstacles = self.obstacle_position.shape[1]
+        keys = (lanes * self.length + self.obstacle_position).ravel()
+        index = np.searchsorted(keys, (lanes * self.length + self.position).ravel()).reshape(self.position.shape)
+        local = index - lanes * n_obstacles
+        wrapped = local >= n_obstacles
+        local[wrapped] = 0
+        ahead = np.take_along_axis(self.obstacle_position, local, axis=1) - self.position
+        ahead[wrapped] += self.length
+        slot = np.take_along_axis(self.obstacle_slot, local, axis=1)
+        self.obstacle_in_range = ahead <= self.sensor_range
+
+        to_signal = self.signal_spacing - self.position % self.signal_spacing
+        return {
+            'distance': np.clip(gap, 0, 100),
+            'speed': self.speed,
+            'road': np.broadcast_to(self.road, self.position.shape),
+            'relative_speed': np.clip(relative, -50, 50),
+            'lane_dev': np.clip(self.lateral / LANE_HALF_WIDTH, -1, 1),
+            'curvature': self.curvature(self.position),
+            'obstacle': slot - 1,
+            'obstacle_distance': np.where(self.obstacle_in_range, ahead, 100.0),
+            'obstacle_position': slot,
+            'signal': np.broadcast_to(self.signal_state(), self.position.shape),
+            'signal_distance': np.clip(to_signal, 0, 100),
+        }, gap
+
+    def step(self, dt=0.1):
+        """Advance every vehicle by ``dt`` seconds; returns the controller outputs."""
+        start = time.perf_counter()
+        frame, gap = self.sense()
+        out = self.evaluator.evaluate(frame)
+        # Controllers leave an output NaN where none of its rules fire: treat as neutral
+        acceleration = np.nan_to_num(out['module1']['acceleration'], nan=5.0)
+        throttle = np.nan_to_num(out['module4']['throttle'], nan=5.0)
+        brake = np.fmax(np.nan_to_num(out['module1']['brake']), np.nan_to_num(out['module4']['brake']))
+        brake = np.clip((brake / self.max_brake * 100 - BRAKE_DEADBAND) / (100 - BRAKE_DEADBAND), 0, 1)
+        avoid = np.where(self.obstacle_in_range & (self.speed > CRAWL_SPEED), _deceleration(out['module6']['deceleration']), 0.0)
+        stop = np.nan_to_num(out['module7']['decision'], nan=1.0) < 0.5
+        signal = np.where(stop, _deceleration(out['module7']['deceleration']), 0.0)
+        decel = np.maximum.reduce([brake, avoid, signal])
+
+        target = self.max_speed * np.minimum(acceleration, throttle) / 10
+        accel = np.clip(SPEED_GAIN * (target - self.speed) * KMH, -ACCEL, ACCEL) - BRAKE_DECEL * decel
+        self.speed = np.clip(self.speed + accel * dt / KMH, 0, self.max_speed)
+        self.position = (self.position + self.speed * KMH * dt) % self.length
+
+        # Avoidance takes over from module 2 linearly over the sensor range
+        closeness = np.where(self.obstacle_in_range, 1 - frame['obstacle_distance'] / self.sensor_range, 0.0)
+        lane_keeping = self.lane_keeping.evaluate({label: frame[label] for label in self.lane_keeping.input_labels})
+        steering = np.where(self.obstacle_in_range,
+                            (1 - closeness) * np.nan_to_num(out['module2']['steering'])
+                            + closeness * np.nan_to_num(out['module6']['steering']),
+                            lane_keeping['steering'])
+        self.lateral = np.clip(self.lateral + LATERAL_RATE * np.nan_to_num(steering) / 100 * dt,
+                               -ROAD_EDGE * LANE_HALF_WIDTH, ROAD_EDGE * LANE_HALF_WIDTH)
+
+        self.conflicts += int(np.count_nonzero(gap < 0))
+        self.time += dt
+        self.steps += 1
+        self.step_seconds.append(time.perf_counter() - start)
+        return out
+
+    def run(self, steps, dt=0.1):
+        for _ in range(steps):
+            self.step(dt)
+        return self.report()
+
+    def report(self):
+        seconds = np.array(self.step_seconds)
+        total = seconds.sum()
+        in_range = getattr(self, 'obstacle_in_range', np.zeros(self.lateral.shape, dtype=bool))
+        return {
+            'vehicles': self.vehicles,
+            'steps': self.steps,
+            'simulated_s': self.time,
+            'wall_s': float(total),
+            'step_ms': {'mean': float(seconds.mean() * 1e3), 'p95': float(np.percentile(seconds, 95) * 1e3),
+                        'max': float(seconds.max() * 1e3)} if len(seconds) else {},
+            'vehicle_steps_per_s': self.vehicles * self.steps / total if total else 0.0,
+            'evaluations_per_s': len(TRAFFIC_CONTROLLERS) * self.vehicles * self.steps / total if total else 0.0,
+            'mean_speed_kmh': float(self.speed.mean()),
+            'mean_abs_lane_dev': float(np.abs(self.lateral).mean() / LANE_HALF_WIDTH),
+            # Vehicles with no obstacle in range, steered by lane keeping alone
+            'lane_keeping_abs_dev': float(np.abs(self.lateral[~in_range]).mean() / LANE_HALF_WIDTH)
+            if (~in_range).any() else 0.0,
+            'in_lane_fraction': float(np.mean(np.abs(self.lateral) <= LANE_HALF_WIDTH)),
+            'conflicts': self.conflicts,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Closed-loop multi-vehicle simulation of modules 1, 2, 4, 6 and 7")
+    parser.add_argument('--vehicles', type=int, default=5000)
+    parser.add_argument('--spacing', type=float, default=120.0, help="initial mean gap between vehicles in m")
+    parser.add_argument('--length', type=float, default=2000.0, help="ring length in m")
+    parser.add_argument('--steps', type=int, default=600)
+    parser.add_argument('--dt', type=float, default=0.1, help="step in simulated seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--defuzzify', choices=['sampled', 'analytic', 'sugeno'], default='sampled')
+    parser.add_argument('--report-every', type=int, default=100, help="steps between progress lines (0: none)")
+    args = parser.parse_args(argv)
+
+    sim = TrafficSimulation(args.vehicles, args.spacing, args.length, seed=args.seed, defuzzify=args.defuzzify)
+    for step in range(1, args.steps + 1):
+        sim.step(args.dt)
+        if args.report_every and step % args.report_every == 0:
+            recent = np.array(sim.step_seconds[-args.report_every:])
+            print("step {:>6}  t={:>7.1f} s  {:>8.0f} vehicle-steps/s  mean speed {:5.1f} km/h".format(
+                step, sim.time, sim.vehicles * len(recent) / recent.sum(), sim.speed.mean()))
+    print(json.dumps(sim.report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from modules.catalog import frame_key
+from modules.replay import open_source
+from modules.rulebase import RULEBASE_PATH, build_arrays, load_rulebase, system_from_arrays
+
+# Per-worker state, set up once by _init_worker
+_worker = {}
+
+
+class ParameterSpace:
+    """The trimf breakpoints of one controller as a flat parameter vector.
+
+    Holds the breakpoints of ``variables`` (input or output labels; default
+    all of them), three per term, in rule base order. Every other part of
+    the controller stays as compiled from the rule base entry. A candidate
+    vector is made valid by constrain(): each breakpoint is clipped to its
+    variable's universe (widened to any breakpoint already outside it) and
+    each triple is sorted so a <= b <= c.
+    """
+
+    def __init__(self, name, variables=None, path=RULEBASE_PATH, defuzzify='sampled'):
+        self.name = name
+        self.defuzzify = defuzzify
+        self.spec = load_rulebase(path)[name]
+        self.arrays = build_arrays(self.spec)
+        all_variables = self.spec['inputs'] + self.spec['outputs']
+        labels = [var['label'] for var in all_variables]
+        unknown = set(variables or ()) - set(labels)
+        if unknown:
+            raise ValueError("Controller '{}' has no variable: {}".format(name, ", ".join(sorted(unknown))))
+        # (variable index in the artifact arrays, label) of each tuned variable
+        self.variables = [(v, label) for v, label in enumerate(labels) if not variables or label in variables]
+
+        self.names, initial, lower, upper = [], [], [], []
+        for v, label in self.variables:
+            var = all_variables[v]
+            params = self.arrays['params_{}'.format(v)]
+            universe = np.arange(*var['universe'])
+            lo, hi = min(universe[0], params.min()), max(universe[-1], params.max())
+            for term in var['terms']:
+                self.names.extend('{}.{}.{}'.format(label, term, point) for point in 'abc')
+            initial.append(params.ravel())
+            lower.append(np.full(params.size, lo, dtype=np.float64))
+            upper.append(np.full(params.size, hi, dtype=np.float64))
+        self.initial = np.concatenate(initial)
+        self.lower = np.concatenate(lower)
+        self.upper = np.concatenate(upper)
+
+    def __len__(self):
+        return len(self.initial)
+
+    def constrain(self, vector):
+        vector = np.clip(np.asarray(vector, dtype=np.float64), self.lower, self.upper)
+        return np.sort(vector.reshape(-1, 3), axis=1).ravel()
+
+    def _split(self, vector):
+        start = 0
+        for v, _ in self.variables:
+            shape = self.arrays['params_{}'.format(v)].shape
+            yield v, vector[start:start + shape[0] * shape[1]].reshape(shape)
+            start += shape[0] * shape[1]
+
+    def system(self, vector):
+        """CompiledSystem with the breakpoints of ``vector`` (constrained first)."""
+        arrays = dict(self.arrays)
+        for v, params in self._split(self.constrain(vector)):
+            arrays['params_{}'.format(v)] = params
+        compiled = system_from_arrays(arrays, self.defuzzify)
+        compiled.name = self.name
+        return compiled
+
+    def to_spec(self, vector):
+        """Rule base entry for ``vector``, in the format of data/rulebase.json."""
+        spec = json.loads(json.dumps(self.spec))
+        variables = spec['inputs'] + spec['outputs']
+        for v, params in self._split(self.constrain(vector)):
+            for term, abc in zip(list(variables[v]['terms']), params):
+                variables[v]['terms'][term] = [round(float(x), 6) for x in abc]
+        return spec
+
+
+class Dataset:
+    """Labelled samples for one controller: an input and a target column per variable.
+
+    Input columns are named by frame key or input label, target columns by
+    output label or 'module.output' (the columns written by replay).
+    """
+
+    def __init__(self, name, inputs, targets, spans):
+        self.name = name
+        # (N, inputs) and (N, outputs) float64, in antecedent / consequent order
+        self.inputs = np.ascontiguousarray(inputs, dtype=np.float64)
+        self.targets = np.ascontiguousarray(targets, dtype=np.float64)
+        self.spans = np.asarray(spans, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.inputs)
+
+
+def _universe_spans(name, path=RULEBASE_PATH):
+    spans = []
+    for var in load_rulebase(path)[name]['outputs']:
+        universe = np.arange(*var['universe'])
+        spans.append(universe[-1] - universe[0])
+    return spans
+
+
+def load_dataset(name, path, fields=None, dtype='float32', rulebase=RULEBASE_PATH):
+    """Read a labelled .csv, .npy or raw log for ``name`` (see replay.open_source)."""
+    spec = load_rulebase(rulebase)[name]
+    source = open_source(path, fields, dtype)
+    columns = []
+    for var in spec['inputs']:
+        label = var['label']
+        key = frame_key(name, label)
+        columns.append(key if key in source.columns else label)
+    for var in spec['outputs']:
+        label = var['label']
+        qualified = '{}.{}'.format(name, label)
+        columns.append(qualified if qualified in source.columns else label)
+    missing = [column for column in columns if column not in source.columns]
+    if missing:
+        raise ValueError("Dataset has no column for: " + ", ".join(missing))
+    blocks = [np.stack([np.asarray(chunk[column], dtype=np.float64) for column in columns], axis=1)
+              for chunk in source.chunks(65536, columns)]
+    data = np.concatenate(blocks) if blocks else np.zeros((0, len(columns)))
+    n_inputs = len(spec['inputs'])
+    return Dataset(name, data[:, :n_inputs], data[:, n_inputs:], _universe_spans(name, rulebase))
+
+
+def synthetic_dataset(space, samples, vector=None, seed=0):
+    """Random inputs labelled by the controller with breakpoints ``vector``
+    (default: the rule base's own), for trying the harness out."""
+    compiled = space.system(space.initial if vector is None else vector)
+    rng = np.random.default_rng(seed)
+    inputs = np.stack([rng.uniform(universe[0], universe[-1], samples)
+                       for _, universe, _, _ in compiled.antecedents], axis=1)
+    crisp = compiled.evaluate(dict(zip(compiled.input_labels, inputs.T)))
+    targets = np.stack([crisp[label] for label in compiled.output_labels], axis=1)
+    return Dataset(space.name, inputs, targets, _universe_spans(space.name))
+
+
+def loss(compiled, inputs, targets, spans, chunk_size=65536):
+    """Mean squared error as a fraction of each output's span, averaged over outputs.
+
+    Samples without a target (NaN) are ignored; a prediction left empty
+    where the target is not counts as an error of the whole span.
+    """
+    total = np.zeros(len(spans))
+    counted = np.zeros(len(spans))
+    for start in range(0, len(inputs), chunk_size):
+        crisp = compiled.evaluate(dict(zip(compiled.input_labels, inputs[start:start + chunk_size].T)))
+        for c, label in enumerate(compiled.output_labels):
+            target = targets[start:start + chunk_size, c]
+            labelled = ~np.isnan(target)
+            error = np.nan_to_num((crisp[label][labelled] - target[labelled]) / spans[c], nan=1.0)
+            total[c] += np.dot(error, error)
+            counted[c] += labelled.sum()
+    return float(np.mean(total / np.maximum(counted, 1)))
+
+
+def _init_worker(name, variables, path, defuzzify, in_name, target_name, n, n_inputs, spans):
+    # Build the parameter space once per process and attach to the shared dataset
+    _worker['space'] = ParameterSpace(name, variables, path, defuzzify)
+    _worker['in_shm'] = shared_memory.SharedMemory(name=in_name)
+    _worker['target_shm'] = shared_memory.SharedMemory(name=target_name)
+    _worker['inputs'] = np.ndarray((n, n_inputs), dtype=np.float64, buffer=_worker['in_shm'].buf)
+    _worker['targets'] = np.ndarray((n, len(spans)), dtype=np.float64, buffer=_worker['target_shm'].buf)
+    _worker['spans'] = np.asarray(spans)
+
+
+def _evaluate_candidate(vector):
+    return loss(_worker['space'].system(vector), _worker['inputs'], _worker['targets'], _worker['spans'])
+
+
+class CandidatePool:
+    """Evaluates the loss of many candidate vectors at once across processes.
+
+    The dataset is copied once into shared memory and every worker builds
+    its ParameterSpace once; only parameter vectors and losses travel
+    between processes. With one worker candidates are evaluated in this
+    process. Use as a context manager.
+    """
+
+    def __init__(self, space, dataset, workers=None, path=RULEBASE_PATH):
+        self.space = space
+        self.dataset = dataset
+        self.workers = workers or os.cpu_count()
+        self._pool = None
+        self._shm = []
+        if self.workers > 1:
+            blocks = []
+            for array in (dataset.inputs, dataset.targets):
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, dtype=np.float64, buffer=shm.buf)[:] = array
+                self._shm.append(shm)
+                blocks.append(shm.name)
+            variables = [label for _, label in space.variables]
+            self._pool = multiprocessing.Pool(
+                self.workers, _init_worker,
+                (space.name, variables, path, space.defuzzify, blocks[0], blocks[1],
+                 len(dataset), dataset.inputs.shape[1], dataset.spans.tolist()))
+
+    def evaluate(self, candidates):
+        if self._pool is None:
+            return np.array([loss(self.space.system(vector), self.dataset.inputs, self.dataset.targets,
+                                  self.dataset.spans) for vector in candidates])
+        return np.array(self._pool.map(_evaluate_candidate, list(candidates), chunksize=1))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def tune(space, dataset, iterations=50, population=32, sigma=0.05, start=None, workers=None,
+         seed=0, progress=None):
+    """Minimize loss() over the breakpoints with a (1, population) evolution strategy.
+
+    Each iteration perturbs the best vector so far with Gaussian noise of
+    ``sigma`` times each breakpoint's range, evaluates the whole population
+    on the full dataset in parallel, and keeps the best candidate if it
+    improves. ``sigma`` shrinks when an iteration brings no improvement.
+    Returns (best vector, best loss, history), the history holding one dict
+    per iteration with its losses and wall-clock seconds; ``progress`` is
+    called with each of them.
+    """
+    rng = np.random.default_rng(seed)
+    scale = space.upper - space.lower
+    best = space.constrain(space.initial if start is None else start)
+    history = []
+    with CandidatePool(space, dataset, workers) as pool:
+        best_loss = float(pool.evaluate([best])[0])
+        for iteration in range(1, iterations + 1):
+            began = time.perf_counter()
+            candidates = [space.constrain(best + sigma * scale * rng.standard_normal(len(space)))
+                          for _ in range(population)]
+            losses = pool.evaluate(candidates)
+            seconds = time.perf_counter() - began
+            winner = int(np.argmin(losses))
+            improved = losses[winner] < best_loss
+            if improved:
+                best, best_loss = candidates[winner], float(losses[winner])
+            else:
+                sigma *= 0.8
+            record = {
+                'iteration': iteration,
+                'best_loss': best_loss,
+                'iteration_loss': float(losses[winner]),
+                'sigma': sigma,
+                'seconds': seconds,
+                'candidates_per_s': population / seconds,
+                'samples_per_s': population * len(dataset) / seconds,
+            }
+            history.append(record)
+            if progress:
+                progress(record)
+    return best, best_loss, history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune a controller's trimf breakpoints against labelled data")
+    parser.add_argument('name', help="controller, e.g. module4")
+    parser.add_argument('dataset', nargs='?', help="labelled .csv, .npy or raw log (inputs and target outputs)")
+    parser.add_argument('--variables', help="comma-separated input/output labels to tune (default: all)")
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help="instead of a dataset, label this many random inputs with the current controller")
+    parser.add_argument('--start-noise', type=float, default=0.0,
+                        help="start from the rule base breakpoints perturbed by this fraction of their range")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--population', type=int, default=32, help="candidates per iteration")
+    parser.add_argument('--sigma', type=float, default=0.05, help="initial step as a fraction of each range")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fields', help="comma-separated column names for raw or unstructured logs")
+    parser.add_argument('--dtype', default='float32', help="field type of raw records")
+    parser.add_argument('--defuzzify', choices=['sampled', 'analytic', 'sugeno'], default='sampled')
+    parser.add_argument('--output', help="write the tuned rule base entry to this JSON file")
+    args = parser.parse_args(argv)
+
+    variables = args.variables.split(',') if args.variables else None
+    space = ParameterSpace(args.name, variables, defuzzify=args.defuzzify)
+    if args.synthetic:
+        dataset = synthetic_dataset(space, args.synthetic, seed=args.seed)
+    elif args.dataset:
+        dataset = load_dataset(args.name, args.dataset, args.fields.split(',') if args.fields else None, args.dtype)
+    else:
+        parser.error("give a dataset or --synthetic N")
+    start = space.initial
+    if args.start_noise:
+        rng = np.random.default_rng(args.seed + 1)
+        start = space.constrain(start + args.start_noise * (space.upper - space.lower) * rng.standard_normal(len(space)))
+
+    print("{}: {} parameters, {} samples, {} workers".format(args.name, len(space), len(dataset), args.workers))
+
+    def report(record):
+        print("iter {:>5}  best loss {:.6f}  iteration {:.6f}  {:6.3f} s  {:>7.1f} candidates/s  {:>11.0f} samples/s".format(
+            record['iteration'], record['best_loss'], record['iteration_loss'], record['seconds'],
+            record['candidates_per_s'], record['samples_per_s']))
+
+    best, best_loss, _ = tune(space, dataset, args.iterations, args.population, args.sigma, start,
+                              args.workers, args.seed, report)
+    changed = [(name, before, after) for name, before, after in zip(space.names, space.initial, best)
+               if abs(after - before) > 1e-9]
+    print("final loss {:.6f}; {} breakpoints differ from the rule base".format(best_loss, len(changed)))
+    for name, before, after in changed:
+        print("  {}: {:g} -> {:g}".format(name, before, after))
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(space.to_spec(best), handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
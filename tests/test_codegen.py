@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from modules.catalog import CONTROLLERS, get_compiled
+from modules.codegen import _identifier, compile_control_system
+
+
+@pytest.mark.parametrize('name', list(CONTROLLERS))
+def test_generated_matches_compiled(name, tmp_path):
+    compiled = get_compiled(name)
+    module = compile_control_system(compiled, name, str(tmp_path))
+    assert module.path.startswith(str(tmp_path))
+
+    rng = np.random.default_rng(5)
+    axes = [np.linspace(universe[0], universe[-1], 5) for _, universe, _, _ in compiled.antecedents]
+    grid = np.stack([axis.ravel() for axis in np.meshgrid(*axes, indexing='ij')], axis=1)
+    random = np.stack([rng.uniform(universe[0], universe[-1], 500) for _, universe, _, _ in compiled.antecedents],
+                      axis=1)
+    # NaN inputs, one at a time and all together
+    nan = random[:len(compiled.input_labels) + 1].copy()
+    for a in range(len(compiled.input_labels)):
+        nan[a, a] = np.nan
+    nan[-1] = np.nan
+    points = np.concatenate([grid, random, nan])
+
+    expected = compiled.evaluate(dict(zip(compiled.input_labels, points.T)))
+    for row, values in enumerate(points):
+        actual = module.evaluate(**{_identifier(label): value for label, value in zip(compiled.input_labels, values)})
+        for label in compiled.output_labels:
+            value = expected[label][row]
+            if np.isnan(value):
+                assert label not in actual, "{} at {}".format(label, values)
+            else:
+                assert abs(actual[label] - value) <= 1e-12, "{} at {}".format(label, values)
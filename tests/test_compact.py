@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from modules.catalog import CONTROLLERS, get_compiled
+from modules.compact import CompactController, ControllerBank
+
+
+def test_unset_input_raises():
+    controller = CompactController('module4')
+    controller.input['distance'] = 30
+    with pytest.raises(ValueError, match='relative_speed'):
+        controller.compute()
+    controller.input['relative_speed'] = -4
+    controller.compute()
+    controller.reset()
+    with pytest.raises(ValueError, match='distance, relative_speed'):
+        controller.compute()
+
+
+@pytest.mark.parametrize('name', list(CONTROLLERS))
+def test_nan_input_matches_engine(name):
+    compiled = get_compiled(name)
+    rng = np.random.default_rng(3)
+    bank = ControllerBank(name, len(compiled.input_labels))
+    outputs = []
+    for a, label in enumerate(compiled.input_labels):
+        inputs = {other: float(rng.uniform(universe[0], universe[-1]))
+                  for other, universe, _, _ in compiled.antecedents}
+        inputs[label] = np.nan
+        controller = CompactController(name)
+        controller.inputs(inputs)
+        controller.compute()
+        bank[a].inputs(inputs)
+        expected = compiled.evaluate({key: np.array([value]) for key, value in inputs.items()})
+        assert controller.output == pytest.approx({key: float(value[0]) for key, value in expected.items()
+                                                   if not np.isnan(value[0])})
+        outputs.append(controller.output)
+    bank.compute()
+    for a, output in enumerate(outputs):
+        assert bank[a].output == pytest.approx(output)
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from modules.catalog import CONTROLLERS, get_compiled
+from modules.fixedpoint import ERROR_BOUNDS, PRECISIONS, compile_fixed, measure_error
+
+
+@pytest.mark.parametrize('precision', list(PRECISIONS))
+@pytest.mark.parametrize('name', list(CONTROLLERS))
+def test_error_within_documented_bound(name, precision):
+    system = compile_fixed(name, precision)
+    for label, (_, relative, mismatches, _) in measure_error(system, 20000, reference_samples=50).items():
+        assert mismatches == 0, "{}.{} is empty on one engine only".format(name, label)
+        assert relative <= ERROR_BOUNDS[precision][(name, label)], "{}.{}".format(name, label)
+
+
+@pytest.mark.parametrize('precision', list(PRECISIONS))
+def test_weak_rules_still_fire(precision):
+    # Inputs just off a table knot, where every rule of module3 fires below 1/255
+    compiled = get_compiled('module3')
+    inputs = {'ped_distance': np.array([77.6197, 80.4328]), 'ped_movement': np.array([0.99990, 1.99995]),
+              'vehicle_speed': np.array([63.654, 28.809])}
+    expected = compiled.evaluate(inputs)
+    actual = compile_fixed('module3', precision).evaluate(inputs)
+    for label, (_, universe, _, _) in zip(compiled.output_labels, compiled.consequents):
+        assert not np.isnan(expected[label]).any()
+        assert not np.isnan(actual[label]).any()
+        span = universe[-1] - universe[0]
+        assert np.abs(actual[label] - expected[label]).max() <= ERROR_BOUNDS[precision][('module3', label)] * span
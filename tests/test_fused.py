@@ -0,0 +1,24 @@
+import numpy as np
+
+from modules.catalog import get_compiled
+from modules.fused import FusedEvaluator
+from modules.traffic import TRAFFIC_CONTROLLERS, TRAFFIC_FRAME_KEYS
+
+
+def test_module7_shares_the_catalog_distance_key():
+    assert FusedEvaluator(['module4', 'module7']).frame_keys == ['distance', 'relative_speed', 'signal']
+
+
+def test_frame_key_override_is_local():
+    evaluator = FusedEvaluator(TRAFFIC_CONTROLLERS, frame_keys=TRAFFIC_FRAME_KEYS)
+    assert 'signal_distance' in evaluator.frame_keys
+    assert 'signal_distance' not in FusedEvaluator(TRAFFIC_CONTROLLERS).frame_keys
+
+    rng = np.random.default_rng(0)
+    frame = {key: rng.uniform(0, 2, 50) for key in evaluator.frame_keys}
+    frame['distance'] = rng.uniform(0, 100, 50)
+    frame['signal_distance'] = rng.uniform(0, 100, 50)
+    outputs = evaluator.evaluate(frame)['module7']
+    expected = get_compiled('module7').evaluate({'signal': frame['signal'], 'distance': frame['signal_distance']})
+    for label, values in expected.items():
+        np.testing.assert_allclose(outputs[label], values)
@@ -0,0 +1,32 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from modules.catalog import CONTROLLERS
+from modules.incremental import IncrementalController
+from modules.scenarios import scenario_random
+
+
+@pytest.mark.parametrize('defuzzify', ['sampled', 'sugeno'])
+@pytest.mark.parametrize('name', list(CONTROLLERS))
+def test_random_stream_matches_batch(name, defuzzify):
+    # Each step changes a random subset of the inputs, sometimes none
+    rng = np.random.default_rng(7)
+    fresh = scenario_random(name, 300, 7)
+    stream = fresh.copy()
+    for row in range(1, len(stream)):
+        keep = rng.random(stream.shape[1]) < 0.6
+        stream[row, keep] = stream[row - 1, keep]
+
+    controller = IncrementalController(name, defuzzify)
+    labels = controller.compiled.input_labels
+    expected = importlib.import_module('modules.' + name).evaluate_batch(dict(zip(labels, stream.T)), defuzzify)
+    for row, values in enumerate(stream):
+        outputs = controller.compute(dict(zip(labels, values)))
+        for label, column in expected.items():
+            if np.isnan(column[row]):
+                assert label not in outputs, "{} row {}".format(label, row)
+            else:
+                assert outputs[label] == pytest.approx(column[row], abs=1e-12), "{} row {}".format(label, row)
+    assert controller.stats()['fuzzified'] < len(stream) * len(labels)
@@ -0,0 +1,28 @@
+import numpy as np
+
+from modules import instrument
+from modules.fused import FusedEvaluator
+
+
+def test_fused_stages_and_rule_strengths_per_controller():
+    evaluator = FusedEvaluator(['module4', 'module6'])
+    rng = np.random.default_rng(0)
+    frame = {key: rng.uniform(0, 50, 200) for key in evaluator.frame_keys}
+    probe = instrument.enable()
+    try:
+        evaluator.evaluate(frame)
+    finally:
+        instrument.disable()
+
+    snapshot = probe.snapshot()
+    assert sorted(snapshot['stages']) == ['module4', 'module6']
+    for stages in snapshot['stages'].values():
+        assert sorted(stages) == ['activation', 'aggregation', 'defuzzification', 'fuzzification']
+
+    text = probe.prometheus()
+    for name, rules in snapshot['rules'].items():
+        for rule, fired in enumerate(rules['fired']):
+            labels = 'controller="{}",rule="{}"'.format(name, rule)
+            assert 'fuzzy_rule_strength_bucket{{{},le="+Inf"}} {}\n'.format(labels, fired) in text
+            assert 'fuzzy_rule_strength_count{{{}}} {}\n'.format(labels, fired) in text
+            assert rules['strength_sum'][rule] <= fired
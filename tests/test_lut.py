@@ -0,0 +1,16 @@
+import numpy as np
+
+from modules.lut import compile_table
+
+
+def test_nan_input_gives_nan_outputs():
+    table = compile_table('module4')
+    inputs = {'distance': np.array([30.0, np.nan, 75.5]), 'relative_speed': np.array([-4.0, 2.0, np.nan])}
+    batch = table.lookup_batch(inputs)
+    for row in range(3):
+        single = table.lookup({label: values[row] for label, values in inputs.items()})
+        for label in table.output_labels:
+            if row == 0:
+                assert np.isclose(single[label], batch[label][row])
+            else:
+                assert np.isnan(single[label]) and np.isnan(batch[label][row]), "{} row {}".format(label, row)
@@ -0,0 +1,62 @@
+from modules import rulebase
+from modules.memo import MemoizedControllers
+
+
+class Recorder:
+    # Backend that echoes its inputs and remembers every call
+    def __init__(self):
+        self.calls = []
+
+    def compute(self, name, inputs):
+        self.calls.append((name, dict(inputs)))
+        return {'sum': sum(inputs.values())}
+
+
+def test_hits_and_misses():
+    backend = Recorder()
+    memo = MemoizedControllers(backend)
+    inputs = {'distance': 30.0, 'relative_speed': -4.0}
+    assert memo.compute('module4', inputs) == {'sum': 26.0}
+    assert memo.compute('module4', dict(inputs)) == {'sum': 26.0}
+    memo.compute('module4', {'distance': 30.5, 'relative_speed': -4.0})
+    stats = memo.stats()['module4']
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+    assert len(backend.calls) == 2
+
+
+def test_quantized_inputs_share_an_entry_and_are_evaluated_at_the_step():
+    backend = Recorder()
+    memo = MemoizedControllers(backend, resolution={'distance': 0.5})
+    first = memo.compute('module4', {'distance': 30.1, 'relative_speed': -4.01})
+    second = memo.compute('module4', {'distance': 29.9, 'relative_speed': -4.01})
+    assert first == second
+    # Only distance has a step; relative_speed is keyed on its exact value
+    memo.compute('module4', {'distance': 30.1, 'relative_speed': -4.02})
+    assert backend.calls == [('module4', {'distance': 30.0, 'relative_speed': -4.01}),
+                             ('module4', {'distance': 30.0, 'relative_speed': -4.02})]
+
+
+def test_lru_eviction():
+    memo = MemoizedControllers(Recorder(), maxsize=2)
+    for distance in (1.0, 2.0, 1.0, 3.0):
+        memo.compute('module4', {'distance': distance, 'relative_speed': 0.0})
+    stats = memo.stats()['module4']
+    assert (stats['entries'], stats['evictions']) == (2, 1)
+    # 2.0 was least recently used, so 1.0 is still cached
+    memo.compute('module4', {'distance': 1.0, 'relative_speed': 0.0})
+    assert memo.stats()['module4']['hits'] == 2
+
+
+def test_rulebase_reload_invalidates(monkeypatch):
+    backend = Recorder()
+    memo = MemoizedControllers(backend)
+    inputs = {'distance': 30.0, 'relative_speed': -4.0}
+    memo.compute('module4', inputs)
+    monkeypatch.setattr(rulebase, '_generation', rulebase.generation() + 1)
+    memo.compute('module4', inputs)
+    memo.compute('module4', inputs)
+    stats = memo.stats()['module4']
+    assert (stats['misses'], stats['hits'], stats['invalidations']) == (2, 1, 1)
+    memo.invalidate('module4')
+    memo.compute('module4', inputs)
+    assert len(backend.calls) == 3
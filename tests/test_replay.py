@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from modules.catalog import get_compiled
+from modules.replay import CsvSource, replay
+
+
+def test_csv_text_columns_are_skipped(tmp_path):
+    log = tmp_path / 'log.csv'
+    log.write_text("timestamp,distance,relative_speed,note\n"
+                   "2024-05-01T10:00:00,30.0,-4.0,ok\n"
+                   "2024-05-01T10:00:01,75.5,2.0,lane change\n")
+    rows, _ = replay(CsvSource(str(log)), str(tmp_path / 'out.npy'), ['module4'], chunk_size=1)
+    assert rows == 2
+    result = np.load(str(tmp_path / 'out.npy'))
+    expected = get_compiled('module4').evaluate({'distance': np.array([30.0, 75.5]),
+                                                 'relative_speed': np.array([-4.0, 2.0])})
+    for label, values in expected.items():
+        np.testing.assert_allclose(result['module4.' + label], values)
+
+
+def test_csv_bad_value_names_column(tmp_path):
+    log = tmp_path / 'log.csv'
+    log.write_text("distance,relative_speed\n30.0,-4.0\n75.5,fast\n")
+    with pytest.raises(ValueError, match="relative_speed"):
+        replay(CsvSource(str(log)), str(tmp_path / 'out.npy'), ['module4'])
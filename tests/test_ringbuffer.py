@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from modules.catalog import get_compiled
+from modules.ringbuffer import RingController, SharedRing, frame_dtype, output_dtype
+
+RECORD = np.dtype([('seq', 'i8'), ('value', 'f4')])
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing(dtype=RECORD, capacity=4, create=True)
+    yield ring
+    ring.close()
+
+
+def records(start, count):
+    data = np.zeros(count, dtype=RECORD)
+    data['seq'] = np.arange(start, start + count)
+    data['value'] = data['seq'] * 0.5
+    return data
+
+
+def test_empty_ring(ring):
+    assert len(ring) == 0
+    seq, view = ring.read()
+    assert (seq, len(view)) == (0, 0)
+    assert len(ring.reserve(10)) == 4
+
+
+def test_full_ring_drops_and_counts_overruns(ring):
+    assert ring.write(records(0, 4)) == 4
+    assert len(ring) == 4
+    assert len(ring.reserve(1)) == 0
+    assert ring.write(records(4, 3)) == 0
+    stats = ring.stats()
+    assert (stats['written'], stats['overruns'], stats['lag']) == (4, 3, 4)
+    # Records already in the ring are untouched by the dropped ones
+    _, view = ring.read()
+    assert view['seq'].tolist() == [0, 1, 2, 3]
+    ring.release(len(view))
+    assert ring.write(records(4, 1)) == 1
+    assert ring.stats()['overruns'] == 3
+
+
+def test_wraparound_reads_in_two_parts(ring):
+    ring.write(records(0, 3))
+    _, view = ring.read()
+    ring.release(len(view))
+    assert ring.write(records(3, 3)) == 3
+    seq, first = ring.read()
+    assert (seq, first['seq'].tolist()) == (3, [3])
+    ring.release(len(first))
+    seq, second = ring.read()
+    assert (seq, second['seq'].tolist()) == (4, [4, 5])
+    assert second['value'].tolist() == [2.0, 2.5]
+    ring.release(len(second))
+    assert len(ring) == 0
+    assert ring.stats()['max_lag'] == 3
+
+
+def test_reserve_stops_at_ring_end(ring):
+    ring.write(records(0, 3))
+    ring.release(len(ring.read()[1]))
+    slots = ring.reserve(4)
+    assert len(slots) == 1
+    ring.commit(len(slots))
+    assert len(ring.reserve(4)) == 3
+
+
+def test_attach_by_name(ring):
+    ring.write(records(0, 2))
+    other = SharedRing(ring.name, RECORD)
+    try:
+        assert other.capacity == 4
+        _, view = other.read()
+        assert view['seq'].tolist() == [0, 1]
+    finally:
+        other.close()
+    with pytest.raises(ValueError):
+        SharedRing(ring.name, np.dtype([('value', 'f4')]))
+
+
+def test_controller_writes_outputs_in_frame_order():
+    names = ['module4', 'module7']
+    frames = SharedRing(dtype=frame_dtype(names), capacity=8, create=True)
+    outputs = SharedRing(dtype=output_dtype(names), capacity=4, create=True)
+    try:
+        rng = np.random.default_rng(0)
+        data = np.zeros(6, dtype=frames.dtype)
+        data['timestamp'] = np.arange(6)
+        data['distance'] = rng.uniform(0, 100, 6)
+        data['relative_speed'] = rng.uniform(-50, 50, 6)
+        data['signal'] = rng.integers(0, 3, 6)
+        frames.write(data)
+        controller = RingController([frames], [outputs], names)
+        # Only four output slots: the last two frames wait in the input ring
+        assert controller.poll() == 4
+        assert (len(frames), len(outputs)) == (2, 4)
+        _, view = outputs.read()
+        expected = get_compiled('module4').evaluate({'distance': data['distance'][:4].astype(np.float64),
+                                                     'relative_speed': data['relative_speed'][:4].astype(np.float64)})
+        assert view['timestamp'].tolist() == [0, 1, 2, 3]
+        np.testing.assert_allclose(view['module4.brake'], expected['brake'], rtol=1e-6)
+        outputs.release(len(view))
+        assert controller.poll() == 2
+    finally:
+        frames.close()
+        outputs.close()
@@ -0,0 +1,23 @@
+import numpy as np
+
+from modules import rulebase
+
+
+def test_unwritable_artifact_dir_keeps_built_arrays(tmp_path, monkeypatch):
+    # A file where the directory should be, so creating it fails even as root
+    blocker = tmp_path / 'blocker'
+    blocker.write_text('')
+    monkeypatch.setattr(rulebase, 'ARTIFACT_DIR', str(blocker / 'compiled'))
+    arrays = rulebase.load_arrays('module4')
+    expected = rulebase.build_arrays(rulebase.load_rulebase()['module4'])
+    assert sorted(arrays) == sorted(expected)
+    for key, value in expected.items():
+        np.testing.assert_array_equal(arrays[key], value)
+    assert list(tmp_path.iterdir()) == [blocker]
+
+
+def test_artifact_written_to_configured_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(rulebase, 'ARTIFACT_DIR', str(tmp_path))
+    rulebase.load_arrays('module4')
+    assert [path.name for path in tmp_path.iterdir()] == [
+        'module4-{}.npz'.format(rulebase.spec_hash(rulebase.load_rulebase()['module4']))]
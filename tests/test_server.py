@@ -0,0 +1,99 @@
+import asyncio
+import json
+import socket
+
+import numpy as np
+import pytest
+
+from modules.catalog import get_compiled
+from modules.server import InferenceClient, InferenceServer
+
+
+def serve(path, action, **options):
+    # Run the blocking ``action`` against a server on ``path`` from a worker thread
+    async def main():
+        server = InferenceServer(['module4'], **options)
+        await server.start(path)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, action)
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+def test_request_replies(tmp_path):
+    path = str(tmp_path / 's.sock')
+
+    def action():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(10)
+            conn.connect(path)
+            stream = conn.makefile('rwb')
+            for request in ({'id': 1, 'controller': 'module4', 'inputs': {'distance': 30, 'relative_speed': -4}},
+                            {'id': 2, 'controller': 'module9', 'inputs': {}},
+                            {'id': 3, 'controller': 'module4', 'inputs': {'distance': 30}},
+                            {'id': 4, 'stats': True}):
+                stream.write((json.dumps(request) + '\n').encode())
+            stream.flush()
+            return {reply['id']: reply for reply in (json.loads(stream.readline()) for _ in range(4))}
+
+    replies = serve(path, action)
+    expected = get_compiled('module4').evaluate_one({'distance': 30.0, 'relative_speed': -4.0})
+    assert replies[1]['outputs'] == pytest.approx(expected)
+    assert 'Unknown controller' in replies[2]['error']
+    assert 'relative_speed' in replies[3]['error']
+    assert replies[4]['stats']['module4']['requests'] == 1
+
+
+def test_pipelined_requests_are_batched(tmp_path):
+    path = str(tmp_path / 's.sock')
+    rng = np.random.default_rng(0)
+    samples = [{'distance': float(d), 'relative_speed': float(v)}
+               for d, v in zip(rng.uniform(0, 100, 200), rng.uniform(-50, 50, 200))]
+
+    def action():
+        client = InferenceClient(path)
+        try:
+            return client.compute_many('module4', samples), client.stats()
+        finally:
+            client.close()
+
+    outputs, stats = serve(path, action, max_wait=0.05, max_batch=64)
+    expected = get_compiled('module4').evaluate({label: np.array([s[label] for s in samples])
+                                                 for label in samples[0]})
+    for label, values in expected.items():
+        np.testing.assert_allclose([output.get(label, np.nan) for output in outputs], values)
+    assert stats['module4']['requests'] == len(samples)
+    assert stats['module4']['batches'] < len(samples)
+    assert stats['module4']['batch_size']['buckets'][-1] == 0
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / 's.sock')
+    left = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    left.bind(path)
+    left.close()
+
+    def action():
+        client = InferenceClient(path)
+        try:
+            return client.compute('module4', {'distance': 30, 'relative_speed': -4})
+        finally:
+            client.close()
+
+    assert 'brake' in serve(path, action)
+
+
+def test_live_socket_and_other_files_are_kept(tmp_path):
+    path = str(tmp_path / 's.sock')
+    other = tmp_path / 'notes.txt'
+    other.write_text('keep me')
+
+    def action():
+        return asyncio.run(InferenceServer(['module4']).start(path))
+
+    with pytest.raises(OSError, match='Another server'):
+        serve(path, action)
+    with pytest.raises(FileExistsError):
+        asyncio.run(InferenceServer(['module4']).start(str(other)))
+    assert other.read_text() == 'keep me'